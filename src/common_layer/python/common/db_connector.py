@@ -1,11 +1,13 @@
 # src/common/db_connector.py
 import os
 import pymysql
+from pymysql.constants import CLIENT
 import json
 import logging
 import time
 import uuid
 import re
+import threading
 from datetime import datetime
 import boto3
  
@@ -19,6 +21,28 @@ DB_NAME = os.environ.get('DB_NAME')
 DB_USER = os.environ.get('DB_USER')
 DB_PASSWORD = os.environ.get('DB_PASSWORD')
 
+# Conexiones de execute_query reutilizadas entre consultas e invocaciones en caliente.
+# Cada entrada es (conexión, instante del último uso); un hilo usa una conexión a la vez.
+CONNECTION_POOL = []
+CONNECTION_POOL_LOCK = threading.Lock()
+CONNECTION_POOL_MAX_SIZE = 10
+# Segundos de inactividad a partir de los cuales se verifica la conexión con ping
+CONNECTION_IDLE_PING_SECONDS = 30
+
+# Cliente SQS reutilizado por el contenedor; se crea al primer uso para no
+# penalizar el arranque en frío de las lambdas que no lo necesitan
+SQS_CLIENT = None
+SQS_CLIENT_LOCK = threading.Lock()
+
+def get_sqs_client():
+    """Retorna el cliente SQS compartido, creándolo si aún no existe"""
+    global SQS_CLIENT
+    if SQS_CLIENT is None:
+        with SQS_CLIENT_LOCK:
+            if SQS_CLIENT is None:
+                SQS_CLIENT = boto3.client('sqs')
+    return SQS_CLIENT
+
 def get_connection():
     """Establece y retorna una conexión a la base de datos MySQL"""
     try:
@@ -29,7 +53,9 @@ def get_connection():
             db=DB_NAME,
             charset='utf8mb4',
             cursorclass=pymysql.cursors.DictCursor,
-            connect_timeout=5
+            connect_timeout=5,
+            # Reportar filas encontradas (no solo modificadas) en UPDATE
+            client_flag=CLIENT.FOUND_ROWS
         )
         logger.info("Conexión a la base de datos establecida correctamente")
         return conn
@@ -37,34 +63,78 @@ def get_connection():
         logger.error(f"Error al conectar a la base de datos: {str(e)}")
         raise
 
-def execute_query(query, params=None, fetch=True):
-    """Ejecuta una consulta SQL y retorna los resultados"""
+def acquire_connection():
+    """
+    Obtiene una conexión del pool o crea una nueva. Las conexiones del pool usan
+    autocommit para que cada lectura vea datos actuales (sin snapshot abierto).
+    """
+    with CONNECTION_POOL_LOCK:
+        entry = CONNECTION_POOL.pop() if CONNECTION_POOL else None
+    
+    if entry:
+        connection, last_used = entry
+        if time.monotonic() - last_used < CONNECTION_IDLE_PING_SECONDS:
+            return connection
+        try:
+            # Tras un periodo inactivo (p. ej. Lambda congelada) verificar/reconectar
+            connection.ping(reconnect=True)
+            return connection
+        except Exception as e:
+            logger.warning(f"Conexión reutilizada no disponible, se crea una nueva: {str(e)}")
+    
     connection = get_connection()
+    connection.autocommit(True)
+    return connection
+
+def release_connection(connection):
+    """Devuelve una conexión sana al pool (o la cierra si el pool está lleno)"""
+    with CONNECTION_POOL_LOCK:
+        if len(CONNECTION_POOL) < CONNECTION_POOL_MAX_SIZE:
+            CONNECTION_POOL.append((connection, time.monotonic()))
+            return
+    connection.close()
+
+def execute_query(query, params=None, fetch=True, return_rowcount=False, many=False):
+    """
+    Ejecuta una consulta SQL y retorna los resultados.
+    Con fetch=False retorna lastrowid, o el número de filas afectadas
+    si return_rowcount=True.
+    Con many=True params es una lista de filas y se usa executemany: pymysql
+    agrupa los INSERT ... VALUES en sentencias multi-fila (un solo commit).
+    La conexión se reutiliza entre llamadas; solo se descarta si la consulta falla.
+    """
+    connection = acquire_connection()
     try:
         with connection.cursor() as cursor:
             try:
-                cursor.execute(query, params)
+                if many:
+                    cursor.executemany(query, params)
+                else:
+                    cursor.execute(query, params)
                 if fetch:
                     result = cursor.fetchall()
                 else:
                     connection.commit()
-                    result = cursor.lastrowid
-                return result
+                    result = cursor.rowcount if return_rowcount else cursor.lastrowid
             except pymysql.err.MySQLError as mysql_err:
                 # Capturar errores específicos de MySQL para mejor diagnóstico
                 error_code = mysql_err.args[0]
-                error_message = mysql_err.args[1]
+                error_message = mysql_err.args[1] if len(mysql_err.args) > 1 else ''
                 logger.error(f"Error MySQL {error_code}: {error_message}")
                 logger.error(f"Query: {query}")
                 logger.error(f"Params: {params}")
-                connection.rollback()
                 raise
     except Exception as e:
         logger.error(f"Error al ejecutar consulta: {str(e)}")
-        connection.rollback()
+        try:
+            connection.rollback()
+            connection.close()
+        except Exception:
+            pass
         raise
-    finally:
-        connection.close()
+    
+    release_connection(connection)
+    return result
 
 def insert_document(document_data):
     """Inserta un nuevo registro de documento en la base de datos"""
@@ -402,7 +472,7 @@ def insert_document_version(version_data):
         try:
             # Programar la generación de miniaturas enviando un mensaje a SQS
             # para que un servicio lambda de miniaturas procese este documento
-            sqs_client = boto3.client('sqs')
+            sqs_client = get_sqs_client()
             
             # Obtener URL de cola de SQS desde variables de entorno
             THUMBNAILS_QUEUE_URL = os.environ.get('THUMBNAILS_QUEUE_URL')
@@ -609,6 +679,45 @@ def get_document_by_id(document_id):
         return results[0]
     return None
 
+def get_document_with_latest_analysis(document_id):
+    """
+    Obtiene un documento y su análisis IA más reciente en una sola consulta.
+    Las columnas del análisis llegan con prefijo 'analisis_' (NULL si no hay análisis).
+    El texto extraído solo se transfiere si datos_extraidos_ia no trae ya texto_completo.
+    Del documento solo se leen las columnas que usa el procesamiento de identificación,
+    junto con el cliente vinculado (id_cliente, NULL si no está vinculado).
+    """
+    query = """
+    SELECT d.id_documento, d.id_tipo_documento, d.datos_extraidos_ia,
+           d.confianza_extraccion, d.validado_manualmente,
+           (SELECT dc.id_cliente
+            FROM documentos_clientes dc
+            WHERE dc.id_documento = d.id_documento
+            LIMIT 1) AS id_cliente,
+           td.nombre_tipo, td.es_documento_bancario, td.requiere_extraccion_ia,
+           a.id_analisis AS analisis_id,
+           CASE WHEN COALESCE(JSON_UNQUOTE(JSON_EXTRACT(d.datos_extraidos_ia, '$.texto_completo')), '') IN ('', 'null')
+                THEN a.texto_extraido END AS analisis_texto_extraido,
+           a.entidades_detectadas AS analisis_entidades_detectadas,
+           a.metadatos_extraccion AS analisis_metadatos_extraccion,
+           a.estado_analisis AS analisis_estado_analisis,
+           a.tipo_documento AS analisis_tipo_documento
+    FROM documentos d
+    JOIN tipos_documento td ON d.id_tipo_documento = td.id_tipo_documento
+    LEFT JOIN analisis_documento_ia a ON a.id_analisis = (
+        SELECT a2.id_analisis
+        FROM analisis_documento_ia a2
+        WHERE a2.id_documento = d.id_documento
+        ORDER BY a2.fecha_analisis DESC
+        LIMIT 1
+    )
+    WHERE d.id_documento = %s
+    """
+    results = execute_query(query, (document_id,))
+    if results:
+        return results[0]
+    return None
+
 def get_banking_doc_category(document_type_id):
     """Obtiene la categoría bancaria para un tipo de documento"""
     query = """
@@ -730,6 +839,59 @@ def update_document_extraction_data_with_type_preservation(document_id, data_jso
             connection.rollback()
             return False
         
+def persist_id_document_results(document_id, data_json, confidence, is_valid, status, message, tipo_documento,
+                                update_document=True):
+    """
+    Guarda en una sola transacción los datos extraídos del documento (sin modificar
+    su tipo de documento) y el estado final del último análisis. Equivale a
+    update_document_extraction_data_with_type_preservation + update_document_processing_status
+    con una sola conexión y un único commit. Si algo falla hace rollback y relanza.
+    Con update_document=False (datos ya guardados) solo se actualiza el estado.
+    La conexión sale del pool de execute_query (autocommit): la transacción se abre con begin.
+    """
+    connection = acquire_connection()
+    try:
+        connection.begin()
+        with connection.cursor() as cursor:
+            if update_document:
+                cursor.execute("""
+                UPDATE documentos 
+                SET datos_extraidos_ia = %s, 
+                    confianza_extraccion = %s, 
+                    validado_manualmente = %s,
+                    fecha_modificacion = NOW()
+                WHERE id_documento = %s
+                """, (data_json, confidence, 1 if is_valid else 0, document_id))
+                
+                if cursor.rowcount == 0:
+                    raise ValueError(f"No se encontró el documento {document_id} en la base de datos")
+            
+            cursor.execute("""
+            UPDATE analisis_documento_ia
+            SET estado_analisis = %s,
+                mensaje_error = %s,
+                tipo_documento = %s,
+                fecha_analisis = NOW()
+            WHERE id_documento = %s
+            ORDER BY fecha_analisis DESC
+            LIMIT 1
+            """, (status, message, tipo_documento, document_id))
+        
+        connection.commit()
+    except Exception as e:
+        logger.error(f"Error al guardar resultados del documento {document_id}: {str(e)}")
+        # Rollback y descartar la conexión (no se devuelve al pool)
+        try:
+            connection.rollback()
+            connection.close()
+        except Exception:
+            pass
+        raise
+    
+    release_connection(connection)
+    logger.info(f"Documento {document_id} actualizado (estado: {status}, tipo: {tipo_documento})")
+    return True
+
 def link_document_to_client(document_id, client_id=None, document_type_id=None):
     """
     Vincula un documento a un cliente.
@@ -1344,27 +1506,22 @@ def get_client_id_by_document(document_id):
     Returns:
         str or None: ID del cliente si existe, None si no está vinculado
     """
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            query = """
-                SELECT id_cliente
-                FROM documentos_clientes
-                WHERE id_documento = %s
-                LIMIT 1
-            """
-            cursor.execute(query, (document_id,))
-            result = cursor.fetchone()
-            return result['id_cliente'] if result else None
-    finally:
-        conn.close()
+    query = """
+        SELECT id_cliente
+        FROM documentos_clientes
+        WHERE id_documento = %s
+        LIMIT 1
+    """
+    result = execute_query(query, (document_id,))
+    return result[0]['id_cliente'] if result else None
 # Añadir estas funciones al archivo db_connector.py
 
 def generate_process_log_id():
     """Genera un ID único para el registro de procesamiento"""
     return str(uuid.uuid4())
 
-def log_document_processing_start(document_id, tipo_proceso, datos_entrada=None, analisis_id=None, servicio="id_processor", version="1.0"):
+def log_document_processing_start(document_id, tipo_proceso, datos_entrada=None, analisis_id=None, servicio="id_processor", version="1.0",
+                                  buffer=None):
     """
     Registra el inicio de un proceso en la tabla de registro de procesamiento
     
@@ -1375,6 +1532,8 @@ def log_document_processing_start(document_id, tipo_proceso, datos_entrada=None,
         analisis_id: ID del análisis asociado (opcional)
         servicio: Nombre del servicio que realiza el procesamiento
         version: Versión del servicio
+        buffer: Diccionario de registros pendientes (opcional). Si se indica, no se
+            escribe en BD hasta llamar a flush_processing_log_buffer
         
     Returns:
         ID del registro creado
@@ -1388,6 +1547,25 @@ def log_document_processing_start(document_id, tipo_proceso, datos_entrada=None,
             datos_entrada_json = json.dumps(datos_entrada)
         else:
             datos_entrada_json = datos_entrada
+        
+        if buffer is not None:
+            buffer[registro_id] = {
+                'id_documento': document_id,
+                'id_analisis': analisis_id,
+                'tipo_proceso': tipo_proceso,
+                'estado_proceso': 'iniciado',
+                'datos_entrada': datos_entrada_json,
+                'datos_procesados': None,
+                'datos_salida': None,
+                'confianza': None,
+                'mensaje_error': None,
+                'inicio': time.monotonic(),
+                'fin': None,
+                'duracion_ms': None,
+                'servicio_procesador': servicio,
+                'version_servicio': version
+            }
+            return registro_id
             
         # Insertar registro de inicio
         query = """
@@ -1415,7 +1593,7 @@ def log_document_processing_start(document_id, tipo_proceso, datos_entrada=None,
         return generate_process_log_id()
 
 def log_document_processing_end(registro_id, estado='completado', datos_procesados=None, datos_salida=None, 
-                              confianza=None, mensaje_error=None, duracion_ms=None):
+                              confianza=None, mensaje_error=None, duracion_ms=None, buffer=None):
     """
     Actualiza un registro de procesamiento con los resultados
     
@@ -1427,6 +1605,8 @@ def log_document_processing_end(registro_id, estado='completado', datos_procesad
         confianza: Nivel de confianza del procesamiento
         mensaje_error: Mensaje de error si hubo alguno
         duracion_ms: Duración del proceso en milisegundos
+        buffer: Diccionario de registros pendientes (opcional). Si el registro
+            está en el buffer se actualiza en memoria, sin consultar la BD
         
     Returns:
         Boolean indicando éxito
@@ -1443,6 +1623,19 @@ def log_document_processing_end(registro_id, estado='completado', datos_procesad
         else:
             datos_salida_json = datos_salida
         
+        entry = buffer.get(registro_id) if buffer is not None else None
+        if entry is not None:
+            entry['fin'] = time.monotonic()
+            entry.update({
+                'estado_proceso': estado,
+                'datos_procesados': datos_procesados_json,
+                'datos_salida': datos_salida_json,
+                'confianza': confianza,
+                'mensaje_error': mensaje_error,
+                'duracion_ms': duracion_ms if duracion_ms is not None else int((entry['fin'] - entry['inicio']) * 1000)
+            })
+            return True
+        
         # Si no se proporciona duración, calcularla desde el inicio
         if duracion_ms is None:
             # Obtener timestamp de inicio
@@ -1483,6 +1676,74 @@ def log_document_processing_end(registro_id, estado='completado', datos_procesad
         logger.error(f"Error al registrar fin de procesamiento: {str(e)}")
         return False
 
+# Fila de registro_procesamiento_documento: los timestamps se calculan en el servidor
+# (NOW() menos el tiempo transcurrido) para conservar su zona horaria
+PROCESSING_LOG_INSERT_QUERY = """
+        INSERT INTO registro_procesamiento_documento (
+            id_registro, id_documento, id_analisis, tipo_proceso,
+            estado_proceso, datos_entrada, datos_procesados, datos_salida,
+            confianza, mensaje_error, timestamp_inicio, timestamp_fin,
+            duracion_ms, servicio_procesador, version_servicio
+        ) VALUES """
+PROCESSING_LOG_ROW_VALUES = (
+    "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, "
+    "TIMESTAMPADD(MICROSECOND, -%s, NOW()), TIMESTAMPADD(MICROSECOND, -%s, NOW()), %s, %s, %s)"
+)
+
+def build_processing_log_row_params(registro_id, entry, ahora):
+    """Parámetros de PROCESSING_LOG_ROW_VALUES para un registro del buffer"""
+    return (
+        registro_id, entry['id_documento'], entry['id_analisis'], entry['tipo_proceso'],
+        entry['estado_proceso'], entry['datos_entrada'], entry['datos_procesados'],
+        entry['datos_salida'], entry['confianza'], entry['mensaje_error'],
+        int((ahora - entry['inicio']) * 1000000),
+        int((ahora - entry['fin']) * 1000000) if entry['fin'] is not None else None,
+        entry['duracion_ms'], entry['servicio_procesador'], entry['version_servicio']
+    )
+
+def flush_processing_log_buffer(buffer):
+    """
+    Escribe en un único INSERT multi-fila los registros de procesamiento acumulados
+    con log_document_processing_start/end(buffer=...). Si el INSERT conjunto falla
+    (p. ej. una fila con un documento inexistente), se reintenta fila a fila para no
+    perder el resto; los id_registro que no se pudieron escribir quedan en el log.
+    
+    Args:
+        buffer: Diccionario de registros pendientes; se vacía tras escribirse
+        
+    Returns:
+        Boolean indicando si se escribieron todos los registros
+    """
+    if not buffer:
+        return True
+    
+    ahora = time.monotonic()
+    rows = [
+        (registro_id, build_processing_log_row_params(registro_id, entry, ahora))
+        for registro_id, entry in buffer.items()
+    ]
+    buffer.clear()
+    
+    try:
+        query = PROCESSING_LOG_INSERT_QUERY + ", ".join([PROCESSING_LOG_ROW_VALUES] * len(rows))
+        execute_query(query, tuple(param for _, row_params in rows for param in row_params), fetch=False)
+        return True
+    except Exception as e:
+        logger.error(f"Error al escribir registros de procesamiento acumulados, reintentando uno a uno: {str(e)}")
+    
+    lost = []
+    for registro_id, row_params in rows:
+        try:
+            execute_query(PROCESSING_LOG_INSERT_QUERY + PROCESSING_LOG_ROW_VALUES, row_params, fetch=False)
+        except Exception as e:
+            logger.error(f"Error al escribir el registro de procesamiento {registro_id}: {str(e)}")
+            lost.append(registro_id)
+    
+    if lost:
+        logger.error(f"❌ Registros de procesamiento perdidos ({len(lost)} de {len(rows)}): {', '.join(lost)}")
+        return False
+    return True
+
 def get_document_processing_history(document_id):
     """
     Obtiene el historial de procesamiento de un documento
@@ -2820,39 +3081,15 @@ def cleanup_duplicate_migrated_documents():
       
 def preserve_identification_data(document_id, version_id=None, reason="Manual preservation"):
     """
-    Preserva los datos de identificación actuales antes de una actualización
+    Preserva los datos de identificación actuales antes de una actualización.
+    La copia al histórico se hace en el servidor con un único INSERT ... SELECT
+    (registro actual y versión vigente incluidos), sin leerlos antes desde Python.
+    
+    Returns:
+        Boolean indicando si había datos de identificación que preservar
     """
     try:
-        # Obtener datos actuales de identificación
-        query = """
-        SELECT * FROM documentos_identificacion
-        WHERE id_documento = %s
-        """
-        
-        id_data = execute_query(query, (document_id,))
-        
-        if not id_data:
-            logger.warning(f"No se encontraron datos de identificación para documento {document_id}")
-            return False
-        
-        current_data = id_data[0]
-        
-        # Si no se proporciona version_id, obtener la versión actual
-        if not version_id:
-            version_query = """
-            SELECT v.id_version 
-            FROM versiones_documento v
-            JOIN documentos d ON v.id_documento = d.id_documento
-            WHERE v.id_documento = %s AND v.numero_version = d.version_actual
-            LIMIT 1
-            """
-            version_result = execute_query(version_query, (document_id,))
-            version_id = version_result[0]['id_version'] if version_result else generate_uuid()
-        
-        # Generar ID para el histórico
-        historico_id = generate_uuid()
-        
-        # Insertar en histórico
+        # Si no se proporciona version_id, se usa la versión actual del documento
         insert_query = """
         INSERT INTO historico_documentos_identificacion (
             id_historico, id_documento, id_version,
@@ -2861,29 +3098,37 @@ def preserve_identification_data(document_id, version_id=None, reason="Manual pr
             genero, lugar_nacimiento, autoridad_emision,
             nacionalidad, codigo_pais,
             preservado_por, motivo_preservacion
-        ) VALUES (
-            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
         )
+        SELECT
+            %s, di.id_documento,
+            COALESCE(%s, (
+                SELECT v.id_version
+                FROM versiones_documento v
+                JOIN documentos d ON v.id_documento = d.id_documento
+                WHERE v.id_documento = di.id_documento AND v.numero_version = d.version_actual
+                LIMIT 1
+            ), %s),
+            di.tipo_documento, di.numero_documento, di.pais_emision,
+            di.fecha_emision, di.fecha_expiracion, di.nombre_completo,
+            di.genero, di.lugar_nacimiento, di.autoridad_emision,
+            di.nacionalidad, di.codigo_pais,
+            %s, %s
+        FROM documentos_identificacion di
+        WHERE di.id_documento = %s
         """
         
-        execute_query(insert_query, (
-            historico_id,
-            document_id,
-            version_id,
-            current_data.get('tipo_documento'),
-            current_data.get('numero_documento'),
-            current_data.get('pais_emision'),
-            current_data.get('fecha_emision'),
-            current_data.get('fecha_expiracion'),
-            current_data.get('nombre_completo'),
-            current_data.get('genero'),
-            current_data.get('lugar_nacimiento'),
-            current_data.get('autoridad_emision'),
-            current_data.get('nacionalidad'),
-            current_data.get('codigo_pais'),
+        preserved = execute_query(insert_query, (
+            generate_uuid(),  # id_historico
+            version_id or None,
+            generate_uuid(),  # id_version si el documento no tiene versión actual
             '691d8c44-f524-48fd-b292-be9e31977711', # Usuario sistema
-            reason
-        ), fetch=False)
+            reason,
+            document_id
+        ), fetch=False, return_rowcount=True)
+        
+        if not preserved:
+            logger.info(f"No se encontraron datos de identificación para documento {document_id}")
+            return False
         
         logger.info(f"Datos de identificación preservados para documento {document_id}")
         return True
@@ -2892,6 +3137,64 @@ def preserve_identification_data(document_id, version_id=None, reason="Manual pr
         logger.error(f"Error al preservar datos de identificación: {str(e)}")
         return False
 
+# Máximo de documentos por sentencia en preserve_identification_data_batch (tamaño del IN)
+PRESERVE_BATCH_CHUNK_SIZE = 500
+
+def preserve_identification_data_batch(document_ids, reason="Manual preservation"):
+    """
+    Preserva en el histórico los datos de identificación actuales de varios documentos
+    con un INSERT ... SELECT por cada PRESERVE_BATCH_CHUNK_SIZE documentos (los documentos
+    sin registro no generan fila). Los identificadores del histórico los genera el
+    servidor con UUID().
+    
+    A diferencia de preserve_identification_data, los errores de BD se propagan: quien
+    llama decide si continuar sin histórico. Los bloques ya escritos no se deshacen.
+    
+    Returns:
+        int: número de registros preservados
+    """
+    if not document_ids:
+        return 0
+    
+    preserved = 0
+    for offset in range(0, len(document_ids), PRESERVE_BATCH_CHUNK_SIZE):
+        chunk = document_ids[offset:offset + PRESERVE_BATCH_CHUNK_SIZE]
+        insert_query = f"""
+        INSERT INTO historico_documentos_identificacion (
+            id_historico, id_documento, id_version,
+            tipo_documento, numero_documento, pais_emision,
+            fecha_emision, fecha_expiracion, nombre_completo,
+            genero, lugar_nacimiento, autoridad_emision,
+            nacionalidad, codigo_pais,
+            preservado_por, motivo_preservacion
+        )
+        SELECT
+            UUID(), di.id_documento,
+            COALESCE((
+                SELECT v.id_version
+                FROM versiones_documento v
+                JOIN documentos d ON v.id_documento = d.id_documento
+                WHERE v.id_documento = di.id_documento AND v.numero_version = d.version_actual
+                LIMIT 1
+            ), UUID()),
+            di.tipo_documento, di.numero_documento, di.pais_emision,
+            di.fecha_emision, di.fecha_expiracion, di.nombre_completo,
+            di.genero, di.lugar_nacimiento, di.autoridad_emision,
+            di.nacionalidad, di.codigo_pais,
+            %s, %s
+        FROM documentos_identificacion di
+        WHERE di.id_documento IN ({', '.join(['%s'] * len(chunk))})
+        """
+        
+        preserved += execute_query(insert_query, (
+            '691d8c44-f524-48fd-b292-be9e31977711', # Usuario sistema
+            reason,
+            *chunk
+        ), fetch=False, return_rowcount=True)
+    
+    logger.info(f"Datos de identificación preservados para {preserved} de {len(document_ids)} documento(s)")
+    return preserved
+
 def get_identification_history(document_id):
     """
     Obtiene el historial completo de datos de identificación de un documento
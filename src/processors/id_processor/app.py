@@ -6,8 +6,12 @@ import logging
 import sys
 import re
 import time
-from datetime import datetime, timedelta
-import traceback
+import threading
+import unicodedata
+from datetime import date, datetime
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from pymysql.err import IntegrityError
 from common.confidence_utils import evaluate_confidence, mark_for_manual_review
 
 # Agregar las rutas para importar módulos comunes
@@ -17,105 +21,788 @@ sys.path.append('/opt')
 from common.db_connector import (
     execute_query,
     update_document_processing_status,
-    get_document_by_id,
+    get_document_with_latest_analysis,
     log_document_processing_start,
     log_document_processing_end,
+    flush_processing_log_buffer,
     preserve_identification_data,
-    update_document_extraction_data_with_type_preservation,
+    preserve_identification_data_batch,
+    persist_id_document_results,
     assign_folder_and_link,
     get_client_id_by_document,
     generate_uuid
 )
 
 from common.flow_utilis import crear_instancia_flujo_documento
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
  
 # Configurar el logger
 logger = logging.getLogger()
 logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO'))
 
+# Máximo de mensajes SQS procesados en paralelo dentro de un mismo lote
+MAX_RECORD_WORKERS = int(os.environ.get('MAX_RECORD_WORKERS', '10'))
+
+# Máximo de caracteres del evento que se registran en CloudWatch
+MAX_EVENT_LOG_CHARS = 4096
+
+# Usar RE2 (tiempo lineal, sin backtracking) para los patrones compilados si está instalado
+USE_RE2 = RE2_AVAILABLE and os.environ.get('USE_RE2', 'true').lower() == 'true'
+
+# En RE2 \b y \w solo reconocen letras ASCII, (?i) no pliega igual todas las letras y $ no acepta
+# el salto de línea final (\S y \D no se pueden reescribir dentro de corchetes): los patrones que
+# usan estas construcciones se compilan siempre con re
+_RE2_UNSAFE_CONSTRUCTS_RE = re.compile(r'\\[bBwWSD]|\(\?[a-z]*i|(?<!\\)\$')
+
+# Fuera de los planos 0 y 1 (ideogramas CJK, etiquetas, uso privado) no hay espacios ni dígitos
+UNICODE_CLASS_SCAN_LIMIT = 0x20000
+
+def unicode_class_members(predicate):
+    """Rangos de caracteres que cumplen predicate, escritos como contenido de una clase RE2"""
+    ranges = []
+    for codepoint in range(UNICODE_CLASS_SCAN_LIMIT):
+        if not predicate(chr(codepoint)):
+            continue
+        if ranges and ranges[-1][1] == codepoint - 1:
+            ranges[-1][1] = codepoint
+        else:
+            ranges.append([codepoint, codepoint])
+    return ''.join(
+        '\\x{%x}' % first if first == last else '\\x{%x}-\\x{%x}' % (first, last)
+        for first, last in ranges
+    )
+
+# \s y \d de RE2 solo cubren ASCII; se sustituyen por los mismos caracteres que reconoce re
+# (espacios Unicode como el NBSP del OCR, dígitos de otras escrituras)
+RE2_UNICODE_CLASSES = {
+    '\\s': unicode_class_members(str.isspace),
+    '\\d': unicode_class_members(str.isdecimal),
+} if USE_RE2 else {}
+
+def translate_for_re2(pattern):
+    """Reescribe \\s y \\d como clases explícitas, dentro o fuera de corchetes"""
+    parts = []
+    in_class = False
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            escape = pattern[index:index + 2]
+            members = RE2_UNICODE_CLASSES.get(escape)
+            if members is None:
+                parts.append(escape)
+            else:
+                parts.append(members if in_class else '[' + members + ']')
+            index += 2
+            continue
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        parts.append(char)
+        index += 1
+    return ''.join(parts)
+
+def compile_pattern(pattern):
+    """
+    Compila un patrón con RE2 si está habilitado; si RE2 no lo soporta, usa re.
+    Los flags van siempre en línea ((?i)) para que el patrón sea válido en ambos motores.
+    Con RE2 el patrón debe encontrar exactamente lo mismo que con re, también en texto
+    sin normalizar (ver _RE2_UNSAFE_CONSTRUCTS_RE y translate_for_re2).
+    """
+    if USE_RE2 and not _RE2_UNSAFE_CONSTRUCTS_RE.search(pattern):
+        try:
+            return re2.compile(translate_for_re2(pattern))
+        except re2.error:
+            logger.warning("Patrón no soportado por RE2, usando re: %s", pattern)
+    return re.compile(pattern)
+
 # Patrones regex para extraer información de documentos de identidad
-DNI_PATTERN = r'(?i)(?:DNI|Documento Nacional de Identidad)[^\d]*(\d{8}[A-Z]?)'
-PASSPORT_PATTERN = r'[A-Z]{2}\d{7}'
-NAME_PATTERN = r'(?i)(?:Nombre|Name)[^\w]*([\w\s]+)'
-SURNAME_PATTERN = r'(?i)(?:Apellidos|Surname)[^\w]*([\w\s]+)'
-DOB_PATTERN = r'(?i)(?:Fecha de nacimiento|Date of birth)[^\d]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
-EXPIRY_PATTERN = r'(?i)(?:Fecha de caducidad|Date of expiry)[^\d]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
-NATIONALITY_PATTERN = r'(?i)(?:Nacionalidad|Nationality)[^\w]*([\w\s]+)'
+# (se compilan una sola vez al importar, ver los _RE más abajo)
 PANAMA_ID_PATTERN = r'\b(\d{1,2}-\d{3,4}-\d{1,4})\b'
-# Patrones específicos para fechas en documentos panameños
-PANAMA_ISSUE_DATE_PATTERN = r'(?:[XE]XPEDIDA|EMITIDA):?\s*(\d{1,2}[-\s][a-zA-Zéúíóá]+[-\s]\d{4})'
-PANAMA_EXPIRY_DATE_PATTERN = r'(?:EXPIRA|VENCE):?\s*(\d{1,2}[-\s][a-zA-Zéúíóá]+[-\s]\d{4})'
+
+# Patrones compilados para cédulas panameñas
+_PANAMA_ID_RE = compile_pattern(PANAMA_ID_PATTERN)
+# Fechas de la cédula en una sola pasada; cada grupo se llama como el campo (lastgroup)
+_CEDULA_DATES_RE = compile_pattern(
+    r'EXPEDIDA:\s*(?P<fecha_emision>\d{1,2}-[A-Z]{3}-\d{4})'  # 16-NOV-2017
+    r'|EXPIRA:\s*(?P<fecha_expiracion>\d{1,2}-[A-Z]{3}-\d{4})'  # 16-NOV-2027
+    r'|FECHA DE NACIMIENTO:\s*(?P<fecha_nacimiento>\d{1,2}-[A-Z]{3}-\d{4})'  # 27-ABR-1964
+)
+_CEDULA_DATE_FIELDS = ('fecha_emision', 'fecha_expiracion', 'fecha_nacimiento')
+_CEDULA_SEXO_RE = compile_pattern(r'SEXO:\s*([MF])')
+_CEDULA_LUGAR_RE = compile_pattern(r'LUGAR DE NACIMIENTO:\s*([A-Z,\s]+)')
+# Respaldo para el nombre de la cédula (texto en mayúsculas), en orden de preferencia.
+# Cada patrón va con el literal con el que empieza: si no aparece se omite el patrón
+# y, si aparece, la búsqueda arranca en su primera posición.
+_CEDULA_BASIC_NAME_RES = (
+    ('TRIBUNAL ELECTORAL', compile_pattern(r'TRIBUNAL ELECTORAL\s+([A-Z\s]+)\s+NOMBRE USUAL')),
+    ('ELECTORAL', compile_pattern(r'ELECTORAL\s+([A-Z\s]+)\s+NOMBRE')),
+    ('P', compile_pattern(r'P\s+A\s+([A-Z\s]+)\s+N\s+A\s+([A-Z\s]+)\s+M')),
+)
+
+# Marcadores del encabezado de documentos panameños (el texto original puede traer tildes)
+_PANAMA_MARKERS = ('REPUBLICA DE PANAMA', 'REPÚBLICA DE PANAMÁ')
+# Sobre el texto normalizado (mayúsculas sin tildes) basta una sola variante
+_PANAMA_MARKER_NORM = 'REPUBLICA DE PANAMA'
+_PANAMA_MARKER_MARGIN = 200
+# Los campos de la cédula están a poca distancia del encabezado: ventana de búsqueda tras él
+PANAMA_WINDOW_CHARS = 2048
+
+# Los números de identificación suelen estar en la cabecera/MRZ: se buscan primero ahí
+HEAD_SCAN_CHARS = 4096
+
+# Tabla para comparar texto sin tildes (misma longitud, los índices se conservan)
+_DIACRITICS_TABLE = str.maketrans('áéíóúÁÉÍÓÚñÑ', 'aeiouAEIOUnN')
+
+# Patrones compilados de uso general (limpieza y formatos de fecha)
+# Fecha panameña en tres partes (día, mes, año) separadas por guiones y/o espacios
+_PANAMA_DATE_PARTS_RE = compile_pattern(r'([^-\s]+)[-\s]+([^-\s]+)[-\s]+([^-\s]+)')
+_ISO_DATE_RE = compile_pattern(r'^\d{4}-\d{2}-\d{2}$')
+_TEXT_MONTH_DATE_RE = compile_pattern(r'\d{1,2}[-\s][a-zA-Z]+[-\s]\d{4}')
+_NUMERIC_DATE_RE = compile_pattern(r'^\d{1,2}[/-]\d{1,2}[/-]\d{2,4}$')
+# Formatos numéricos internacionales; lastindex indica la rama (3: d/m/Y, 6: d.m.Y,
+# 9: d m Y, 12: Y/m/d, 15: Y-m-d). Como strptime, el día admite ' 5' (espacio y un dígito)
+_INTERNATIONAL_DATE_RE = compile_pattern(
+    r'(\d{1,2}| [1-9])/(\d{1,2}| [1-9])/(\d{4})'
+    r'|(\d{1,2})\.(\d{1,2})\.(\d{4})'
+    r'|(\d{1,2})\s+(\d{1,2})\s+(\d{4})'
+    r'|(\d{4})/(\d{1,2})/(\d{1,2}| [1-9])'
+    r'|(\d{4})-(\d{1,2})-(\d{1,2}| [1-9])'
+)
+_SPECIMEN_RE = compile_pattern(r'(SPECIMEN|MUESTRA)')
+_SPECIMEN_IGNORECASE_RE = compile_pattern(r'(?i)(SPECIMEN|MUESTRA)')
+_ASCII_LETTER_RE = compile_pattern(r'[A-Za-z]')
+_NAME_NOISE_RE = compile_pattern(r'(?i)(SPECIMEN|MUESTRA|NOMBRE USUAL)')
+# Limpieza de valores con clases Unicode (\w, \s, \d): siempre con re, porque RE2 las
+# limita a ASCII y quitaría las letras con tilde o la Ñ de los nombres
+_WHITESPACE_RE = re.compile(r'\s+')
+_DIGIT_RE = re.compile(r'\d')
+_NAME_DISALLOWED_CHARS_RE = re.compile(r'[^\w\s\-\']')
+_EXTRACTION_DISALLOWED_CHARS_RE = re.compile(r'[^\w\s\-/]')
+_DATE_DISALLOWED_CHARS_RE = re.compile(r'[^\w\s-]')
+_DATE_SEPARATORS_RE = re.compile(r'[-\s]+')
+_NON_ID_CHARS_RE = re.compile(r'[^\w-]')
+_VALID_NAME_RE = re.compile(r'^[A-ZÁÉÍÓÚÑa-záéíóúñ\s\-\'\.]+$')
+
+# Patrones para diferentes tipos de ID (último recurso sobre el texto completo)
+_FALLBACK_ID_RES = (
+    compile_pattern(r'\b(\d{1,2}-\d{3,4}-\d{1,4})\b'),  # Cédula panameña
+    compile_pattern(r'\b(\d{8}[A-Z])\b'),               # DNI español
+    compile_pattern(r'\b([A-Z]{2}\d{7})\b'),            # Pasaporte
+)
+
+# Formatos de número de identificación (validación de un valor ya extraído)
+_PASSPORT_NUMBER_PREFIX_RE = compile_pattern(r'^[A-Z]{2}\d{7}')
+_PASSPORT_NUMBER_FULL_RE = compile_pattern(r'^[A-Z]{2}\d{7}$')
+_CEDULA_PANAMA_NUMBER_FULL_RE = compile_pattern(r'^\d{1,2}-\d{3,4}-\d{1,4}$')
+_DNI_NUMBER_FULL_RE = compile_pattern(r'^\d{8}[A-Z]$')
+
+# Detección del tipo de documento por palabras clave sobre el texto normalizado (mayúsculas,
+# sin tildes ni saltos de línea): (alternativas, puntos). Una alternativa es un literal o
+# un par (primero, después) equivalente a 'PRIMERO.*DESPUÉS'; se evalúan con str.find.
+_PASSPORT_KEYWORD_RULES = (
+    (('PASAPORTE', 'PASSPORT'), 3),
+    (('REPUBLIC OF PANAMA', ('REPUBLICA DE PANAMA', 'PASSPORT')), 3),
+    ((('SURNAME', 'GIVEN NAMES'), ('APELLIDOS', 'NOMBRES')), 2),
+    ((('AUTORIDAD', 'PASAPORTES'), ('AUTHORITY', 'PASSPORT')), 2),
+    (('DATE OF BIRTH', 'DATE OF ISSUE', 'DATE OF EXPIRY'), 1),
+)
+_CEDULA_PANAMA_KEYWORD_RULES = (
+    (('TRIBUNAL ELECTORAL',), 3),
+    ((('REPUBLICA DE PANAMA', 'TRIBUNAL'),), 2),
+    ((('EXPEDIDA', 'EXPIRA'),), 2),
+    (('TIPO DE SANGRE', 'DONADOR'), 2),
+)
+_DNI_SPAIN_KEYWORD_RULES = (
+    (('ESPANA', 'SPAIN'), 2),
+    (('DOCUMENTO NACIONAL DE IDENTIDAD', 'DNI'), 3),
+)
+# Formato del número en el texto original: (patrón, puntos)
+_PASSPORT_FORMAT_RULE = (compile_pattern(r'[A-Z]{2}\d{7}'), 2)  # Formato número pasaporte
+_CEDULA_PANAMA_FORMAT_RULE = (compile_pattern(r'\d{1,2}-\d{3,4}-\d{1,4}'), 3)  # Formato cédula panameña
+_DNI_SPAIN_FORMAT_RULE = (compile_pattern(r'\d{8}[A-Z]'), 3)  # Formato DNI español
+
+# Patrones de pasaporte (se evalúan sobre el texto en mayúsculas, en orden: gana el primer
+# patrón de la lista que coincide, no la coincidencia más temprana en el texto)
+_PASSPORT_NUMBER_RES = (
+    compile_pattern(r'PASSPORT\s+NO[:\s]+([A-Z]{2}\d{7})'),  # PA0106480
+    compile_pattern(r'PASAPORTE\s+NO[:\s]+([A-Z]{2}\d{7})'),
+    compile_pattern(r'NO[:\s]*([A-Z]{2}\d{7})'),
+    compile_pattern(r'([A-Z]{2}\d{7})'),  # Patrón general para números como PA0106480, PD0404102
+)
+# Fin de los nombres tras GIVEN NAMES: una palabra que empieza por dígito o por tres letras
+_PASSPORT_NAMES_STOP_RE = compile_pattern(r' (?:\d|[A-Z]{3})')
+_UPPER_WORDS_RE = compile_pattern(r'[A-Z ]+')
+# País de emisión por clave de ancla (ver _FIELD_ANCHORS), en orden de preferencia
+_PASSPORT_COUNTRY_ANCHORS = (
+    ('passport_country_panama', 'Panamá'),
+    ('passport_country_spain', 'España'),
+    ('passport_country_colombia', 'Colombia'),
+    ('passport_country_usa', 'Estados Unidos'),
+    ('passport_country_mexico', 'México'),
+)
+# Fechas de emisión y expiración en una sola pasada; lastgroup indica la etiqueta de cada coincidencia
+_PASSPORT_VALIDITY_DATES_RE = compile_pattern(
+    r'DATE OF ISSUE\s+(?P<date_of_issue>\d{1,2}\s+[A-Z]{3}\s+\d{4})'  # 02 ENE 2014
+    r'|FECHA DE EXPEDICION\s+(?P<fecha_de_expedicion>\d{1,2}\s+[A-Z]{3}\s+\d{4})'
+    r'|DATE OF EXPIRY\s+(?P<date_of_expiry>\d{1,2}\s+[A-Z]{3}\s+\d{4})'  # 02 ENE 2019
+    r'|FECHA DE VENCIMIENTO\s+(?P<fecha_de_vencimiento>\d{1,2}\s+[A-Z]{3}\s+\d{4})'
+    r'|ISSUED:\s*(?P<issued>\d{1,2}[-\s][A-Z]{3}[-\s]\d{4})'
+    r'|EXPIRES:\s*(?P<expires>\d{1,2}[-\s][A-Z]{3}[-\s]\d{4})'
+)
+# (grupo, campo): de cada etiqueta cuenta su primera fecha; si varias etiquetas del mismo
+# campo coinciden, gana la última de esta lista
+_PASSPORT_VALIDITY_DATE_FIELDS = (
+    ('date_of_issue', 'fecha_emision'),
+    ('fecha_de_expedicion', 'fecha_emision'),
+    ('date_of_expiry', 'fecha_expiracion'),
+    ('fecha_de_vencimiento', 'fecha_expiracion'),
+    ('issued', 'fecha_emision'),
+    ('expires', 'fecha_expiracion'),
+)
+_PASSPORT_GENDER_RES = (
+    compile_pattern(r'SEXO/SEX\s+([MF])'),
+    compile_pattern(r'SEX\s+([MF])'),
+    compile_pattern(r'SEXO\s+([MF])'),
+    compile_pattern(r'GENDER\s+([MF])'),
+    compile_pattern(r'([MF])\s+(?:MALE|FEMALE|MASCULINO|FEMENINO)'),
+)
+_PASSPORT_BIRTH_DATE_RES = (
+    compile_pattern(r'DATE OF BIRTH\s+(\d{1,2}\s+[A-Z]{3}\s+\d{4})'),  # 21 MAR 1991
+    compile_pattern(r'FECHA DE NACIMIENTO\s+(\d{1,2}\s+[A-Z]{3}\s+\d{4})'),
+    compile_pattern(r'BORN:\s*(\d{1,2}[-\s][A-Z]{3}[-\s]\d{4})'),
+    compile_pattern(r'DOB\s+(\d{1,2}\s+[A-Z]{3}\s+\d{4})'),
+    # Patrón general de fecha (usado con cuidado)
+    compile_pattern(r'(?:NACIMIENTO|BIRTH|BORN).*?(\d{1,2}\s+[A-Z]{3}\s+\d{4})'),
+)
+_PASSPORT_AUTHORITY_RES = (
+    compile_pattern(r'AUTORIDAD[:\s]+([A-Z\s/]+?)(?:\s+AUTHORITY|\s*$)'),
+    compile_pattern(r'AUTHORITY[:\s]+([A-Z\s/]+?)(?:\s+AUTORIDAD|\s*$)'),
+    compile_pattern(r'ISSUED BY[:\s]+([A-Z\s/]+?)(?:\s+EMITIDO|\s*$)'),
+    compile_pattern(r'EMITIDO POR[:\s]+([A-Z\s/]+?)(?:\s+ISSUED|\s*$)'),
+)
+_PASSPORT_NATIONALITY_RES = (
+    compile_pattern(r'NACIONALIDAD[:\s/]+([A-Z]+)'),
+    compile_pattern(r'NATIONALITY[:\s/]+([A-Z]+)'),
+    compile_pattern(r'NATIONAL[:\s]+([A-Z]+)'),
+    compile_pattern(r'CITIZEN[:\s]+([A-Z]+)'),
+)
+_PASSPORT_BIRTH_PLACE_RES = (
+    compile_pattern(r'(?:PLACE OF BIRTH|LUGAR DE NACIMIENTO)[:\s]+([A-ZÁÉÍÓÚÑ\s,]+?)(?:\s+LIEU|\s+DATE|\s*$)'),
+    compile_pattern(r'LIEU DE NAISSANCE[:\s]+([A-ZÁÉÍÓÚÑ\s,]+?)(?:\s+PLACE|\s+DATE|\s*$)'),
+    compile_pattern(r'BORN IN[:\s]+([A-ZÁÉÍÓÚÑ\s,]+?)(?:\s+DATE|\s*$)'),
+    compile_pattern(r'NACIDO EN[:\s]+([A-ZÁÉÍÓÚÑ\s,]+?)(?:\s+FECHA|\s*$)'),
+)
+
+# Patrones de DNI español (se evalúan sobre el texto original, en orden)
+_DNI_NUMBER_RES = (
+    compile_pattern(r'(?i)DNI[:\s]*(\d{8}[A-Z])'),
+    compile_pattern(r'(?i)DOCUMENTO[:\s]+(\d{8}[A-Z])'),
+    compile_pattern(r'\b(\d{8}[A-Z])\b'),
+    compile_pattern(r'(?i)NACIONAL DE IDENTIDAD[:\s]*(\d{8}[A-Z])'),
+)
+_DNI_NAME_RES = (
+    compile_pattern(r'(?i)NOMBRE[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+APELLIDOS|\s+FECHA|\s*$)'),
+    compile_pattern(r'(?i)APELLIDOS[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+NOMBRE|\s+FECHA|\s*$)'),
+    # Patrón para nombre completo junto
+    compile_pattern(r'(?i)(?:NOMBRE COMPLETO|TITULAR)[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+FECHA|\s+DNI|\s*$)'),
+)
+_DNI_DATE_RES = (
+    ('fecha_emision', compile_pattern(r'(?i)(?:FECHA DE EXPEDICIÓN|EXPEDIDO)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})')),
+    ('fecha_expiracion', compile_pattern(r'(?i)(?:FECHA DE CADUCIDAD|VÁLIDO HASTA)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})')),
+    ('fecha_nacimiento', compile_pattern(r'(?i)(?:FECHA DE NACIMIENTO|NACIDO)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})')),
+)
+_DNI_BIRTH_PLACE_RE = compile_pattern(r'(?i)(?:LUGAR DE NACIMIENTO|NACIDO EN)[:\s]+([A-ZÁÉÍÓÚÑ\s,]+)')
+
+# Patrones genéricos para documentos no identificados (texto original, en orden)
+_GENERIC_ID_RES = (
+    compile_pattern(r'(?i)(?:ID|IDENTIFICATION)[:\s]*([A-Z0-9]{5,15})'),
+    compile_pattern(r'(?i)(?:NÚMERO|NUMBER)[:\s]*([A-Z0-9]{5,15})'),
+    compile_pattern(r'(?i)(?:DOC|DOCUMENTO)[:\s]*([A-Z0-9]{5,15})'),
+    compile_pattern(r'(?i)(?:IDENTITY|IDENTIDAD)[:\s]*([A-Z0-9]{5,15})'),
+    # Patrones para formatos comunes
+    compile_pattern(r'\b([A-Z]{2,3}\d{6,8})\b'),  # Formato pasaporte genérico
+    compile_pattern(r'\b(\d{7,10})\b'),  # Número genérico largo
+)
+_GENERIC_NAME_RES = (
+    compile_pattern(r'(?i)(?:NOMBRE|NAME)[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+(?:APELLIDO|SURNAME)|\s+\d|\s*$)'),
+    compile_pattern(r'(?i)(?:TITULAR|HOLDER)[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+\d|\s*$)'),
+    compile_pattern(r'(?i)(?:FULL NAME|NOMBRE COMPLETO)[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+\d|\s*$)'),
+)
+# (campo, patrón): se evalúan todos; si varios del mismo campo coinciden, el último gana
+_GENERIC_DATE_RES = (
+    ('fecha_emision', compile_pattern(r'(?i)(?:ISSUED|EMITIDO|EXPEDIDO)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})')),
+    ('fecha_expiracion', compile_pattern(r'(?i)(?:EXPIRES|EXPIRA|VENCE)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})')),
+    ('fecha_expiracion', compile_pattern(r'(?i)(?:VALID UNTIL|VÁLIDO HASTA)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})')),
+)
+
+# Patrones de nombre de cédula panameña (texto normalizado), ordenados por prioridad y especificidad.
+# 'keywords': literales de los que toda coincidencia contiene al menos uno; si no aparece
+# ninguno en el texto el patrón se omite sin ejecutar la regex (sin 'keywords' se ejecuta siempre)
+_CEDULA_PANAMA_NAME_PATTERNS = (
+    # Patrón 1: Formato estándar con TRIBUNAL ELECTORAL
+    {
+        'pattern': compile_pattern(r'TRIBUNAL\s+ELECTORAL\s+([A-Z][A-Z\s]+?)\s+(?:NOMBRE\s+USUAL|FECHA\s+DE\s+NACIMIENTO)'),
+        'name': 'tribunal_electoral_standard',
+        'keywords': ('ELECTORAL',),
+        'confidence': 0.95
+    },
+    
+    # Patrón 2: ELECTORAL seguido de nombre
+    {
+        'pattern': compile_pattern(r'ELECTORAL\s+([A-Z][A-Z\s]+?)\s+(?:NOMBRE\s+USUAL|FECHA)'),
+        'name': 'electoral_simple',
+        'keywords': ('ELECTORAL',),
+        'confidence': 0.90
+    },
+    
+    # Patrón 3: Formato con DOCUMENTO DE IDENTIDAD + número
+    {
+        'pattern': compile_pattern(r'DOCUMENTO\s+DE\s+IDENTIDAD\s+\d+\s+([A-Z][A-Z\s]+?)\s+NOMBRE\s+USUAL'),
+        'name': 'documento_identidad_numbered',
+        'keywords': ('IDENTIDAD',),
+        'confidence': 0.92
+    },
+    
+    # Patrón 4: Formato P A ... N A ... M (visto en ejemplos)
+    {
+        'pattern': compile_pattern(r'P\s+A\s+([A-Z][A-Z\s]+?)\s+N\s+A\s+([A-Z][A-Z\s]+?)\s+M'),
+        'name': 'format_p_a_n_a_m',
+        'confidence': 0.85,
+        'special_handler': 'handle_p_a_n_a_format'
+    },
+    
+    # Patrón 5: Nombre antes de NOMBRE USUAL (más flexible)
+    {
+        'pattern': compile_pattern(r'([A-Z]{2,}(?:\s+[A-Z]{2,}){1,4})\s+NOMBRE\s+USUAL'),
+        'name': 'before_nombre_usual',
+        'keywords': ('USUAL',),
+        'confidence': 0.80
+    },
+    
+    # Patrón 6: Entre PANAMA y NOMBRE USUAL
+    {
+        'pattern': compile_pattern(r'PANAMA\s+([A-Z][A-Z\s]+?)\s+NOMBRE\s+USUAL'),
+        'name': 'panama_to_nombre',
+        'keywords': ('USUAL',),
+        'confidence': 0.85
+    },
+    
+    # Patrón 7: Nombre seguido de cédula (formato alternativo)
+    {
+        'pattern': compile_pattern(r'([A-Z]{2,}(?:\s+[A-Z]{2,}){1,4})\s+\d{1,2}-\d{3,4}-\d{1,4}'),
+        'name': 'name_before_cedula',
+        'keywords': ('-',),
+        'confidence': 0.75
+    },
+    
+    # Patrón 8: Captura entre palabras clave comunes
+    {
+        'pattern': compile_pattern(r'(?:REPUBLICA\s+DE\s+PANAMA|TRIBUNAL|ELECTORAL)\s+.*?([A-Z]{2,}(?:\s+[A-Z]{2,}){1,4})\s+(?:NOMBRE|FECHA|LUGAR)'),
+        'name': 'between_keywords',
+        'keywords': ('PANAMA', 'TRIBUNAL', 'ELECTORAL'),
+        'confidence': 0.70
+    }
+)
+
+# Patrones de nombre de pasaporte (texto normalizado), en orden de preferencia
+_PASAPORTE_NAME_PATTERNS = (
+    # Patrón 1: APELLIDOS/SURNAME ... NOMBRES/GIVEN NAMES
+    {
+        'pattern': compile_pattern(r'(?:APELLIDOS|SURNAME)\s*[/]*\s*([A-Z\s]+?)\s+(?:NOMBRES|GIVEN\s+NAMES)\s*[/]*\s*([A-Z\s]+?)(?:\s+(?:SPECIMEN|FECHA|DATE|\d))'),
+        'name': 'apellidos_nombres_format',
+        'keywords': ('APELLIDOS', 'SURNAME'),
+        'confidence': 0.95,
+        'type': 'apellidos_nombres'
+    },
+    
+    # Patrón 2: SURNAME ... GIVEN NAMES (formato internacional)
+    {
+        'pattern': compile_pattern(r'SURNAME\s+([A-Z\s]+?)\s+GIVEN\s+NAMES\s+([A-Z\s]+?)(?:\s+(?:SPECIMEN|DATE|\d))'),
+        'name': 'surname_given_names',
+        'keywords': ('SURNAME',),
+        'confidence': 0.90,
+        'type': 'apellidos_nombres'
+    },
+    
+    # Patrón 3: Línea MRZ (Machine Readable Zone)
+    {
+        'pattern': compile_pattern(r'P<[A-Z]{3}([A-Z]+)<([A-Z<]+?)<<'),
+        'name': 'mrz_format',
+        'keywords': ('P<',),
+        'confidence': 0.85,
+        'type': 'mrz',
+        'special_handler': 'handle_mrz_format'
+    },
+    
+    # Patrón 4: Nombre en línea específica de pasaporte
+    {
+        'pattern': compile_pattern(r'(?:PASSPORT|PASAPORTE)\s+(?:NO|N[Oº])\s*[A-Z0-9]+\s*([A-Z\s]+?)(?:\s+(?:NATIONALITY|FECHA))'),
+        'name': 'after_passport_number',
+        'keywords': ('PASSPORT', 'PASAPORTE'),
+        'confidence': 0.75
+    }
+)
+
+# Patrones de nombre de DNI español (texto normalizado), en orden de preferencia
+_DNI_SPAIN_NAME_PATTERNS = (
+    {
+        'pattern': compile_pattern(r'(?:NOMBRE|NAME)\s*[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+(?:APELLIDOS|SURNAME|FECHA|DNI|\d))'),
+        'name': 'nombre_field',
+        'keywords': ('NOMBRE', 'NAME'),
+        'confidence': 0.90
+    },
+    {
+        'pattern': compile_pattern(r'(?:APELLIDOS|SURNAME)\s*[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+(?:NOMBRE|NAME|FECHA|\d))'),
+        'name': 'apellidos_field',
+        'keywords': ('APELLIDOS', 'SURNAME'),
+        'confidence': 0.90
+    },
+    {
+        'pattern': compile_pattern(r'(?:TITULAR|HOLDER)\s*[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+(?:FECHA|DNI|\d))'),
+        'name': 'titular_field',
+        'keywords': ('TITULAR', 'HOLDER'),
+        'confidence': 0.85
+    }
+)
+
+# Palabras ancla (en mayúsculas y sin tildes) de cada patrón etiquetado: el regex solo se evalúa si
+# alguna de sus anclas aparece en el texto. Buscar literales es mucho más barato que
+# recorrer el texto con cada expresión regular.
+_FIELD_ANCHORS = {
+    # Pasaporte
+    'passport_basic_name': ('SURNAME',),
+    'passport_issue_date': ('DATE OF ISSUE', 'FECHA DE EXPEDICION', 'ISSUED:'),
+    'passport_expiry_date': ('DATE OF EXPIRY', 'FECHA DE VENCIMIENTO', 'EXPIRES:'),
+    'passport_gender': ('SEX', 'GENDER', 'MALE', 'MASCULINO', 'FEMENINO'),
+    'passport_birth_date': ('NACIMIENTO', 'BIRTH', 'BORN', 'DOB'),
+    'passport_authority': ('AUTORIDAD', 'AUTHORITY', 'ISSUED BY', 'EMITIDO POR'),
+    'passport_nationality': ('NACIONALIDAD', 'NATIONAL', 'CITIZEN'),
+    'passport_birth_place': ('PLACE OF BIRTH', 'LUGAR DE NACIMIENTO', 'LIEU DE NAISSANCE', 'BORN IN', 'NACIDO EN'),
+    'passport_country_panama': ('REPUBLICA DE PANAMA', 'REPUBLIC OF PANAMA'),
+    'passport_country_spain': ('ESPANA', 'SPAIN'),
+    'passport_country_colombia': ('COLOMBIA',),
+    'passport_country_usa': ('ESTADOS UNIDOS', 'UNITED STATES'),
+    'passport_country_mexico': ('MEXICO',),
+    # Cédula panameña
+    'cedula_fecha_emision': ('EXPEDIDA:',),
+    'cedula_fecha_expiracion': ('EXPIRA:',),
+    'cedula_fecha_nacimiento': ('FECHA DE NACIMIENTO:',),
+    'cedula_genero': ('SEXO:',),
+    'cedula_lugar_nacimiento': ('LUGAR DE NACIMIENTO:',),
+    # DNI español
+    'dni_name': ('NOMBRE', 'APELLIDOS', 'TITULAR'),
+    'dni_fecha_emision': ('EXPEDI',),
+    'dni_fecha_expiracion': ('FECHA DE CADUCIDAD', 'VALIDO HASTA'),
+    'dni_fecha_nacimiento': ('FECHA DE NACIMIENTO', 'NACIDO'),
+    'dni_lugar_nacimiento': ('LUGAR DE NACIMIENTO', 'NACIDO EN'),
+    # Genérico
+    'generic_name': ('NOMBRE', 'NAME', 'TITULAR', 'HOLDER'),
+    'generic_fecha_emision': ('ISSUED', 'EMITIDO', 'EXPEDIDO'),
+    'generic_fecha_expiracion': ('EXPIRES', 'EXPIRA', 'VENCE', 'VALID UNTIL', 'VALIDO HASTA'),
+}
+
+# (palabra ancla, clave de _FIELD_ANCHORS); el índice es el id del patrón en Hyperscan
+_ANCHOR_KEYWORDS = tuple(
+    (keyword, key) for key, keywords in _FIELD_ANCHORS.items() for keyword in keywords
+)
+
+# Base de datos Hyperscan con todas las anclas: una sola pasada sobre el texto (si está instalado)
+ANCHOR_DATABASE = None
+# Scratch de referencia reservado en el arranque (init de Lambda); cada hilo usa una copia
+ANCHOR_SCRATCH = None
+if HYPERSCAN_AVAILABLE and os.environ.get('USE_HYPERSCAN', 'true').lower() == 'true':
+    try:
+        ANCHOR_DATABASE = hyperscan.Database()
+        ANCHOR_DATABASE.compile(
+            expressions=[re.escape(keyword).encode('utf-8') for keyword, _ in _ANCHOR_KEYWORDS],
+            ids=list(range(len(_ANCHOR_KEYWORDS))),
+            elements=len(_ANCHOR_KEYWORDS),
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(_ANCHOR_KEYWORDS)
+        )
+        ANCHOR_SCRATCH = hyperscan.Scratch(ANCHOR_DATABASE)
+    except hyperscan.error as e:
+        logger.warning("No se pudo compilar la base Hyperscan de anclas, se usa búsqueda de literales: %s", e)
+        ANCHOR_DATABASE = None
+        ANCHOR_SCRATCH = None
+
+# El espacio scratch de Hyperscan no se puede compartir entre hilos del mismo lote
+HYPERSCAN_SCRATCH = threading.local()
+
+# Meses en español por sus tres primeras letras (cubre nombre completo y abreviatura)
+_PANAMA_MONTHS = {
+    'ene': '01', 'feb': '02', 'mar': '03', 'abr': '04', 'may': '05', 'jun': '06',
+    'jul': '07', 'ago': '08', 'sep': '09', 'oct': '10', 'nov': '11', 'dic': '12'
+}
+
+# Mapeo de meses en español/inglés a números
+_MONTH_MAP = {
+    'ENE': '01', 'FEB': '02', 'MAR': '03', 'ABR': '04', 'MAY': '05', 'JUN': '06',
+    'JUL': '07', 'AGO': '08', 'SEP': '09', 'OCT': '10', 'NOV': '11', 'DIC': '12',
+    'JAN': '01', 'APR': '04', 'AUG': '08', 'DEC': '12',
+    'ENERO': '01', 'FEBRERO': '02', 'MARZO': '03', 'ABRIL': '04', 'MAYO': '05', 'JUNIO': '06',
+    'JULIO': '07', 'AGOSTO': '08', 'SEPTIEMBRE': '09', 'OCTUBRE': '10', 'NOVIEMBRE': '11', 'DICIEMBRE': '12'
+}
+
+# Fecha textual en tres partes sin signos; re (no RE2) para que \w sea Unicode como en la limpieza
+_SPANISH_DATE_PARTS_RE = re.compile(r'(\w+)[-\s]+(\w+)[-\s]+(\w+)')
+
+# Esquema fijo de los datos extraídos de un documento de identidad
+ID_DATA_FIELDS = (
+    'tipo_identificacion',
+    'numero_identificacion',
+    'nombre_completo',
+    'nombre',
+    'apellidos',
+    'genero',
+    'fecha_nacimiento',
+    'fecha_emision',
+    'fecha_expiracion',
+    'nacionalidad',
+    'pais_emision',
+    'lugar_nacimiento',
+    'autoridad_emision',
+    'texto_completo'
+)
+
+# Mapeo de tipo_identificacion al enum de documentos_identificacion.tipo_documento
+TIPO_DOCUMENTO_MAP = {
+    'dni': 'cedula',
+    'cedula_panama': 'cedula',
+    'cedula': 'cedula',
+    'pasaporte': 'pasaporte',
+    'licencia': 'licencia_conducir'
+}
+
+# Nombre del tipo de documento usado al actualizar el estado del análisis
+TIPO_DOCUMENTO_ESTADO_MAP = {
+    'dni': 'DNI',
+    'cedula_panama': 'Cédula',
+    'cedula': 'Cédula',
+    'pasaporte': 'Pasaporte'
+}
+TIPO_DOCUMENTO_ESTADO_DEFAULT = 'Documento de Identidad'
+
+# Estado final y mensaje según (requiere revisión o no se guardó, validación correcta)
+REVISION_MANUAL_ESTADO = ('requiere_revision_manual', "Documento procesado con reconciliación - Requiere revisión manual")
+ESTADO_FINAL_TABLE = {
+    (True, True): REVISION_MANUAL_ESTADO,
+    (True, False): REVISION_MANUAL_ESTADO,
+    (False, True): ('procesamiento_completado', "Documento de identidad procesado correctamente con reconciliación"),
+    (False, False): ('requiere_revision_manual', "Documento procesado con reconciliación y advertencias")
+}
+
+# Vigencia por defecto de un documento de identidad cuando falta la fecha de expiración
+DEFAULT_ID_VALIDITY_YEARS = 10
+
+# Confianza inicial de la validación y niveles (umbral mínimo, nivel) de mayor a menor
+VALIDATION_BASE_CONFIDENCE = 0.8
+CONFIDENCE_TIERS = (
+    (0.8, 'high'),
+    (0.5, 'medium'),
+    (0.0, 'low')
+)
+
+# Detalle inicial de cada documento del lote (se copia por registro)
+DOCUMENTO_DETALLE_INICIAL = {
+    'documento_id': None,
+    'estado': 'sin_procesar',
+    'tiempo': 0,
+    'tipo_detectado': None,
+    'datos_extraidos': False,
+    'reconciliacion_aplicada': False
+}
+
+# Separador de los bloques de log de inicio y resumen del lote
+LOG_BANNER = "=" * 80
+SUMMARY_LOG_TEMPLATE = "\n".join((
+    "%s",
+    "📊 RESUMEN DEL PROCESAMIENTO CON RECONCILIACIÓN",
+    "%s",
+    "✅ Documentos procesados exitosamente: %s",
+    "⚠️ Documentos que requieren revisión: %s",
+    "❌ Documentos con errores: %s",
+    "⏱️ Tiempo total: %.2f segundos",
+    "📝 Estado: %s",
+    "🔄 Documentos con reconciliación aplicada: %s",
+    "🎉 Procesamiento con reconciliación completado con resultados"
+))
+
+# Estados de un documento que llegó al final del procesamiento (exitoso o con revisión)
+PROCESSED_DOC_STATES = frozenset(('procesado', 'requiere_revision', 'datos_insuficientes'))
+
+# Campos que deben tener datos reales (no marcadores) para registrar la identificación
+CRITICAL_ID_FIELDS = ('numero_identificacion', 'nombre_completo')
+PLACEHOLDER_ID_VALUES = frozenset(('Titular no identificado', 'NO-ID'))
+
+# Código MySQL de FK sin fila padre: el documento no existe en la tabla documentos
+MYSQL_ERROR_NO_REFERENCED_ROW = 1452
+
+# Upsert de documentos_identificacion (una fila por documento; también válido con executemany)
+IDENTIFICATION_UPSERT_QUERY = """
+    INSERT INTO documentos_identificacion (
+        id_documento,
+        tipo_documento,
+        numero_documento,
+        pais_emision,
+        fecha_emision,
+        fecha_expiracion,
+        nombre_completo,
+        genero,
+        lugar_nacimiento,
+        autoridad_emision,
+        nacionalidad,
+        codigo_pais
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        tipo_documento = VALUES(tipo_documento),
+        numero_documento = VALUES(numero_documento),
+        pais_emision = VALUES(pais_emision),
+        fecha_emision = VALUES(fecha_emision),
+        fecha_expiracion = VALUES(fecha_expiracion),
+        nombre_completo = VALUES(nombre_completo),
+        genero = VALUES(genero),
+        lugar_nacimiento = VALUES(lugar_nacimiento),
+        autoridad_emision = VALUES(autoridad_emision),
+        nacionalidad = VALUES(nacionalidad),
+        codigo_pais = VALUES(codigo_pais)
+"""
+
+# Tipos cuyo extractor específico ya llama a extract_name_universal
+NAME_EXTRACTOR_TYPES = frozenset(('pasaporte', 'cedula_panama'))
+
+# País por defecto según el tipo de identificación
+DEFAULT_COUNTRY_BY_TIPO = {
+    'cedula_panama': 'Panamá',
+    'cedula': 'Panamá',  # Asumiendo que la mayoría son panameñas
+    'dni': 'España',
+    'pasaporte': 'Desconocido',  # Los pasaportes pueden ser de cualquier país
+    'licencia': 'Panamá'
+}
+
+# País y nacionalidad que se infieren del tipo cuando no se extrajo el país
+PAIS_INFERIDO_POR_TIPO = {
+    'cedula_panama': ('Panamá', None),
+    'dni': ('España', 'Española')
+}
+
+def dumps_json(data):
+    """Serializa a JSON sin escapar caracteres no ASCII; usa orjson si está disponible"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(data).decode('utf-8')
+        except TypeError:
+            # Tipos no soportados por orjson: usar el serializador estándar
+            pass
+    return json.dumps(data, ensure_ascii=False)
+
+def load_json_column(value):
+    """
+    Decodifica una columna JSON leída de la base de datos.
+    dict/list se devuelven tal cual; str/bytes se parsean (con orjson si está disponible).
+    """
+    if not value:
+        return None
+    if isinstance(value, (dict, list)):
+        return value
+    if ORJSON_AVAILABLE:
+        return orjson.loads(value)
+    return json.loads(value)
+
+def extraction_data_unchanged(document_data, id_data, confidence, is_valid):
+    """
+    Indica si la fila de documentos ya contiene exactamente estos datos extraídos,
+    confianza y validación (p. ej. reentrega del mismo mensaje SQS).
+    id_data: datos extraídos (dict serializable a JSON, sin volver a parsear)
+    """
+    stored = document_data.get('datos_extraidos_ia') if document_data else None
+    stored_confidence = document_data.get('confianza_extraccion') if document_data else None
+    if not stored or stored_confidence is None:
+        return False
+    
+    try:
+        return (
+            abs(float(stored_confidence) - confidence) < 1e-6
+            and bool(document_data.get('validado_manualmente')) == bool(is_valid)
+            and load_json_column(stored) == id_data
+        )
+    except (TypeError, ValueError):
+        return False
 
 def get_extracted_data_from_db(document_id):
     """
     Recupera los datos ya extraídos por textract_callback de la base de datos.
     """
     try:
-        start_time = time.time()
-        # Obtener documento
-        document_data = get_document_by_id(document_id)
+        start_time = time.monotonic()
+        # Obtener documento y su último análisis en un solo viaje a la base de datos
+        document_data = get_document_with_latest_analysis(document_id)
         
         if not document_data:
-            logger.error(f"No se encontró el documento {document_id} en la base de datos")
+            logger.error("No se encontró el documento %s en la base de datos", document_id)
             return None
         
-        # Obtener los datos extraídos del campo JSON
-        extracted_data = {}
-        if document_data.get('datos_extraidos_ia'):
-            try:
-                # Si ya es un diccionario, usarlo directamente
-                if isinstance(document_data['datos_extraidos_ia'], dict):
-                    extracted_data = document_data['datos_extraidos_ia']
-                else:
-                    # Si es una cadena JSON, deserializarla
-                    extracted_data = json.loads(document_data['datos_extraidos_ia'])
-            except json.JSONDecodeError:
-                logger.error(f"Error al decodificar datos_extraidos_ia para documento {document_id}")
-                return None
-        
-        # Obtener texto extraído y datos analizados
-        query = """
-        SELECT texto_extraido, entidades_detectadas, metadatos_extraccion, estado_analisis, tipo_documento
-        FROM analisis_documento_ia
-        WHERE id_documento = %s
-        ORDER BY fecha_analisis DESC
-        LIMIT 1
-        """
+        # Separar las columnas del análisis de las del documento
+        analysis_data = {
+            key[len('analisis_'):]: document_data.pop(key)
+            for key in [key for key in document_data if key.startswith('analisis_')]
+        }
         
-        analysis_results = execute_query(query, (document_id,))
+        # Obtener los datos extraídos del campo JSON
+        try:
+            extracted_data = load_json_column(document_data.get('datos_extraidos_ia')) or {}
+        except json.JSONDecodeError:
+            logger.error("Error al decodificar datos_extraidos_ia para documento %s", document_id)
+            return None
         
-        if not analysis_results:
-            logger.warning(f"No se encontró análisis en base de datos para documento {document_id}")
+        # Texto extraído y datos analizados. Si datos_extraidos_ia ya trae el texto
+        # completo (reprocesamiento), la consulta no transfiere texto_extraido.
+        if not analysis_data.get('id'):
+            logger.warning("No se encontró análisis en base de datos para documento %s", document_id)
             # Continuar con lo que tengamos en datos_extraidos_ia
         else:
-            analysis_data = analysis_results[0]
+            get_analysis = analysis_data.get
             
             # Agregar texto completo
-            if analysis_data.get('texto_extraido'):
-                extracted_data['texto_completo'] = analysis_data['texto_extraido']
+            texto_extraido = get_analysis('texto_extraido')
+            if texto_extraido:
+                extracted_data['texto_completo'] = texto_extraido
             
-            # Agregar entidades detectadas
-            if analysis_data.get('entidades_detectadas'):
+            # Agregar entidades detectadas y metadatos de extracción
+            for column, key in (('entidades_detectadas', 'entidades'), ('metadatos_extraccion', 'metadatos_extraccion')):
                 try:
-                    entidades = json.loads(analysis_data['entidades_detectadas']) if isinstance(analysis_data['entidades_detectadas'], str) else analysis_data['entidades_detectadas']
-                    extracted_data['entidades'] = entidades
+                    value = load_json_column(get_analysis(column))
                 except json.JSONDecodeError:
-                    logger.warning(f"Error al decodificar entidades_detectadas para documento {document_id}")
-            
-            # Agregar metadatos de extracción
-            if analysis_data.get('metadatos_extraccion'):
-                try:
-                    metadatos = json.loads(analysis_data['metadatos_extraccion']) if isinstance(analysis_data['metadatos_extraccion'], str) else analysis_data['metadatos_extraccion']
-                    extracted_data['metadatos_extraccion'] = metadatos
-                except json.JSONDecodeError:
-                    logger.warning(f"Error al decodificar metadatos_extraccion para documento {document_id}")
+                    logger.warning("Error al decodificar %s para documento %s", column, document_id)
+                    continue
+                if value:
+                    extracted_data[key] = value
             
             # Agregar tipo de documento detectado
-            if analysis_data.get('tipo_documento'):
-                extracted_data['tipo_documento_detectado'] = analysis_data['tipo_documento']
+            tipo_documento = get_analysis('tipo_documento')
+            if tipo_documento:
+                extracted_data['tipo_documento_detectado'] = tipo_documento
         
         # Registrar tiempo de consulta
-        logger.info(f"Datos recuperados para documento {document_id} en {time.time() - start_time:.2f} segundos")
+        logger.info("Datos recuperados para documento %s en %.2f segundos", document_id, time.monotonic() - start_time)
         
         return {
             'document_id': document_id,
@@ -124,33 +811,65 @@ def get_extracted_data_from_db(document_id):
         }
         
     except Exception as e:
-        logger.error(f"Error al recuperar datos de documento {document_id}: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error al recuperar datos de documento %s: %s", document_id, e)
         return None
     
-def register_document_identification_improved(document_id, id_data):
+def find_missing_critical_fields(id_data):
+    """Campos críticos sin datos reales (vacíos, AUTO-* o marcadores de relleno)"""
+    missing_critical = []
+    for field in CRITICAL_ID_FIELDS:
+        value = id_data.get(field)
+        if not value or value.startswith('AUTO-') or value in PLACEHOLDER_ID_VALUES:
+            missing_critical.append(field)
+    return missing_critical
+
+def build_identification_params(document_id, id_data, today=None):
+    """
+    Parámetros de IDENTIFICATION_UPSERT_QUERY para un documento, en el orden de
+    sus columnas. Completa las fechas faltantes con los valores por defecto.
+    """
+    # Leer cada campo una sola vez
+    get_field = id_data.get
+    pais_emision = get_field('pais_emision')
+    fecha_emision = get_field('fecha_emision')
+    fecha_expiracion = get_field('fecha_expiracion')
+    
+    # Validar fechas
+    if not fecha_emision or not fecha_expiracion:
+        logger.warning("⚠️ Fechas incompletas - Emisión: %s, Expiración: %s", fecha_emision, fecha_expiracion)
+        fecha_emision, fecha_expiracion = ensure_id_date_defaults(fecha_emision, fecha_expiracion, today)
+    
+    return (
+        document_id,
+        # Mapear tipo_identificacion al enum de la tabla
+        TIPO_DOCUMENTO_MAP.get(get_field('tipo_identificacion', 'desconocido'), 'otro'),
+        get_field('numero_identificacion'),
+        pais_emision,
+        fecha_emision,
+        fecha_expiracion,
+        get_field('nombre_completo'),
+        get_field('genero'),
+        get_field('lugar_nacimiento'),
+        get_field('autoridad_emision'),
+        get_field('nacionalidad'),
+        get_country_code(pais_emision)
+    )
+
+def register_document_identification_improved(document_id, id_data, today=None):
     """
-    Versión mejorada que NO inserta datos falsos
+    Versión mejorada que NO inserta datos falsos.
+    today: fecha de referencia para las fechas por defecto (calculada una vez por lote)
     """
     
     # ==================== VALIDACIÓN PREVIA ====================
     
     # Verificar que tenemos datos mínimos reales
-    required_real_data = [
-        'numero_identificacion',
-        'nombre_completo'
-    ]
-    
-    missing_critical = []
-    for field in required_real_data:
-        value = id_data.get(field)
-        if not value or value.startswith('AUTO-') or value in ['Titular no identificado', 'NO-ID']:
-            missing_critical.append(field)
+    missing_critical = find_missing_critical_fields(id_data)
     
     # Si faltan datos críticos, NO insertar y marcar para revisión manual
     if missing_critical:
-        logger.error(f"❌ Datos críticos faltantes: {missing_critical}")
-        logger.error(f"❌ NO SE INSERTARÁ en base de datos. Documento requiere revisión manual.")
+        logger.error("❌ Datos críticos faltantes: %s", missing_critical)
+        logger.error("❌ NO SE INSERTARÁ en base de datos. Documento requiere revisión manual.")
         
         # Marcar documento para revisión manual en lugar de insertar datos falsos
         try:
@@ -161,277 +880,245 @@ def register_document_identification_improved(document_id, id_data):
             )
             return False
         except Exception as e:
-            logger.error(f"Error al marcar para revisión manual: {str(e)}")
+            logger.error("Error al marcar para revisión manual: %s", e)
             return False
     
     # ==================== PREPARACIÓN DE DATOS ====================
     
-    # Mapear tipo_identificacion al enum de la tabla
-    tipo_documento_map = {
-        'dni': 'cedula',
-        'cedula_panama': 'cedula', 
-        'cedula': 'cedula',
-        'pasaporte': 'pasaporte',
-        'licencia': 'licencia_conducir'
-    }
-    
+    # Parámetros del upsert (tipo mapeado al enum, código de país y fechas por defecto);
+    # se desempaquetan para los logs
+    params = build_identification_params(document_id, id_data, today)
+    (_, tipo_documento, numero_identificacion, pais_emision, fecha_emision, fecha_expiracion,
+     nombre_completo, _, lugar_nacimiento, autoridad_emision, nacionalidad, codigo_pais) = params
     tipo_identificacion = id_data.get('tipo_identificacion', 'desconocido')
-    tipo_documento = tipo_documento_map.get(tipo_identificacion, 'otro')
-    
-    # Generar código de país
-    codigo_pais = get_country_code(id_data.get('pais_emision', ''))
-    
-    # ==================== VALIDACIONES ADICIONALES ====================
-    
-    # Validar fechas
-    fecha_emision = id_data.get('fecha_emision')
-    fecha_expiracion = id_data.get('fecha_expiracion')
-    
-    if not fecha_emision or not fecha_expiracion:
-        logger.warning(f"⚠️ Fechas incompletas - Emisión: {fecha_emision}, Expiración: {fecha_expiracion}")
-        # Solo usar fechas por defecto si realmente no hay datos
-        if not fecha_emision:
-            fecha_emision = datetime.now().strftime('%Y-%m-%d')
-        if not fecha_expiracion:
-            # Calcular basado en tipo de documento
-            try:
-                base_date = datetime.strptime(fecha_emision, '%Y-%m-%d')
-                years_to_add = 10 if tipo_documento == 'pasaporte' else 10
-                exp_date = base_date.replace(year=base_date.year + years_to_add)
-                fecha_expiracion = exp_date.strftime('%Y-%m-%d')
-            except:
-                fecha_expiracion = (datetime.now() + timedelta(days=3650)).strftime('%Y-%m-%d')
+    operation = 'registro'
     
     try:
-        # ==================== VERIFICAR DOCUMENTO EXISTENTE ====================
-        
-        check_doc_query = """
-        SELECT COUNT(*) as count FROM documentos WHERE id_documento = %s
-        """
-        doc_result = execute_query(check_doc_query, (document_id,))
+        # ==================== PRESERVAR REGISTRO EXISTENTE ====================
         
-        if not doc_result or doc_result[0].get('count', 0) == 0:
-            logger.error(f"❌ El documento {document_id} no existe en la tabla 'documentos'")
-            return False
-        
-        # ==================== VERIFICAR SI YA EXISTE REGISTRO ====================
-        
-        query_check = """
-        SELECT id_documento FROM documentos_identificacion WHERE id_documento = %s
-        """
-        existing = execute_query(query_check, (document_id,))
+        # preserve_identification_data lee el registro actual: si no hay, es una inserción
+        try:
+            existing = preserve_identification_data(
+                document_id, 
+                reason="Actualización con nuevos datos extraídos"
+            )
+        except Exception as preserve_error:
+            logger.warning("⚠️ Error al preservar datos: %s", preserve_error)
+            existing = False
         
         if existing:
-            # PRESERVAR DATOS ANTES DE ACTUALIZAR
-            logger.info(f"📸 Preservando datos existentes antes de actualizar")
-            try:
-                preserve_identification_data(
-                    document_id, 
-                    reason="Actualización con nuevos datos extraídos"
-                )
-            except Exception as preserve_error:
-                logger.warning(f"⚠️ Error al preservar datos: {str(preserve_error)}")
-            
-            # ACTUALIZAR registro existente
-            query = """
-            UPDATE documentos_identificacion 
-            SET tipo_documento = %s,
-                numero_documento = %s,
-                pais_emision = %s,
-                fecha_emision = %s,
-                fecha_expiracion = %s,
-                nombre_completo = %s,
-                genero = %s,
-                lugar_nacimiento = %s,
-                autoridad_emision = %s,
-                nacionalidad = %s,
-                codigo_pais = %s
-            WHERE id_documento = %s
-            """
-            params = (
-                tipo_documento,
-                id_data.get('numero_identificacion'),
-                id_data.get('pais_emision'),
-                fecha_emision,
-                fecha_expiracion,
-                id_data.get('nombre_completo'),
-                id_data.get('genero'),
-                id_data.get('lugar_nacimiento'),
-                id_data.get('autoridad_emision'),
-                id_data.get('nacionalidad'),
-                codigo_pais,
-                document_id
-            )
-            operation = "ACTUALIZACIÓN"
-        else:
-            # INSERTAR nuevo registro
-            query = """
-            INSERT INTO documentos_identificacion (
-                id_documento,
-                tipo_documento,
-                numero_documento,
-                pais_emision,
-                fecha_emision,
-                fecha_expiracion,
-                nombre_completo,
-                genero,
-                lugar_nacimiento,
-                autoridad_emision,
-                nacionalidad,
-                codigo_pais
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            params = (
-                document_id,
-                tipo_documento,
-                id_data.get('numero_identificacion'),
-                id_data.get('pais_emision'),
-                fecha_emision,
-                fecha_expiracion,
-                id_data.get('nombre_completo'),
-                id_data.get('genero'),
-                id_data.get('lugar_nacimiento'),
-                id_data.get('autoridad_emision'),
-                id_data.get('nacionalidad'),
-                codigo_pais
-            )
-            operation = "INSERCIÓN"
+            logger.info("📸 Datos existentes preservados antes de actualizar")
+        operation = "ACTUALIZACIÓN" if existing else "INSERCIÓN"
         
         # ==================== EJECUTAR CONSULTA ====================
         
-        logger.info(f"🔍 {operation} para {tipo_documento.upper()}")
-        logger.info(f"📝 Número: {id_data.get('numero_identificacion')}")
-        logger.info(f"👤 Nombre: {id_data.get('nombre_completo')}")
-        logger.info(f"🌍 País: {id_data.get('pais_emision')} ({codigo_pais})")
-        logger.info(f"📅 Vigencia: {fecha_emision} → {fecha_expiracion}")
-        
-        if tipo_documento == 'pasaporte':
-            logger.info(f"📔 Datos específicos de PASAPORTE:")
-            if id_data.get('lugar_nacimiento'):
-                logger.info(f"   🏠 Lugar nacimiento: {id_data.get('lugar_nacimiento')}")
-            if id_data.get('autoridad_emision'):
-                logger.info(f"   🏛️ Autoridad: {id_data.get('autoridad_emision')}")
-            if id_data.get('nacionalidad'):
-                logger.info(f"   🏳️ Nacionalidad: {id_data.get('nacionalidad')}")
-        
-        # Ejecutar la consulta
-        execute_query(query, params, fetch=False)
-        
+        # Resumen de lo que se guarda (solo si el nivel INFO está activo)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("🔍 %s para %s", operation, tipo_documento.upper())
+            logger.info("📝 Número: %s", numero_identificacion)
+            logger.info("👤 Nombre: %s", nombre_completo)
+            logger.info("🌍 País: %s (%s)", pais_emision, codigo_pais)
+            logger.info("📅 Vigencia: %s → %s", fecha_emision, fecha_expiracion)
+            
+            if tipo_documento == 'pasaporte':
+                logger.info("📔 Datos específicos de PASAPORTE:")
+                if lugar_nacimiento:
+                    logger.info("   🏠 Lugar nacimiento: %s", lugar_nacimiento)
+                if autoridad_emision:
+                    logger.info("   🏛️ Autoridad: %s", autoridad_emision)
+                if nacionalidad:
+                    logger.info("   🏳️ Nacionalidad: %s", nacionalidad)
+        
+        # Upsert en una sola sentencia (pymysql lanza excepción si falla). La FK hacia
+        # documentos valida que el documento exista, sin una consulta previa
+        try:
+            affected_rows = execute_query(IDENTIFICATION_UPSERT_QUERY, params, fetch=False, return_rowcount=True)
+        except IntegrityError as integrity_error:
+            # Otras violaciones (clave duplicada, NOT NULL...) siguen por el manejo general
+            if integrity_error.args[0] != MYSQL_ERROR_NO_REFERENCED_ROW:
+                raise
+            logger.error("❌ El documento %s no existe en la tabla 'documentos'", document_id)
+            return False
+
         # ==================== VERIFICAR ÉXITO ====================
-        
-        verify_query = """
-        SELECT numero_documento, nombre_completo, tipo_documento 
-        FROM documentos_identificacion 
-        WHERE id_documento = %s
-        """
-        verify_result = execute_query(verify_query, (document_id,))
-        
-        if verify_result and len(verify_result) > 0:
-            saved_data = verify_result[0]
-            logger.info(f"✅ {operation} exitosa verificada:")
-            logger.info(f"   📝 Número guardado: {saved_data.get('numero_documento')}")
-            logger.info(f"   👤 Nombre guardado: {saved_data.get('nombre_completo')}")
-            logger.info(f"   📋 Tipo guardado: {saved_data.get('tipo_documento')}")
+
+        # El número de filas afectadas confirma la escritura sin otra consulta
+        # (1 inserción, 2 actualización; con CLIENT.FOUND_ROWS una fila sin cambios cuenta 1)
+        if affected_rows >= 1:
+            logger.info("✅ %s exitosa (%s fila(s) afectada(s))", operation, affected_rows)
             return True
         else:
-            logger.error(f"❌ Verificación falló: No se encontraron datos guardados")
+            logger.error("❌ Verificación falló: ninguna fila afectada en documentos_identificacion")
             return False
             
     except Exception as e:
-        logger.error(f"❌ Error en {operation if 'operation' in locals() else 'registro'}: {str(e)}")
-        logger.error(f"📊 Datos que se intentaban guardar:")
-        logger.error(f"   Tipo: {tipo_identificacion} → {tipo_documento}")
-        logger.error(f"   Número: {id_data.get('numero_identificacion')}")
-        logger.error(f"   Nombre: {id_data.get('nombre_completo')}")
+        logger.error("❌ Error en %s: %s", operation, e)
+        logger.error("📊 Datos que se intentaban guardar:")
+        logger.error("   Tipo: %s → %s", tipo_identificacion, tipo_documento)
+        logger.error("   Número: %s", numero_identificacion)
+        logger.error("   Nombre: %s", nombre_completo)
         
         return False
 
-def get_country_code(country_name):
-    """Convierte nombre de país a código ISO de 3 letras con manejo de errores mejorado"""
-    if not country_name or not isinstance(country_name, str):
-        logger.debug(f"🔍 Nombre de país inválido: {country_name}")
-        return None
-        
-    # Limpiar el nombre del país
-    clean_country = country_name.strip()
-    if not clean_country:
-        return None
+def register_document_identifications_batch(records, today=None):
+    """
+    Registra varios documentos de identidad con un solo executemany: pymysql agrupa
+    las filas en INSERT ... VALUES (...),(...) y se confirma una sola vez.
+    records: lista de (document_id, id_data). Los documentos sin datos críticos no se
+    insertan (requieren revisión manual, como en register_document_identification_improved).
+    Retorna (filas afectadas, lista de document_id omitidos). Si la escritura falla,
+    la excepción se propaga y no se guarda ninguna fila del lote.
+    """
+    batch_params = []
+    batch_ids = []
+    skipped = []
+    
+    for document_id, id_data in records:
+        missing_critical = find_missing_critical_fields(id_data)
+        if missing_critical:
+            logger.warning("⚠️ Documento %s omitido del lote, datos críticos faltantes: %s", document_id, missing_critical)
+            skipped.append(document_id)
+            continue
         
-    country_codes = {
-        # Países principales
-        'Panamá': 'PAN', 'Panama': 'PAN', 'PANAMÁ': 'PAN', 'PANAMA': 'PAN',
-        'España': 'ESP', 'Spain': 'ESP', 'ESPAÑA': 'ESP', 'SPAIN': 'ESP',
-        
-        # Américas
-        'Estados Unidos': 'USA', 'United States': 'USA', 'USA': 'USA', 'US': 'USA',
-        'Colombia': 'COL', 'COLOMBIA': 'COL',
-        'México': 'MEX', 'Mexico': 'MEX', 'MÉXICO': 'MEX', 'MEXICO': 'MEX',
-        'Argentina': 'ARG', 'ARGENTINA': 'ARG',
-        'Brasil': 'BRA', 'Brazil': 'BRA', 'BRASIL': 'BRA', 'BRAZIL': 'BRA',
-        'Chile': 'CHL', 'CHILE': 'CHL',
-        'Perú': 'PER', 'Peru': 'PER', 'PERÚ': 'PER', 'PERU': 'PER',
-        'Ecuador': 'ECU', 'ECUADOR': 'ECU',
-        'Venezuela': 'VEN', 'VENEZUELA': 'VEN',
-        'Costa Rica': 'CRI', 'COSTA RICA': 'CRI',
-        'Guatemala': 'GTM', 'GUATEMALA': 'GTM',
-        'Honduras': 'HND', 'HONDURAS': 'HND',
-        'Nicaragua': 'NIC', 'NICARAGUA': 'NIC',
-        'El Salvador': 'SLV', 'EL SALVADOR': 'SLV',
-        'República Dominicana': 'DOM', 'REPÚBLICA DOMINICANA': 'DOM',
-        'Cuba': 'CUB', 'CUBA': 'CUB',
-        'Jamaica': 'JAM', 'JAMAICA': 'JAM',
-        'Canadá': 'CAN', 'Canada': 'CAN', 'CANADÁ': 'CAN', 'CANADA': 'CAN',
-        
-        # Europa
-        'Francia': 'FRA', 'France': 'FRA', 'FRANCIA': 'FRA', 'FRANCE': 'FRA',
-        'Reino Unido': 'GBR', 'United Kingdom': 'GBR', 'REINO UNIDO': 'GBR', 'UK': 'GBR',
-        'Italia': 'ITA', 'Italy': 'ITA', 'ITALIA': 'ITA', 'ITALY': 'ITA',
-        'Alemania': 'DEU', 'Germany': 'DEU', 'ALEMANIA': 'DEU', 'GERMANY': 'DEU',
-        'Portugal': 'PRT', 'PORTUGAL': 'PRT',
-        'Países Bajos': 'NLD', 'Netherlands': 'NLD', 'PAÍSES BAJOS': 'NLD',
-        
-        # Asia
-        'China': 'CHN', 'CHINA': 'CHN',
-        'Japón': 'JPN', 'Japan': 'JPN', 'JAPÓN': 'JPN', 'JAPAN': 'JPN',
-        'India': 'IND', 'INDIA': 'IND',
-        'Corea del Sur': 'KOR', 'South Korea': 'KOR', 'COREA DEL SUR': 'KOR'
-    }
+        batch_ids.append(document_id)
+        batch_params.append(build_identification_params(document_id, id_data, today))
+    
+    if not batch_params:
+        return 0, skipped
+    
+    # El histórico de todo el lote se conserva con un solo INSERT ... SELECT antes del upsert
+    try:
+        preserve_identification_data_batch(batch_ids, reason="Actualización con nuevos datos extraídos")
+    except Exception as preserve_error:
+        logger.warning("⚠️ Error al preservar datos del lote: %s", preserve_error)
+    
+    affected_rows = execute_query(
+        IDENTIFICATION_UPSERT_QUERY, batch_params, fetch=False, return_rowcount=True, many=True
+    )
+    logger.info("✅ Lote de identificación: %s documento(s), %s fila(s) afectada(s)", len(batch_params), affected_rows)
+    return affected_rows, skipped
+
+def ensure_id_date_defaults(fecha_emision, fecha_expiracion, today=None):
+    """
+    Completa las fechas de emisión/expiración faltantes con valores por defecto.
+    Solo se usan si realmente no hay datos; la expiración se calcula a 10 años
+    de la emisión. Devuelve la tupla (fecha_emision, fecha_expiracion).
+    """
+    if fecha_emision and fecha_expiracion:
+        return fecha_emision, fecha_expiracion
+    
+    today = today or date.today()
+    if not fecha_emision:
+        fecha_emision = today.isoformat()
+    if not fecha_expiracion:
+        fecha_expiracion = default_expiry_date(fecha_emision, today)
     
+    return fecha_emision, fecha_expiracion
+
+def add_years(base_date, years):
+    """Suma años a una fecha; el 29 de febrero pasa al 28 si el año destino no es bisiesto"""
     try:
-        # Buscar coincidencia exacta primero
-        if clean_country in country_codes:
-            return country_codes[clean_country]
-        
-        # Buscar coincidencia parcial (case-insensitive)
-        country_upper = clean_country.upper()
-        for country, code in country_codes.items():
-            if country.upper() == country_upper:
-                return code
-        
-        # Si no se encuentra, intentar búsqueda parcial
-        for country, code in country_codes.items():
-            if country_upper in country.upper() or country.upper() in country_upper:
-                logger.info(f"🔍 Coincidencia parcial encontrada: '{clean_country}' -> {code}")
-                return code
-        
-        # Si no se encuentra nada, log de debug solamente
-        logger.debug(f"🔍 Código de país no encontrado para: '{clean_country}'")
+        return base_date.replace(year=base_date.year + years)
+    except ValueError:
+        return base_date.replace(year=base_date.year + years, day=28)
+
+def default_expiry_date(fecha_emision, today):
+    """Expiración por defecto: DEFAULT_ID_VALIDITY_YEARS después de la emisión (ISO)"""
+    try:
+        base_date = date.fromisoformat(fecha_emision)
+    except (TypeError, ValueError):
+        # Emisión ilegible: contar la vigencia desde hoy
+        base_date = today
+    # Solo cambia el año (entero); sin aritmética de días ni strptime
+    return add_years(base_date, DEFAULT_ID_VALIDITY_YEARS).isoformat()
+
+def normalize_country_key(country_name):
+    """Clave de búsqueda de país: mayúsculas y sin tildes ('Panamá' -> 'PANAMA')"""
+    decomposed = unicodedata.normalize('NFKD', country_name.strip().upper())
+    return decomposed.encode('ascii', 'ignore').decode('ascii')
+
+# Código ISO de 3 letras por nombre de país (clave normalizada con normalize_country_key)
+_COUNTRY_CODES = {normalize_country_key(name): code for name, code in (
+    # Países principales
+    ('Panamá', 'PAN'),
+    ('España', 'ESP'), ('Spain', 'ESP'),
+    
+    # Américas
+    ('Estados Unidos', 'USA'), ('United States', 'USA'), ('USA', 'USA'), ('US', 'USA'),
+    ('Colombia', 'COL'),
+    ('México', 'MEX'),
+    ('Argentina', 'ARG'),
+    ('Brasil', 'BRA'), ('Brazil', 'BRA'),
+    ('Chile', 'CHL'),
+    ('Perú', 'PER'),
+    ('Ecuador', 'ECU'),
+    ('Venezuela', 'VEN'),
+    ('Costa Rica', 'CRI'),
+    ('Guatemala', 'GTM'),
+    ('Honduras', 'HND'),
+    ('Nicaragua', 'NIC'),
+    ('El Salvador', 'SLV'),
+    ('República Dominicana', 'DOM'),
+    ('Cuba', 'CUB'),
+    ('Jamaica', 'JAM'),
+    ('Canadá', 'CAN'),
+    
+    # Europa
+    ('Francia', 'FRA'), ('France', 'FRA'),
+    ('Reino Unido', 'GBR'), ('United Kingdom', 'GBR'), ('UK', 'GBR'),
+    ('Italia', 'ITA'), ('Italy', 'ITA'),
+    ('Alemania', 'DEU'), ('Germany', 'DEU'),
+    ('Portugal', 'PRT'),
+    ('Países Bajos', 'NLD'), ('Netherlands', 'NLD'),
+    
+    # Asia
+    ('China', 'CHN'),
+    ('Japón', 'JPN'), ('Japan', 'JPN'),
+    ('India', 'IND'),
+    ('Corea del Sur', 'KOR'), ('South Korea', 'KOR'),
+)}
+# Pares (clave, código) para la búsqueda parcial, construidos una sola vez
+_COUNTRY_CODE_ITEMS = tuple(_COUNTRY_CODES.items())
+
+@lru_cache(maxsize=256)
+def lookup_country_code(country_key):
+    """Busca el código de país para una clave ya normalizada (resultado cacheado)"""
+    # Buscar coincidencia exacta primero
+    code = _COUNTRY_CODES.get(country_key)
+    if code:
+        return code
+    
+    # Si no se encuentra, intentar búsqueda parcial
+    for country, code in _COUNTRY_CODE_ITEMS:
+        if country_key in country or country in country_key:
+            logger.info("🔍 Coincidencia parcial encontrada: '%s' -> %s", country_key, code)
+            return code
+    
+    # Si no se encuentra nada, log de debug solamente
+    logger.debug("🔍 Código de país no encontrado para: '%s'", country_key)
+    return None
+
+def get_country_code(country_name):
+    """Convierte nombre de país a código ISO de 3 letras (None si no es un texto válido)"""
+    if not country_name or not isinstance(country_name, str):
+        logger.debug("🔍 Nombre de país inválido: %s", country_name)
         return None
-        
-    except Exception as e:
-        logger.error(f"❌ Error al procesar código de país '{clean_country}': {str(e)}")
+    
+    # Nombres sin tildes ('PANAMA', 'Spain'): coincidencia exacta sin normalizar
+    code = _COUNTRY_CODES.get(country_name.strip().upper())
+    if code:
+        return code
+    
+    # Mayúsculas y sin tildes: 'Panamá', 'PANAMA' y 'panamá' comparten la misma entrada
+    country_key = normalize_country_key(country_name)
+    if not country_key:
         return None
+    
+    return lookup_country_code(country_key)
 
 def get_default_country(tipo_identificacion):
     """Retorna el país por defecto según el tipo de identificación"""
-    defaults = {
-        'cedula_panama': 'Panamá',
-        'cedula': 'Panamá',  # Asumiendo que la mayoría son panameñas
-        'dni': 'España',
-        'pasaporte': 'Desconocido',  # Los pasaportes pueden ser de cualquier país
-        'licencia': 'Panamá'
-    }
-    return defaults.get(tipo_identificacion, 'Desconocido')
+    return DEFAULT_COUNTRY_BY_TIPO.get(tipo_identificacion, 'Desconocido')
 
 # Añadir función para visualizar cambios después del procesamiento
 def log_identification_changes(document_id):
@@ -439,35 +1126,40 @@ def log_identification_changes(document_id):
     Registra y muestra los cambios detectados en los datos de identificación
     """
     try:
-        # Obtener el último registro histórico
-        history_query = """
-        SELECT h.*, v.numero_version
-        FROM historico_documentos_identificacion h
-        JOIN versiones_documento v ON h.id_version = v.id_version
-        WHERE h.id_documento = %s
-        ORDER BY h.fecha_preservacion DESC
-        LIMIT 1
+        # Último registro histórico y datos actuales en una sola consulta
+        changes_query = """
+        SELECT h.numero_documento AS hist_numero_documento,
+               h.nombre_completo AS hist_nombre_completo,
+               h.fecha_expiracion AS hist_fecha_expiracion,
+               c.id_documento AS actual_id_documento,
+               c.numero_documento, c.nombre_completo, c.fecha_expiracion
+        FROM (
+            SELECT h.id_documento, h.numero_documento, h.nombre_completo, h.fecha_expiracion
+            FROM historico_documentos_identificacion h
+            JOIN versiones_documento v ON h.id_version = v.id_version
+            WHERE h.id_documento = %s
+            ORDER BY h.fecha_preservacion DESC
+            LIMIT 1
+        ) h
+        LEFT JOIN documentos_identificacion c ON c.id_documento = h.id_documento
         """
         
-        historical = execute_query(history_query, (document_id,))
+        rows = execute_query(changes_query, (document_id,))
         
-        if not historical:
+        if not rows:
             logger.info("📋 No hay datos históricos para comparar")
             return
         
-        # Obtener datos actuales
-        current_query = """
-        SELECT * FROM documentos_identificacion
-        WHERE id_documento = %s
-        """
-        
-        current = execute_query(current_query, (document_id,))
-        
-        if not current:
+        row = rows[0]
+        if row['actual_id_documento'] is None:
             return
         
-        hist = historical[0]
-        curr = current[0]
+        hist = {
+            'numero_documento': row['hist_numero_documento'],
+            'nombre_completo': row['hist_nombre_completo'],
+            'fecha_expiracion': row['hist_fecha_expiracion']
+        }
+        curr = row
         
         # Comparar y registrar cambios
         changes = []
@@ -482,98 +1174,185 @@ def log_identification_changes(document_id):
             changes.append(f"📅 Expiración: {hist['fecha_expiracion']} → {curr['fecha_expiracion']}")
         
         if changes:
-            logger.info(f"🔄 Cambios detectados en documento {document_id}:")
+            logger.info("🔄 Cambios detectados en documento %s:", document_id)
             for change in changes:
-                logger.info(f"   {change}")
+                logger.info("   %s", change)
         else:
-            logger.info(f"✅ Sin cambios en los datos de identificación")
+            logger.info("✅ Sin cambios en los datos de identificación")
             
     except Exception as e:
-        logger.error(f"Error al registrar cambios: {str(e)}")
+        logger.error("Error al registrar cambios: %s", e)
 
-def extract_cedula_panama_data_improved(text, text_upper, extracted_data):
+def get_panama_window(marker_idx, text_length):
+    """
+    Retorna (inicio, fin) de la zona donde buscar campos de una cédula panameña:
+    desde un margen antes del encabezado REPUBLICA DE PANAMA hasta PANAMA_WINDOW_CHARS
+    después. Sin encabezado (marker_idx < 0) es todo el texto.
+    """
+    if marker_idx < 0:
+        return 0, text_length
+    return max(0, marker_idx - _PANAMA_MARKER_MARGIN), min(text_length, marker_idx + PANAMA_WINDOW_CHARS)
+
+def find_panama_marker(text):
+    """Posición del encabezado REPUBLICA DE PANAMA (con o sin tildes), o -1"""
+    for marker in _PANAMA_MARKERS:
+        idx = text.find(marker)
+        if idx >= 0:
+            return idx
+    return -1
+
+def search_window(pattern, text, start, end):
+    """Busca en text[start:end] y, si no hay coincidencia, en todo el texto"""
+    match = pattern.search(text, start, end)
+    if match is not None and match.end() == end < len(text):
+        # La coincidencia llega al borde de la ventana: repetir sin límite para no truncarla
+        match = pattern.search(text, match.start())
+    if match is None and (start or end < len(text)):
+        match = pattern.search(text)
+    return match
+
+def find_cedula_dates(text_upper, start, end):
+    """
+    Fechas de la cédula ({campo: fecha}) recorriendo una sola vez text_upper[start:end].
+    Como search_window, los campos que no aparecen en la ventana se buscan en todo el texto.
+    """
+    dates = {}
+    text_length = len(text_upper)
+    for match in _CEDULA_DATES_RE.finditer(text_upper, start, end):
+        if match.lastgroup in dates:
+            continue
+        if match.end() == end < text_length:
+            # La coincidencia llega al borde de la ventana: repetir sin límite para no truncarla
+            match = _CEDULA_DATES_RE.search(text_upper, match.start())
+        dates[match.lastgroup] = match.group(match.lastgroup)
+    if len(dates) < len(_CEDULA_DATE_FIELDS) and (start or end < text_length):
+        for match in _CEDULA_DATES_RE.finditer(text_upper):
+            dates.setdefault(match.lastgroup, match.group(match.lastgroup))
+    return dates
+
+def search_head(pattern, text):
+    """Busca en los primeros HEAD_SCAN_CHARS caracteres y, si no hay coincidencia, en todo el texto"""
+    if len(text) > HEAD_SCAN_CHARS:
+        match = pattern.search(text, 0, HEAD_SCAN_CHARS)
+        # Una coincidencia que llega al corte puede estar truncada (\b coincide en endpos):
+        # solo se acepta si termina antes del límite
+        if match is not None and match.end() < HEAD_SCAN_CHARS:
+            return match
+    return pattern.search(text)
+
+def extract_cedula_panama_data_improved(text, text_upper, extracted_data, anchors=None, text_norm=None):
     """Extracción mejorada para cédulas panameñas"""
     
+    if text_norm is None:
+        text_norm = normalize_upper_text(text_upper)
+    if anchors is None:
+        anchors = find_anchors(text_norm)
+    
     extracted_data['pais_emision'] = 'Panamá'
     
-    # 1. NÚMERO DE CÉDULA
-    cedula_patterns = [
-        r'\b(\d{1,2}-\d{3,4}-\d{1,4})\b',  # 8-236-51, 8-823-2320
-    ]
+    # Las búsquedas se limitan a una ventana alrededor del encabezado del documento
+    text_start, text_end = get_panama_window(find_panama_marker(text), len(text))
+    upper_start, upper_end = get_panama_window(text_norm.find(_PANAMA_MARKER_NORM), len(text_norm))
     
-    for pattern in cedula_patterns:
-        match = re.search(pattern, text)
-        if match:
-            extracted_data['numero_identificacion'] = match.group(1)
-            logger.info(f"📝 Número de cédula: {match.group(1)}")
-            break
+    # 1. NÚMERO DE CÉDULA (8-236-51, 8-823-2320)
+    match = search_window(_PANAMA_ID_RE, text, text_start, text_end)
+    if match:
+        extracted_data['numero_identificacion'] = match.group(1)
+        logger.info("📝 Número de cédula: %s", match.group(1))
     
     # 2. NOMBRE COMPLETO - Patrones específicos para cédulas panameñas
   # ✅ USAR EXTRACTOR ROBUSTO PARA NOMBRES
     if not extracted_data.get('nombre_completo'):
-        name_result = extract_name_universal(text, 'cedula_panama')
+        name_result = extract_name_universal(text, 'cedula_panama', text_upper)
         if name_result:
             extracted_data['nombre_completo'] = name_result['nombre_completo']
             extracted_data['nombre'] = name_result.get('nombre')
             extracted_data['apellidos'] = name_result.get('apellidos')
-            logger.info(f"✅ Nombre extraído con patrón robusto: {name_result['pattern_used']}")
+            logger.info("✅ Nombre extraído con patrón robusto: %s", name_result['pattern_used'])
     
     # Si no se extrajo con el robusto, intentar patrones básicos como fallback
     if not extracted_data.get('nombre_completo'):
-        basic_patterns = [
-            r'TRIBUNAL ELECTORAL\s+([A-Z\s]+)\s+NOMBRE USUAL',
-            r'ELECTORAL\s+([A-Z\s]+)\s+NOMBRE',
-            r'P\s+A\s+([A-Z\s]+)\s+N\s+A\s+([A-Z\s]+)\s+M',
-        ]
-        
-        for pattern in basic_patterns:
-            match = re.search(pattern, text_upper)
+        for prefix, pattern in _CEDULA_BASIC_NAME_RES:
+            start = text_upper.find(prefix)
+            if start < 0:
+                continue
+            match = pattern.search(text_upper, start)
             if match:
-                if len(match.groups()) == 1:
+                # Número de grupos fijo por patrón: atributo del patrón compilado, sin crear tuplas
+                if pattern.groups == 1:
                     extracted_data['nombre_completo'] = match.group(1).strip()
                 else:
                     name_part1 = match.group(1).strip()
-                    name_part2 = match.group(2).strip() if len(match.groups()) > 1 else ""
+                    name_part2 = match.group(2).strip() if pattern.groups > 1 else ""
                     extracted_data['nombre_completo'] = f"{name_part1} {name_part2}".strip()
                 
-                logger.info(f"👤 Nombre completo (fallback): {extracted_data['nombre_completo']}")
+                logger.info("👤 Nombre completo (fallback): %s", extracted_data['nombre_completo'])
                 break
     
     # 3. FECHAS (formato panameño con meses en español)
-    date_patterns = [
-        r'EXPEDIDA:\s*(\d{1,2}-[A-Z]{3}-\d{4})',  # 16-NOV-2017
-        r'EXPIRA:\s*(\d{1,2}-[A-Z]{3}-\d{4})',   # 16-NOV-2027
-        r'FECHA DE NACIMIENTO:\s*(\d{1,2}-[A-Z]{3}-\d{4})',  # 27-ABR-1964
-    ]
-    
-    for pattern in date_patterns:
-        matches = re.findall(pattern, text_upper)
-        if matches:
-            if 'EXPEDIDA' in pattern:
-                extracted_data['fecha_emision'] = convert_spanish_date_improved(matches[0])
-            elif 'EXPIRA' in pattern:
-                extracted_data['fecha_expiracion'] = convert_spanish_date_improved(matches[0])
-            elif 'NACIMIENTO' in pattern:
-                extracted_data['fecha_nacimiento'] = convert_spanish_date_improved(matches[0])
+    date_fields = [field for field in _CEDULA_DATE_FIELDS if f'cedula_{field}' in anchors]
+    if date_fields:
+        dates = find_cedula_dates(text_upper, upper_start, upper_end)
+        for field in date_fields:
+            if field in dates:
+                extracted_data[field] = convert_spanish_date_improved(dates[field])
     
     # 4. GÉNERO
-    gender_match = re.search(r'SEXO:\s*([MF])', text_upper)
-    if gender_match:
-        extracted_data['genero'] = gender_match.group(1)
+    if 'cedula_genero' in anchors:
+        gender_match = search_window(_CEDULA_SEXO_RE, text_upper, upper_start, upper_end)
+        if gender_match:
+            extracted_data['genero'] = gender_match.group(1)
     
     # 5. LUGAR DE NACIMIENTO
-    birth_place_match = re.search(r'LUGAR DE NACIMIENTO:\s*([A-Z,\s]+)', text_upper)
-    if birth_place_match:
-        extracted_data['lugar_nacimiento'] = birth_place_match.group(1).strip()
+    if 'cedula_lugar_nacimiento' in anchors:
+        birth_place_match = search_window(_CEDULA_LUGAR_RE, text_upper, upper_start, upper_end)
+        if birth_place_match:
+            extracted_data['lugar_nacimiento'] = birth_place_match.group(1).strip()
     
     return extracted_data
 
+def extract_cedula_panama_batch(texts):
+    """
+    Extrae los datos de varias cédulas panameñas ya identificadas (p. ej. reprocesamiento
+    masivo), sin la detección de tipo. Cada texto se prepara una sola vez (limpieza,
+    mayúsculas, normalización y anclas) y el lote se resume en una línea de log.
+    Retorna una lista de dicts en el mismo orden que texts.
+    """
+    results = []
+    for text in texts:
+        text_upper = _WHITESPACE_RE.sub(' ', text.strip()).upper()
+        text_norm = normalize_upper_text(text_upper)
+        
+        extracted_data = dict.fromkeys(ID_DATA_FIELDS)
+        extracted_data['tipo_identificacion'] = 'cedula_panama'
+        extracted_data['texto_completo'] = text
+        extracted_data = extract_cedula_panama_data_improved(
+            text, text_upper, extracted_data, find_anchors(text_norm), text_norm
+        )
+        results.append(finalize_extracted_data(text, text_upper, extracted_data, 'cedula_panama'))
+    
+    con_numero = sum(1 for extracted_data in results if extracted_data.get('numero_identificacion'))
+    logger.info("🆔 Lote de cédulas: %s documento(s), %s con número de cédula", len(results), con_numero)
+    return results
+
+def get_confidence_tier(confidence):
+    """Clasifica la confianza en nivel high/medium/low según CONFIDENCE_TIERS"""
+    # Redondeo para que las restas de penalizaciones (p. ej. 0.8 - 0.3) no caigan bajo el umbral
+    confidence = round(confidence, 6)
+    for threshold, tier in CONFIDENCE_TIERS:
+        if confidence >= threshold:
+            return tier
+    return 'low'
+
 #nuevas validaciones
-def validate_id_document_improved(extracted_data):
-    """Validación mejorada con criterios más específicos"""
+def validate_id_document_improved(extracted_data, today=None):
+    """
+    Validación mejorada con criterios más específicos.
+    today: fecha de referencia del lote para comprobar la expiración
+    """
     validation = {
         'is_valid': True,
-        'confidence': 0.8,  # Empezar con confianza alta
+        'confidence': VALIDATION_BASE_CONFIDENCE,  # Empezar con confianza alta
         'errors': [],
         'warnings': []
     }
@@ -609,7 +1388,7 @@ def validate_id_document_improved(extracted_data):
     elif len(extracted_data['nombre_completo']) < 6:
         validation['warnings'].append("Nombre muy corto, posible extracción incompleta")
         validation['confidence'] -= 0.1
-    elif not re.search(r'[A-Za-z]', extracted_data['nombre_completo']):
+    elif not _ASCII_LETTER_RE.search(extracted_data['nombre_completo']):
         validation['warnings'].append("Nombre sin letras válidas")
         validation['confidence'] -= 0.2
     
@@ -620,7 +1399,7 @@ def validate_id_document_improved(extracted_data):
     if doc_type == 'pasaporte':
         # Validar formato número pasaporte
         num_id = extracted_data.get('numero_identificacion', '')
-        if not re.match(r'^[A-Z]{2}\d{7}$', num_id):
+        if not _PASSPORT_NUMBER_FULL_RE.match(num_id):
             validation['warnings'].append("Formato de número de pasaporte inusual")
             validation['confidence'] -= 0.1
         
@@ -637,7 +1416,7 @@ def validate_id_document_improved(extracted_data):
     elif doc_type == 'cedula_panama':
         # Validar formato cédula panameña
         num_id = extracted_data.get('numero_identificacion', '')
-        if not re.match(r'^\d{1,2}-\d{3,4}-\d{1,4}$', num_id):
+        if not _CEDULA_PANAMA_NUMBER_FULL_RE.match(num_id):
             validation['warnings'].append("Formato de cédula panameña incorrecto")
             validation['confidence'] -= 0.2
         
@@ -649,7 +1428,7 @@ def validate_id_document_improved(extracted_data):
     elif doc_type == 'dni':
         # Validar formato DNI español
         num_id = extracted_data.get('numero_identificacion', '')
-        if not re.match(r'^\d{8}[A-Z]$', num_id):
+        if not _DNI_NUMBER_FULL_RE.match(num_id):
             validation['warnings'].append("Formato de DNI español incorrecto")
             validation['confidence'] -= 0.2
     
@@ -659,30 +1438,26 @@ def validate_id_document_improved(extracted_data):
     fecha_expiracion = extracted_data.get('fecha_expiracion')
     
     # Validar formato de fechas
-    date_pattern = r'^\d{4}-\d{2}-\d{2}$'
-    
-    if fecha_emision and not re.match(date_pattern, str(fecha_emision)):
+    if fecha_emision and not _ISO_DATE_RE.match(str(fecha_emision)):
         validation['errors'].append("Formato de fecha de emisión inválido")
         validation['confidence'] -= 0.1
     
-    if fecha_expiracion and not re.match(date_pattern, str(fecha_expiracion)):
+    if fecha_expiracion and not _ISO_DATE_RE.match(str(fecha_expiracion)):
         validation['errors'].append("Formato de fecha de expiración inválido")
         validation['confidence'] -= 0.1
     
     # Validar lógica de fechas
     if fecha_emision and fecha_expiracion:
         try:
-            from datetime import datetime
-            emision_dt = datetime.strptime(str(fecha_emision), '%Y-%m-%d')
-            expiracion_dt = datetime.strptime(str(fecha_expiracion), '%Y-%m-%d')
+            emision_dt = date.fromisoformat(str(fecha_emision))
+            expiracion_dt = date.fromisoformat(str(fecha_expiracion))
             
             if emision_dt >= expiracion_dt:
                 validation['errors'].append("Fecha de emisión posterior a fecha de expiración")
                 validation['confidence'] -= 0.2
             
             # Verificar si el documento ha expirado
-            now = datetime.now()
-            if expiracion_dt < now:
+            if expiracion_dt < (today or date.today()):
                 validation['warnings'].append("El documento ha expirado")
                 validation['confidence'] -= 0.05
                 
@@ -694,16 +1469,17 @@ def validate_id_document_improved(extracted_data):
     
     # Asegurar que la confianza esté entre 0 y 1
     validation['confidence'] = max(0.0, min(1.0, validation['confidence']))
+    validation['confidence_tier'] = get_confidence_tier(validation['confidence'])
     
     # Si hay errores críticos, marcar como inválido
     if len(validation['errors']) > 0:
         validation['is_valid'] = False
     
-    logger.info(f"📊 Validación completada - Confianza: {validation['confidence']:.2f}")
+    logger.info("📊 Validación completada - Confianza: %.2f", validation['confidence'])
     if validation['errors']:
-        logger.error(f"❌ Errores encontrados: {'; '.join(validation['errors'])}")
+        logger.error("❌ Errores encontrados: %s", '; '.join(validation['errors']))
     if validation['warnings']:
-        logger.warning(f"⚠️ Advertencias: {'; '.join(validation['warnings'])}")
+        logger.warning("⚠️ Advertencias: %s", '; '.join(validation['warnings']))
     
     return validation
 
@@ -715,87 +1491,104 @@ def format_date_panama_improved(date_str):
     if not date_str:
         return None
     
-    # Limpiar la cadena de espacios extras
-    date_str = re.sub(r'\s+', '-', date_str.strip())
-    
-    # Diccionario de meses en español a número
-    month_map = {
-        'ene': '01', 'feb': '02', 'mar': '03', 'abr': '04', 'may': '05', 'jun': '06',
-        'jul': '07', 'ago': '08', 'sep': '09', 'oct': '10', 'nov': '11', 'dic': '12',
-        'enero': '01', 'febrero': '02', 'marzo': '03', 'abril': '04', 'mayo': '05', 'junio': '06',
-        'julio': '07', 'agosto': '08', 'septiembre': '09', 'octubre': '10', 'noviembre': '11', 'diciembre': '12'
-    }
+    date_str = date_str.strip()
     
     try:
-        # Separar día, mes y año (manejar tanto guiones como espacios)
-        parts = re.split(r'[-\s]+', date_str)
-        if len(parts) != 3:
-            logger.warning(f"Formato de fecha no reconocido: {date_str}")
+        # Separar día, mes y año en una sola pasada (guiones y/o espacios)
+        match = _PANAMA_DATE_PARTS_RE.fullmatch(date_str)
+        if not match:
+            logger.warning("Formato de fecha no reconocido: %s", date_str)
             return None
         
-        day = parts[0].strip()
-        month_text = parts[1].strip().lower()
-        year = parts[2].strip()
+        day, month_text, year = match.groups()
+        month_text = month_text.lower().translate(_DIACRITICS_TABLE)
         
         # ✅ CORRECCIÓN: Validar y corregir día inválido
         try:
             day_int = int(day)
             if day_int == 0 or day_int > 31:
-                logger.warning(f"Día inválido {day_int}, usando día 01")
+                logger.warning("Día inválido %s, usando día 01", day_int)
                 day = "01"
             else:
                 day = day.zfill(2)
         except ValueError:
-            logger.warning(f"Día no numérico '{day}', usando día 01")
+            logger.warning("Día no numérico '%s', usando día 01", day)
             day = "01"
         
-        # Convertir mes a número
-        if month_text in month_map:
-            month = month_map[month_text]
-        else:
-            # Si no se encuentra el mes exacto, intentar con las primeras tres letras
-            month_abbr = month_text[:3]
-            if month_abbr in month_map:
-                month = month_map[month_abbr]
-            else:
-                logger.warning(f"Mes no reconocido: {month_text}, usando enero")
-                month = "01"
+        # Convertir mes a número (nombre completo o abreviatura comparten las tres primeras letras)
+        month = _PANAMA_MONTHS.get(month_text[:3])
+        if month is None:
+            logger.warning("Mes no reconocido: %s, usando enero", month_text)
+            month = "01"
         
         # ✅ CORRECCIÓN: Validar año
         try:
             year_int = int(year)
             if year_int < 1900 or year_int > 2100:
-                logger.warning(f"Año inválido {year_int}")
+                logger.warning("Año inválido %s", year_int)
                 return None
             year = str(year_int)
         except ValueError:
-            logger.warning(f"Año no numérico '{year}'")
+            logger.warning("Año no numérico '%s'", year)
             return None
         
         # ✅ VALIDACIÓN FINAL: Verificar que la fecha sea válida
-        from datetime import datetime
         try:
             # Intentar crear la fecha para validarla
-            test_date = datetime.strptime(f"{year}-{month}-{day}", '%Y-%m-%d')
+            test_date = date.fromisoformat(f"{year}-{month}-{day}")
             formatted_date = f"{year}-{month}-{day}"
-            logger.info(f"✅ Fecha convertida: '{date_str}' → '{formatted_date}'")
+            logger.info("✅ Fecha convertida: '%s' → '%s'", date_str, formatted_date)
             return formatted_date
         except ValueError as ve:
-            logger.warning(f"Fecha resultante inválida: {year}-{month}-{day}, error: {ve}")
+            logger.warning("Fecha resultante inválida: %s-%s-%s, error: %s", year, month, day, ve)
             # Como último recurso, usar el primer día del mes
             try:
-                test_date = datetime.strptime(f"{year}-{month}-01", '%Y-%m-%d')
+                test_date = date.fromisoformat(f"{year}-{month}-01")
                 formatted_date = f"{year}-{month}-01"
-                logger.warning(f"Usando primer día del mes: '{formatted_date}'")
+                logger.warning("Usando primer día del mes: '%s'", formatted_date)
                 return formatted_date
             except ValueError:
-                logger.error(f"No se pudo crear fecha válida para: {date_str}")
+                logger.error("No se pudo crear fecha válida para: %s", date_str)
                 return None
         
     except Exception as e:
-        logger.warning(f"Error al procesar fecha '{date_str}': {str(e)}")
+        logger.warning("Error al procesar fecha '%s': %s", date_str, e)
         return None
 
+def parse_international_date(clean_date):
+    """
+    Convierte d/m/Y (o m/d/Y si el día/mes no es válido), d.m.Y, d m Y, Y/m/d y Y-m-d
+    a ISO con una sola expresión regular y enteros, sin probar formatos con strptime.
+    """
+    match = _INTERNATIONAL_DATE_RE.fullmatch(clean_date)
+    if not match:
+        return None
+    
+    branch = match.lastindex
+    first_text, second_text, third_text = match.group(branch - 2, branch - 1, branch)
+    first, second, third = int(first_text), int(second_text), int(third_text)
+    if branch >= 12:
+        candidates = ((first, second, third),)
+    elif branch == 3:
+        # Se prefiere día/mes; mes/día solo si lo anterior no es una fecha válida.
+        # El mes nunca lleva espacio inicial.
+        candidates = tuple(
+            candidate for candidate, month_text in (
+                ((third, second, first), second_text),
+                ((third, first, second), first_text),
+            )
+            if not month_text.startswith(' ')
+        )
+    else:
+        candidates = ((third, second, first),)
+    
+    for year, month, day in candidates:
+        try:
+            return date(year, month, day).isoformat()
+        except ValueError:
+            continue
+    return None
+
 def normalize_date_improved(date_str, default_day="01"):
     """
     Normaliza fechas de diferentes formatos a ISO YYYY-MM-DD
@@ -808,218 +1601,220 @@ def normalize_date_improved(date_str, default_day="01"):
     clean_date = str(date_str).strip()
     
     # Si ya está en formato ISO, validarla
-    if re.match(r'^\d{4}-\d{2}-\d{2}$', clean_date):
+    if _ISO_DATE_RE.match(clean_date):
         # Verificar que no tenga día/mes 00
         year, month, day = clean_date.split('-')
         
         if month == "00":
             month = "01"
-            logger.warning(f"Mes 00 corregido a 01 en fecha: {clean_date}")
+            logger.warning("Mes 00 corregido a 01 en fecha: %s", clean_date)
         
         if day == "00":
             day = default_day
-            logger.warning(f"Día 00 corregido a {default_day} en fecha: {clean_date}")
+            logger.warning("Día 00 corregido a %s en fecha: %s", default_day, clean_date)
         
         corrected_date = f"{year}-{month}-{day}"
         
         # Validar que la fecha sea real
         try:
-            from datetime import datetime
-            datetime.strptime(corrected_date, '%Y-%m-%d')
+            date.fromisoformat(corrected_date)
             return corrected_date
         except ValueError:
-            logger.warning(f"Fecha inválida después de corrección: {corrected_date}")
+            logger.warning("Fecha inválida después de corrección: %s", corrected_date)
             return None
     
-    # Si tiene formato panameño, usar la función específica
-    if re.search(r'\d{1,2}[-\s][a-zA-Zéúíóá]+[-\s]\d{4}', clean_date):
-        return format_date_panama_improved(clean_date)
+    # Si tiene formato panameño, usar la función específica (sin tildes)
+    panama_date = clean_date.translate(_DIACRITICS_TABLE)
+    if _TEXT_MONTH_DATE_RE.search(panama_date):
+        return format_date_panama_improved(panama_date)
     
     # Otros formatos internacionales
-    formats_to_try = [
-        '%d/%m/%Y',
-        '%m/%d/%Y', 
-        '%d.%m.%Y',
-        '%Y/%m/%d',
-        '%d %m %Y',
-        '%Y-%m-%d'
-    ]
+    iso_date = parse_international_date(clean_date)
+    if iso_date:
+        return iso_date
     
-    for fmt in formats_to_try:
-        try:
-            from datetime import datetime
-            date_obj = datetime.strptime(clean_date, fmt)
-            return date_obj.strftime('%Y-%m-%d')
-        except ValueError:
-            continue
-    
-    logger.warning(f"No se pudo normalizar la fecha: {date_str}")
+    logger.warning("No se pudo normalizar la fecha: %s", date_str)
     return None
 
-def extract_passport_data_improved(text, text_upper, extracted_data):
+def collect_anchor_hit(anchor_id, start, end, flags, hits):
+    """Callback de Hyperscan: registra la clave de la palabra ancla encontrada"""
+    hits.add(_ANCHOR_KEYWORDS[anchor_id][1])
+
+def normalize_upper_text(text_upper):
+    """Texto en mayúsculas sin tildes; misma longitud, los índices coinciden con text_upper"""
+    return text_upper.translate(_DIACRITICS_TABLE)
+
+def find_anchors(text_norm):
+    """Devuelve las claves de _FIELD_ANCHORS cuyas palabras ancla aparecen en el texto normalizado"""
+    if ANCHOR_DATABASE is not None:
+        scratch = getattr(HYPERSCAN_SCRATCH, 'scratch', None)
+        if scratch is None:
+            scratch = HYPERSCAN_SCRATCH.scratch = ANCHOR_SCRATCH.clone()
+        
+        hits = set()
+        ANCHOR_DATABASE.scan(
+            text_norm.encode('utf-8'),
+            match_event_handler=collect_anchor_hit,
+            context=hits,
+            scratch=scratch
+        )
+        return frozenset(hits)
+    
+    return frozenset(
+        key for key, keywords in _FIELD_ANCHORS.items()
+        if any(keyword in text_norm for keyword in keywords)
+    )
+
+def strip_specimen_marks(value):
+    """Quita las marcas SPECIMEN/MUESTRA; la regex solo se ejecuta si aparece alguna"""
+    if 'SPECIMEN' in value or 'MUESTRA' in value:
+        return _SPECIMEN_RE.sub('', value)
+    return value
+
+def search_in_order(patterns, text):
+    """Prueba los patrones en orden y devuelve la coincidencia del primero que encuentra algo"""
+    for pattern in patterns:
+        match = search_head(pattern, text)
+        if match:
+            return match
+    return None
+
+def split_passport_name_labels(text_upper):
+    """
+    Separa apellidos y nombres de 'SURNAME ... GIVEN NAMES ...' (también la variante
+    bilingüe 'APELLIDOS/SURNAME ... NOMBRES/GIVEN NAMES ...') con find/partition.
+    Retorna (apellidos, nombres) o None.
+    """
+    start = text_upper.find('SURNAME ')
+    if start < 0:
+        return None
+    
+    surname_part, sep, names_part = text_upper[start + 8:].partition('GIVEN NAMES ')
+    if not sep:
+        return None
+    
+    # Variante bilingüe: la etiqueta NOMBRES/ queda al final de la parte de apellidos
+    surname_part = surname_part.rstrip()
+    if surname_part.endswith('/'):
+        if not text_upper.endswith('APELLIDOS/', 0, start):
+            return None
+        surname_part = surname_part[:-1].rstrip()
+        if not surname_part.endswith(' NOMBRES'):
+            return None
+        surname_part = surname_part[:-8]
+    
+    stop = _PASSPORT_NAMES_STOP_RE.search(names_part, 1)
+    names_part = names_part[:stop.start()] if stop else names_part
+    
+    apellidos = surname_part.strip()
+    nombres = names_part.strip()
+    if not apellidos or not nombres:
+        return None
+    if not _UPPER_WORDS_RE.fullmatch(apellidos) or not _UPPER_WORDS_RE.fullmatch(nombres):
+        return None
+    return apellidos, nombres
+
+def extract_passport_data_improved(text, text_upper, extracted_data, anchors=None, text_norm=None):
     """Extracción mejorada para pasaportes"""
     
-    # 1. NÚMERO DE PASAPORTE - Patrones mejorados
-    passport_number_patterns = [
-        r'PASSPORT\s+NO[:\s]+([A-Z]{2}\d{7})',  # PA0106480
-        r'PASAPORTE\s+NO[:\s]+([A-Z]{2}\d{7})',
-        r'NO[:\s]*([A-Z]{2}\d{7})',
-        r'([A-Z]{2}\d{7})',  # Patrón general para números como PA0106480, PD0404102
-    ]
+    if text_norm is None:
+        text_norm = normalize_upper_text(text_upper)
+    if anchors is None:
+        anchors = find_anchors(text_norm)
     
-    for pattern in passport_number_patterns:
-        match = re.search(pattern, text_upper)
-        if match:
-            extracted_data['numero_identificacion'] = match.group(1)
-            logger.info(f"📝 Número de pasaporte encontrado: {match.group(1)}")
-            break
+    # 1. NÚMERO DE PASAPORTE - Con etiqueta primero, formato general como respaldo
+    match = search_in_order(_PASSPORT_NUMBER_RES, text_upper)
+    if match:
+        extracted_data['numero_identificacion'] = match.group(1)
+        logger.info("📝 Número de pasaporte encontrado: %s", match.group(1))
     
     # 2. NOMBRES Y APELLIDOS
     if not extracted_data.get('nombre_completo'):
-        name_result = extract_name_universal(text, 'pasaporte')
+        name_result = extract_name_universal(text, 'pasaporte', text_upper)
         if name_result:
             extracted_data['nombre_completo'] = name_result['nombre_completo']
             extracted_data['nombre'] = name_result.get('nombre')
             extracted_data['apellidos'] = name_result.get('apellidos')
-            logger.info(f"✅ Nombre de pasaporte extraído: {name_result['nombre_completo']}")
-            logger.info(f"   Patrón usado: {name_result['pattern_used']}")
+            logger.info("✅ Nombre de pasaporte extraído: %s", name_result['nombre_completo'])
+            logger.info("   Patrón usado: %s", name_result['pattern_used'])
     
     # Si no se extrajo con el robusto, intentar patrones básicos como fallback
-    if not extracted_data.get('nombre_completo'):
-        basic_name_patterns = [
-            r'APELLIDOS/SURNAME\s+([A-Z\s]+)\s+NOMBRES\s*/\s*GIVEN\s+NAMES\s+([A-Z\s]+?)(?:\s+SPECIMEN|\s+\d|\s+[A-Z]{3}|$)',
-            r'SURNAME\s+([A-Z\s]+)\s+GIVEN\s+NAMES\s+([A-Z\s]+?)(?:\s+SPECIMEN|\s+\d|\s+[A-Z]{3}|$)',
-        ]
-        
-        for pattern in basic_name_patterns:
-            match = re.search(pattern, text_upper)
-            if match and len(match.groups()) >= 2:
-                apellidos = match.group(1).strip()
-                nombres = match.group(2).strip()
-                
-                extracted_data['apellidos'] = apellidos
-                extracted_data['nombre'] = nombres
-                extracted_data['nombre_completo'] = f"{nombres} {apellidos}"
-                logger.info(f"👤 Nombre completo (fallback): {extracted_data['nombre_completo']}")
-                break
-    
-    # 3. PAÍS DE EMISIÓN
-    country_patterns = [
-        r'REPUBLICA DE PANAMA|REPUBLIC OF PANAMA',
-        r'ESPAÑA|SPAIN',
-        r'COLOMBIA',
-        r'ESTADOS UNIDOS|UNITED STATES',
-        r'MEXICO|MÉXICO',
-    ]
-    
-    for pattern in country_patterns:
-        if re.search(pattern, text_upper):
-            if 'PANAMA' in pattern:
-                extracted_data['pais_emision'] = 'Panamá'
-            elif 'ESPAÑA' in pattern or 'SPAIN' in pattern:
-                extracted_data['pais_emision'] = 'España'
-            elif 'COLOMBIA' in pattern:
-                extracted_data['pais_emision'] = 'Colombia'
-            elif 'ESTADOS UNIDOS' in pattern or 'UNITED STATES' in pattern:
-                extracted_data['pais_emision'] = 'Estados Unidos'
-            elif 'MEXICO' in pattern or 'MÉXICO' in pattern:
-                extracted_data['pais_emision'] = 'México'
-            logger.info(f"🌍 País de emisión: {extracted_data['pais_emision']}")
+    if not extracted_data.get('nombre_completo') and 'passport_basic_name' in anchors:
+        name_parts = split_passport_name_labels(text_upper)
+        if name_parts:
+            apellidos, nombres = name_parts
+            extracted_data['apellidos'] = apellidos
+            extracted_data['nombre'] = nombres
+            extracted_data['nombre_completo'] = f"{nombres} {apellidos}"
+            logger.info("👤 Nombre completo (fallback): %s", extracted_data['nombre_completo'])
+    
+    # 3. PAÍS DE EMISIÓN (sobre texto sin tildes: una sola variante por país)
+    for anchor, pais in _PASSPORT_COUNTRY_ANCHORS:
+        if anchor in anchors:
+            extracted_data['pais_emision'] = pais
+            logger.info("🌍 País de emisión: %s", extracted_data['pais_emision'])
             break
     
-    # 4. FECHAS (emisión y expiración) - MEJORADO
-    date_patterns = [
-        r'DATE OF ISSUE\s+(\d{1,2}\s+[A-Z]{3}\s+\d{4})',  # 02 ENE 2014
-        r'FECHA DE EXPEDICION\s+(\d{1,2}\s+[A-Z]{3}\s+\d{4})',
-        r'DATE OF EXPIRY\s+(\d{1,2}\s+[A-Z]{3}\s+\d{4})',  # 02 ENE 2019
-        r'FECHA DE VENCIMIENTO\s+(\d{1,2}\s+[A-Z]{3}\s+\d{4})',
-        # Patrones adicionales para diferentes formatos
-        r'ISSUED:\s*(\d{1,2}[-\s][A-Z]{3}[-\s]\d{4})',
-        r'EXPIRES:\s*(\d{1,2}[-\s][A-Z]{3}[-\s]\d{4})',
-    ]
-    
-    for pattern in date_patterns:
-        matches = re.findall(pattern, text_upper)
-        if matches:
-            if 'ISSUE' in pattern or 'EXPEDICION' in pattern or 'ISSUED' in pattern:
-                # Usar función mejorada
-                extracted_data['fecha_emision'] = normalize_date_improved(matches[0])
-                logger.info(f"📅 Fecha emisión: {extracted_data['fecha_emision']}")
-            elif 'EXPIRY' in pattern or 'VENCIMIENTO' in pattern or 'EXPIRES' in pattern:
-                extracted_data['fecha_expiracion'] = normalize_date_improved(matches[0])
-                logger.info(f"📅 Fecha expiración: {extracted_data['fecha_expiracion']}")
+    # 4. FECHAS (emisión y expiración) - una sola pasada, la primera fecha de cada etiqueta
+    if 'passport_issue_date' in anchors or 'passport_expiry_date' in anchors:
+        label_dates = {}
+        for match in _PASSPORT_VALIDITY_DATES_RE.finditer(text_upper):
+            label_dates.setdefault(match.lastgroup, match.group(match.lastgroup))
+            if len(label_dates) == len(_PASSPORT_VALIDITY_DATE_FIELDS):
+                break
+        
+        validity_dates = {}
+        for group, field in _PASSPORT_VALIDITY_DATE_FIELDS:
+            if group in label_dates:
+                validity_dates[field] = label_dates[group]
+        
+        if 'fecha_emision' in validity_dates:
+            # Usar función mejorada
+            extracted_data['fecha_emision'] = normalize_date_improved(validity_dates['fecha_emision'])
+            logger.info("📅 Fecha emisión: %s", extracted_data['fecha_emision'])
+        
+        if 'fecha_expiracion' in validity_dates:
+            extracted_data['fecha_expiracion'] = normalize_date_improved(validity_dates['fecha_expiracion'])
+            logger.info("📅 Fecha expiración: %s", extracted_data['fecha_expiracion'])
     
     # 5. GÉNERO
-    gender_patterns = [
-        r'SEXO/SEX\s+([MF])',
-        r'SEX\s+([MF])',
-        r'SEXO\s+([MF])',
-        r'GENDER\s+([MF])',
-        r'([MF])\s+(?:MALE|FEMALE|MASCULINO|FEMENINO)',
-    ]
-    
-    for pattern in gender_patterns:
-        match = re.search(pattern, text_upper)
+    if 'passport_gender' in anchors:
+        match = search_in_order(_PASSPORT_GENDER_RES, text_upper)
         if match:
             extracted_data['genero'] = match.group(1)
-            logger.info(f"👥 Género: {extracted_data['genero']}")
-            break
+            logger.info("👥 Género: %s", extracted_data['genero'])
     
     # 6. FECHA DE NACIMIENTO
-    birth_date_patterns = [
-        r'DATE OF BIRTH\s+(\d{1,2}\s+[A-Z]{3}\s+\d{4})',  # 21 MAR 1991
-        r'FECHA DE NACIMIENTO\s+(\d{1,2}\s+[A-Z]{3}\s+\d{4})',
-        r'BORN:\s*(\d{1,2}[-\s][A-Z]{3}[-\s]\d{4})',
-        r'DOB\s+(\d{1,2}\s+[A-Z]{3}\s+\d{4})',
-        # Patrón general de fecha (usado con cuidado)
-        r'(?:NACIMIENTO|BIRTH|BORN).*?(\d{1,2}\s+[A-Z]{3}\s+\d{4})',
-    ]
-    
-    for pattern in birth_date_patterns:
-        match = re.search(pattern, text_upper)
+    if 'passport_birth_date' in anchors:
+        match = search_in_order(_PASSPORT_BIRTH_DATE_RES, text_upper)
         if match:
             extracted_data['fecha_nacimiento'] = normalize_date_improved(match.group(1))
-            logger.info(f"🎂 Fecha nacimiento: {extracted_data['fecha_nacimiento']}")
-            break
+            logger.info("🎂 Fecha nacimiento: %s", extracted_data['fecha_nacimiento'])
     
     # 7. AUTORIDAD DE EMISIÓN
-    authority_patterns = [
-        r'AUTORIDAD[:\s]+([A-Z\s/]+?)(?:\s+AUTHORITY|\s*$)',
-        r'AUTHORITY[:\s]+([A-Z\s/]+?)(?:\s+AUTORIDAD|\s*$)',
-        r'ISSUED BY[:\s]+([A-Z\s/]+?)(?:\s+EMITIDO|\s*$)',
-        r'EMITIDO POR[:\s]+([A-Z\s/]+?)(?:\s+ISSUED|\s*$)',
-    ]
-    
     # Verificar patrones específicos primero
     if 'PASAPORTES/PANAMA' in text_upper or 'PASSPORTS/PANAMA' in text_upper:
         extracted_data['autoridad_emision'] = 'Pasaportes/Panamá'
-        logger.info(f"🏛️ Autoridad: {extracted_data['autoridad_emision']}")
+        logger.info("🏛️ Autoridad: %s", extracted_data['autoridad_emision'])
     elif 'MINISTERIO DEL INTERIOR' in text_upper:
         extracted_data['autoridad_emision'] = 'Ministerio del Interior'
-        logger.info(f"🏛️ Autoridad: {extracted_data['autoridad_emision']}")
-    else:
+        logger.info("🏛️ Autoridad: %s", extracted_data['autoridad_emision'])
+    elif 'passport_authority' in anchors:
         # Buscar con patrones generales
-        for pattern in authority_patterns:
-            match = re.search(pattern, text_upper)
+        for pattern in _PASSPORT_AUTHORITY_RES:
+            match = search_head(pattern, text_upper)
             if match:
                 authority = match.group(1).strip()
                 # Limpiar texto innecesario
-                authority = re.sub(r'(SPECIMEN|MUESTRA)', '', authority).strip()
+                authority = strip_specimen_marks(authority).strip()
                 if len(authority) > 5:  # Solo si tiene contenido significativo
                     extracted_data['autoridad_emision'] = authority
-                    logger.info(f"🏛️ Autoridad: {extracted_data['autoridad_emision']}")
+                    logger.info("🏛️ Autoridad: %s", extracted_data['autoridad_emision'])
                     break
     
     # 8. NACIONALIDAD
-    nationality_patterns = [
-        r'NACIONALIDAD[:\s/]+([A-Z]+)',
-        r'NATIONALITY[:\s/]+([A-Z]+)',
-        r'NATIONAL[:\s]+([A-Z]+)',
-        r'CITIZEN[:\s]+([A-Z]+)',
-    ]
-    
-    for pattern in nationality_patterns:
-        match = re.search(pattern, text_upper)
+    if 'passport_nationality' in anchors:
+        match = search_in_order(_PASSPORT_NATIONALITY_RES, text_upper)
         if match:
             nationality = match.group(1).strip()
             # Convertir códigos comunes a nombres completos
@@ -1040,29 +1835,22 @@ def extract_passport_data_improved(text, text_upper, extracted_data):
                 'COL': 'Colombiana',
                 'MEX': 'Mexicana',
             }
-            
+        
             extracted_data['nacionalidad'] = nationality_map.get(nationality, nationality)
-            logger.info(f"🏳️ Nacionalidad: {extracted_data['nacionalidad']}")
-            break
+            logger.info("🏳️ Nacionalidad: %s", extracted_data['nacionalidad'])
     
     # 9. LUGAR DE NACIMIENTO
-    birth_place_patterns = [
-        r'(?:PLACE OF BIRTH|LUGAR DE NACIMIENTO)[:\s]+([A-ZÁÉÍÓÚÑ\s,]+?)(?:\s+LIEU|\s+DATE|\s*$)',
-        r'(?:LIEU DE NAISSANCE)[:\s]+([A-ZÁÉÍÓÚÑ\s,]+?)(?:\s+PLACE|\s+DATE|\s*$)',
-        r'BORN IN[:\s]+([A-ZÁÉÍÓÚÑ\s,]+?)(?:\s+DATE|\s*$)',
-        r'NACIDO EN[:\s]+([A-ZÁÉÍÓÚÑ\s,]+?)(?:\s+FECHA|\s*$)',
-    ]
-    
-    for pattern in birth_place_patterns:
-        match = re.search(pattern, text_upper)
-        if match:
-            place = match.group(1).strip()
-            # Limpiar texto innecesario
-            place = re.sub(r'(SPECIMEN|MUESTRA)', '', place).strip()
-            if len(place) > 3:  # Solo si tiene contenido significativo
-                extracted_data['lugar_nacimiento'] = place
-                logger.info(f"🏠 Lugar de nacimiento: {extracted_data['lugar_nacimiento']}")
-                break
+    if 'passport_birth_place' in anchors:
+        for pattern in _PASSPORT_BIRTH_PLACE_RES:
+            match = search_head(pattern, text_upper)
+            if match:
+                place = match.group(1).strip()
+                # Limpiar texto innecesario
+                place = strip_specimen_marks(place).strip()
+                if len(place) > 3:  # Solo si tiene contenido significativo
+                    extracted_data['lugar_nacimiento'] = place
+                    logger.info("🏠 Lugar de nacimiento: %s", extracted_data['lugar_nacimiento'])
+                    break
     
     # 10. VALIDACIONES ADICIONALES PARA PASAPORTES
     
@@ -1072,10 +1860,10 @@ def extract_passport_data_improved(text, text_upper, extracted_data):
         # Inferir país por prefijo del número
         if numero.startswith('PA'):
             extracted_data['pais_emision'] = 'Panamá'
-            logger.info(f"🌍 País inferido por prefijo: Panamá")
+            logger.info("🌍 País inferido por prefijo: Panamá")
         elif numero.startswith('ES'):
             extracted_data['pais_emision'] = 'España'
-            logger.info(f"🌍 País inferido por prefijo: España")
+            logger.info("🌍 País inferido por prefijo: España")
     
     # Si no se encontró autoridad pero sí país, asignar autoridad típica
     if not extracted_data.get('autoridad_emision') and extracted_data.get('pais_emision'):
@@ -1088,10 +1876,35 @@ def extract_passport_data_improved(text, text_upper, extracted_data):
             extracted_data['autoridad_emision'] = 'Cancillería'
         
         if extracted_data.get('autoridad_emision'):
-            logger.info(f"🏛️ Autoridad inferida: {extracted_data['autoridad_emision']}")
+            logger.info("🏛️ Autoridad inferida: %s", extracted_data['autoridad_emision'])
     
     return extracted_data
 
+def keyword_rule_matches(text_norm, alternatives):
+    """True si alguna alternativa aparece: un literal, o un par (primero, después) en ese orden"""
+    for alternative in alternatives:
+        if isinstance(alternative, str):
+            if alternative in text_norm:
+                return True
+        else:
+            first, then = alternative
+            idx = text_norm.find(first)
+            if idx >= 0 and text_norm.find(then, idx + len(first)) >= 0:
+                return True
+    return False
+
+def score_detection_rules(text_norm, text, keyword_rules, format_rule):
+    """Puntuación de un tipo de documento: palabras clave en text_norm y formato del número en text"""
+    score = 0
+    for alternatives, points in keyword_rules:
+        if keyword_rule_matches(text_norm, alternatives):
+            score += points
+    
+    pattern, points = format_rule
+    if pattern.search(text):
+        score += points
+    return score
+
 def extract_id_document_data_improved_core(text, entidades=None, metadatos=None):
     """
     Función principal de extracción de datos de documentos de identidad
@@ -1099,112 +1912,75 @@ def extract_id_document_data_improved_core(text, entidades=None, metadatos=None)
     """
     
     # Limpiar texto para mejor procesamiento
-    text_clean = re.sub(r'\s+', ' ', text.strip())
+    text_clean = _WHITESPACE_RE.sub(' ', text.strip())
     text_upper = text_clean.upper()
+    # Mayúsculas sin tildes, una sola vez por documento: detección y anclas usan una variante por palabra
+    text_norm = normalize_upper_text(text_upper)
     
-    # Resultado inicial
-    extracted_data = {
-        'tipo_identificacion': 'desconocido',
-        'numero_identificacion': None,
-        'nombre_completo': None,
-        'nombre': None,
-        'apellidos': None,
-        'genero': None,
-        'fecha_nacimiento': None,
-        'fecha_emision': None,
-        'fecha_expiracion': None,
-        'nacionalidad': None,
-        'pais_emision': None,
-        'lugar_nacimiento': None,
-        'autoridad_emision': None,
-        'texto_completo': text
-    }
+    # Resultado inicial (todas las claves en None, construido en C)
+    extracted_data = dict.fromkeys(ID_DATA_FIELDS)
+    extracted_data['tipo_identificacion'] = 'desconocido'
+    extracted_data['texto_completo'] = text
     
     # ==================== DETECCIÓN MEJORADA DEL TIPO DE DOCUMENTO ====================
     
     # Indicadores más específicos para cada tipo de documento
-    passport_score = 0
-    cedula_panama_score = 0
-    dni_spain_score = 0
-    
-    # Patrones para PASAPORTE
-    if re.search(r'PASAPORTE|PASSPORT', text_upper):
-        passport_score += 3
-    if re.search(r'REPUBLIC OF PANAMA|REPUBLICA DE PANAMA.*PASSPORT', text_upper):
-        passport_score += 3
-    if re.search(r'SURNAME.*GIVEN NAMES|APELLIDOS.*NOMBRES', text_upper):
-        passport_score += 2
-    if re.search(r'AUTORIDAD.*PASAPORTES|AUTHORITY.*PASSPORT', text_upper):
-        passport_score += 2
-    if re.search(r'P[A-Z]{2}\d{7}|[A-Z]{2}\d{7}', text):  # Formato número pasaporte
-        passport_score += 2
-    if re.search(r'DATE OF BIRTH|DATE OF ISSUE|DATE OF EXPIRY', text_upper):
-        passport_score += 1
-    
-    # Patrones para CÉDULA PANAMEÑA
-    if re.search(r'TRIBUNAL ELECTORAL', text_upper):
-        cedula_panama_score += 3
-    if re.search(r'REPUBLICA DE PANAMA.*TRIBUNAL', text_upper):
-        cedula_panama_score += 2
-    if re.search(r'\d{1,2}-\d{3,4}-\d{1,4}', text):  # Formato cédula panameña
-        cedula_panama_score += 3
-    if re.search(r'EXPEDIDA.*EXPIRA', text_upper):
-        cedula_panama_score += 2
-    if re.search(r'TIPO DE SANGRE|DONADOR', text_upper):
-        cedula_panama_score += 2
-    
-    # Patrones para DNI ESPAÑOL
-    if re.search(r'ESPAÑA|SPAIN', text_upper):
-        dni_spain_score += 2
-    if re.search(r'DOCUMENTO NACIONAL DE IDENTIDAD|DNI', text_upper):
-        dni_spain_score += 3
-    if re.search(r'\d{8}[A-Z]', text):  # Formato DNI español
-        dni_spain_score += 3
+    passport_score = score_detection_rules(text_norm, text, _PASSPORT_KEYWORD_RULES, _PASSPORT_FORMAT_RULE)
+    cedula_panama_score = score_detection_rules(text_norm, text, _CEDULA_PANAMA_KEYWORD_RULES, _CEDULA_PANAMA_FORMAT_RULE)
+    dni_spain_score = score_detection_rules(text_norm, text, _DNI_SPAIN_KEYWORD_RULES, _DNI_SPAIN_FORMAT_RULE)
     
     # Determinar tipo de documento por mayor puntuación
     if passport_score >= 3:
         extracted_data['tipo_identificacion'] = 'pasaporte'
-        logger.info(f"📔 PASAPORTE detectado (score: {passport_score})")
+        logger.info("📔 PASAPORTE detectado (score: %s)", passport_score)
     elif cedula_panama_score >= 3:
         extracted_data['tipo_identificacion'] = 'cedula_panama'
-        logger.info(f"🆔 CÉDULA PANAMEÑA detectada (score: {cedula_panama_score})")
+        logger.info("🆔 CÉDULA PANAMEÑA detectada (score: %s)", cedula_panama_score)
     elif dni_spain_score >= 3:
         extracted_data['tipo_identificacion'] = 'dni'
-        logger.info(f"🪪 DNI ESPAÑOL detectado (score: {dni_spain_score})")
+        logger.info("🪪 DNI ESPAÑOL detectado (score: %s)", dni_spain_score)
     
     # ==================== EXTRACCIÓN ESPECÍFICA POR TIPO ====================
     
-    if extracted_data['tipo_identificacion'] == 'pasaporte':
-        extracted_data = extract_passport_data_improved(text, text_upper, extracted_data)
-    elif extracted_data['tipo_identificacion'] == 'cedula_panama':
-        extracted_data = extract_cedula_panama_data_improved(text, text_upper, extracted_data)
-    elif extracted_data['tipo_identificacion'] == 'dni':
-        extracted_data = extract_dni_spain_data_improved(text, text_upper, extracted_data)
-    else:
-        extracted_data = extract_generic_id_data_improved(text, text_upper, extracted_data)
+    # Una sola pasada de búsqueda de anclas; cada extractor evalúa solo los patrones presentes
+    anchors = find_anchors(text_norm)
     
+    tipo_identificacion = extracted_data['tipo_identificacion']
+    extractor = ID_EXTRACTORS.get(tipo_identificacion, extract_generic_id_data_improved)
+    extracted_data = extractor(text, text_upper, extracted_data, anchors, text_norm)
+    
+    return finalize_extracted_data(text, text_upper, extracted_data, tipo_identificacion)
+
+def finalize_extracted_data(text, text_upper, extracted_data, tipo_identificacion):
+    """
+    Pasos comunes tras el extractor del tipo: rescate del nombre con el extractor
+    universal y limpieza/validación final. tipo_identificacion es el tipo con el que
+    se eligió el extractor.
+    """
     # ==================== FALLBACK UNIVERSAL PARA NOMBRES ====================
     
     # Si NINGÚN método anterior extrajo nombre, intentar con el extractor universal
     if not extracted_data.get('nombre_completo'):
-        logger.warning(f"⚠️ Nombre no extraído con métodos específicos, intentando extractor universal...")
-        
-        # Intentar con tipo detectado
-        name_result = extract_name_universal(text, extracted_data.get('tipo_identificacion'))
+        tipo_final = extracted_data.get('tipo_identificacion')
         
-        if not name_result:
-            # Intentar sin tipo específico (todos los patrones)
-            name_result = extract_name_universal(text, None)
+        # extract_name_universal ya prueba todos los patrones si falla el del tipo: basta
+        # una llamada, y ninguna si el extractor del tipo ya la hizo sin resultado
+        if tipo_final == tipo_identificacion and tipo_final in NAME_EXTRACTOR_TYPES:
+            logger.warning("⚠️ Nombre no extraído: el extractor universal ya se aplicó para %s", tipo_final)
+            name_result = None
+        else:
+            logger.warning("⚠️ Nombre no extraído con métodos específicos, intentando extractor universal...")
+            name_result = extract_name_universal(text, tipo_final, text_upper)
         
         if name_result:
             extracted_data['nombre_completo'] = name_result['nombre_completo']
             extracted_data['nombre'] = name_result.get('nombre')
             extracted_data['apellidos'] = name_result.get('apellidos')
-            logger.info(f"🔧 Nombre rescatado con extractor universal: {name_result['nombre_completo']}")
-            logger.info(f"   Patrón usado: {name_result['pattern_used']}")
-            logger.info(f"   Confianza: {name_result['confidence']}")
+            logger.info("🔧 Nombre rescatado con extractor universal: %s", name_result['nombre_completo'])
+            logger.info("   Patrón usado: %s", name_result['pattern_used'])
+            logger.info("   Confianza: %s", name_result['confidence'])
         else:
-            logger.error(f"❌ NO se pudo extraer nombre con ningún método")
+            logger.error("❌ NO se pudo extraer nombre con ningún método")
     # ==================== VALIDACIÓN Y LIMPIEZA FINAL ====================
     
     # Limpiar y validar datos extraídos
@@ -1212,39 +1988,35 @@ def extract_id_document_data_improved_core(text, entidades=None, metadatos=None)
     
     return extracted_data
 
-def extract_dni_spain_data_improved(text, text_upper, extracted_data):
+def extract_dni_spain_data_improved(text, text_upper, extracted_data, anchors=None, text_norm=None):
     """Extracción mejorada para DNI español"""
     
+    if text_norm is None:
+        text_norm = normalize_upper_text(text_upper)
+    if anchors is None:
+        anchors = find_anchors(text_norm)
+    
     extracted_data['pais_emision'] = 'España'
     
     # 1. NÚMERO DE DNI
-    dni_patterns = [
-        r'(?i)DNI[:\s]*(\d{8}[A-Z])',
-        r'(?i)DOCUMENTO[:\s]+(\d{8}[A-Z])',
-        r'\b(\d{8}[A-Z])\b',
-        r'(?i)NACIONAL DE IDENTIDAD[:\s]*(\d{8}[A-Z])',
-    ]
-    
-    for pattern in dni_patterns:
-        match = re.search(pattern, text)
-        if match:
-            extracted_data['numero_identificacion'] = match.group(1)
-            logger.info(f"📝 Número de DNI: {extracted_data['numero_identificacion']}")
-            break
+    match = search_in_order(_DNI_NUMBER_RES, text)
+    if match:
+        extracted_data['numero_identificacion'] = match.group(1)
+        logger.info("📝 Número de DNI: %s", extracted_data['numero_identificacion'])
     
     # 2. VALIDAR Y LIMPIAR NÚMERO DE IDENTIFICACIÓN
     if extracted_data.get('numero_identificacion'):
         num_id = extracted_data['numero_identificacion']
         # Conservar solo letras, números y guiones
-        num_id = re.sub(r'[^\w-]', '', num_id)
+        num_id = _NON_ID_CHARS_RE.sub('', num_id)
         # Remover espacios extras
-        num_id = re.sub(r'\s+', '', num_id)
+        num_id = _WHITESPACE_RE.sub('', num_id)
         
         # Validar que tiene contenido significativo
         if len(num_id) >= 5:
             extracted_data['numero_identificacion'] = num_id
         else:
-            logger.warning(f"Número de identificación muy corto: '{num_id}'")
+            logger.warning("Número de identificación muy corto: '%s'", num_id)
             extracted_data['numero_identificacion'] = None
     
     # 3. LIMPIAR CAMPOS DE TEXTO LIBRE
@@ -1253,8 +2025,8 @@ def extract_dni_spain_data_improved(text, text_upper, extracted_data):
         if extracted_data.get(field):
             value = extracted_data[field]
             # Limpiar texto innecesario
-            value = re.sub(r'(SPECIMEN|MUESTRA)', '', value, flags=re.IGNORECASE)
-            value = re.sub(r'\s+', ' ', value).strip()
+            value = _SPECIMEN_IGNORECASE_RE.sub('', value)
+            value = _WHITESPACE_RE.sub(' ', value).strip()
             
             # Solo mantener si tiene contenido significativo
             if len(value) >= 3:
@@ -1274,7 +2046,7 @@ def extract_dni_spain_data_improved(text, text_upper, extracted_data):
             else:
                 extracted_data['genero'] = genero[0]  # Tomar primera letra
         else:
-            logger.warning(f"Género no reconocido: {genero}")
+            logger.warning("Género no reconocido: %s", genero)
             extracted_data['genero'] = None
     
     # 5. VALIDAR PAÍS DE EMISIÓN
@@ -1303,16 +2075,14 @@ def extract_dni_spain_data_improved(text, text_upper, extracted_data):
             extracted_data['pais_emision'] = None
     
     # 6. INFERIR DATOS FALTANTES BASADOS EN TIPO DE DOCUMENTO
-    doc_type = extracted_data.get('tipo_identificacion')
-    
-    if doc_type == 'cedula_panama' and not extracted_data.get('pais_emision'):
-        extracted_data['pais_emision'] = 'Panamá'
-        logger.info("🌍 País inferido: Panamá (por tipo de documento)")
+    inferido = PAIS_INFERIDO_POR_TIPO.get(extracted_data.get('tipo_identificacion'))
     
-    elif doc_type == 'dni' and not extracted_data.get('pais_emision'):
-        extracted_data['pais_emision'] = 'España'
-        extracted_data['nacionalidad'] = 'Española'
-        logger.info("🌍 País y nacionalidad inferidos: España/Española (por DNI)")
+    if inferido and not extracted_data.get('pais_emision'):
+        pais, nacionalidad = inferido
+        extracted_data['pais_emision'] = pais
+        if nacionalidad:
+            extracted_data['nacionalidad'] = nacionalidad
+        logger.info("🌍 País inferido: %s (por tipo de documento)", pais)
     
     # 7. VALIDAR COHERENCIA DE FECHAS
     fecha_emision = extracted_data.get('fecha_emision')
@@ -1321,15 +2091,15 @@ def extract_dni_spain_data_improved(text, text_upper, extracted_data):
     
     if fecha_emision and fecha_expiracion:
         try:
-            from datetime import datetime
-            emision_dt = datetime.strptime(fecha_emision, '%Y-%m-%d')
-            expiracion_dt = datetime.strptime(fecha_expiracion, '%Y-%m-%d')
+            emision_dt = date.fromisoformat(fecha_emision)
+            expiracion_dt = date.fromisoformat(fecha_expiracion)
             
             # La fecha de expiración debe ser posterior a la de emisión
             if emision_dt >= expiracion_dt:
-                logger.warning(f"Fechas incoherentes: emisión {fecha_emision} >= expiración {fecha_expiracion}")
+                logger.warning("Fechas incoherentes: emisión %s >= expiración %s", fecha_emision, fecha_expiracion)
                 # Mantener solo la fecha que parezca más confiable
-                if abs((emision_dt - datetime.now()).days) > abs((expiracion_dt - datetime.now()).days):
+                today = date.today()
+                if abs((emision_dt - today).days) > abs((expiracion_dt - today).days):
                     extracted_data['fecha_emision'] = None
                 else:
                     extracted_data['fecha_expiracion'] = None
@@ -1338,17 +2108,16 @@ def extract_dni_spain_data_improved(text, text_upper, extracted_data):
     
     if fecha_nacimiento:
         try:
-            from datetime import datetime
-            nacimiento_dt = datetime.strptime(fecha_nacimiento, '%Y-%m-%d')
-            now = datetime.now()
+            nacimiento_dt = date.fromisoformat(fecha_nacimiento)
+            now = date.today()
             
             # Validar que la fecha de nacimiento sea razonable
             age = (now - nacimiento_dt).days / 365.25
             if age < 0 or age > 120:
-                logger.warning(f"Fecha de nacimiento inválida: {fecha_nacimiento} (edad: {age:.1f} años)")
+                logger.warning("Fecha de nacimiento inválida: %s (edad: %.1f años)", fecha_nacimiento, age)
                 extracted_data['fecha_nacimiento'] = None
         except ValueError:
-            logger.warning(f"Formato de fecha de nacimiento inválido: {fecha_nacimiento}")
+            logger.warning("Formato de fecha de nacimiento inválido: %s", fecha_nacimiento)
             extracted_data['fecha_nacimiento'] = None
     
     # 8. ASEGURAR TIPO DE DOCUMENTO VÁLIDO
@@ -1356,132 +2125,105 @@ def extract_dni_spain_data_improved(text, text_upper, extracted_data):
         # Intentar última inferencia basada en datos disponibles
         if extracted_data.get('numero_identificacion'):
             numero = extracted_data['numero_identificacion']
-            if re.match(r'^[A-Z]{2}\d{7}', numero):
+            if _PASSPORT_NUMBER_PREFIX_RE.match(numero):
                 extracted_data['tipo_identificacion'] = 'dni'
-                logger.info(f"🪪 DNI detectado (score: 3)")
-            elif re.match(r'^[A-Z]{2}\d{7}', numero):
+                logger.info("🪪 DNI detectado (score: 3)")
+            elif _PASSPORT_NUMBER_PREFIX_RE.match(numero):
                 extracted_data['tipo_identificacion'] = 'pasaporte'
-                logger.info(f"📔 PASAPORTE detectado (score: 3)")
+                logger.info("📔 PASAPORTE detectado (score: 3)")
     
     # 2. NOMBRE COMPLETO
-    name_patterns = [
-        r'(?i)NOMBRE[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+APELLIDOS|\s+FECHA|\s*$)',
-        r'(?i)APELLIDOS[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+NOMBRE|\s+FECHA|\s*$)',
-        # Patrón para nombre completo junto
-        r'(?i)(?:NOMBRE COMPLETO|TITULAR)[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+FECHA|\s+DNI|\s*$)',
-    ]
-    
-    for pattern in name_patterns:
-        match = re.search(pattern, text)
+    if 'dni_name' in anchors:
+        match = search_in_order(_DNI_NAME_RES, text)
         if match:
             extracted_data['nombre_completo'] = match.group(1).strip()
-            logger.info(f"👤 Nombre completo: {extracted_data['nombre_completo']}")
-            break
+            logger.info("👤 Nombre completo: %s", extracted_data['nombre_completo'])
     
     # 3. FECHAS
-    date_patterns = [
-        r'(?i)(?:FECHA DE EXPEDICIÓN|EXPEDIDO)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        r'(?i)(?:FECHA DE CADUCIDAD|VÁLIDO HASTA)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        r'(?i)(?:FECHA DE NACIMIENTO|NACIDO)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-    ]
-    
-    for pattern in date_patterns:
-        matches = re.findall(pattern, text)
-        if matches:
-            if 'EXPEDICIÓN' in pattern or 'EXPEDIDO' in pattern:
-                extracted_data['fecha_emision'] = normalize_date_improved(matches[0])
-            elif 'CADUCIDAD' in pattern or 'VÁLIDO' in pattern:
-                extracted_data['fecha_expiracion'] = normalize_date_improved(matches[0])
-            elif 'NACIMIENTO' in pattern or 'NACIDO' in pattern:
-                extracted_data['fecha_nacimiento'] = normalize_date_improved(matches[0])
+    for field, pattern in _DNI_DATE_RES:
+        if f'dni_{field}' not in anchors:
+            continue
+        match = pattern.search(text)
+        if match:
+            extracted_data[field] = normalize_date_improved(match.group(1))
     
     # 4. LUGAR DE NACIMIENTO
-    birth_place_match = re.search(r'(?i)(?:LUGAR DE NACIMIENTO|NACIDO EN)[:\s]+([A-ZÁÉÍÓÚÑ\s,]+)', text)
-    if birth_place_match:
-        extracted_data['lugar_nacimiento'] = birth_place_match.group(1).strip()
+    if 'dni_lugar_nacimiento' in anchors:
+        birth_place_match = _DNI_BIRTH_PLACE_RE.search(text)
+        if birth_place_match:
+            extracted_data['lugar_nacimiento'] = birth_place_match.group(1).strip()
     
     # 5. NACIONALIDAD (siempre española para DNI)
     extracted_data['nacionalidad'] = 'Española'
     
     return extracted_data
 
-def extract_generic_id_data_improved(text, text_upper, extracted_data):
+def extract_generic_id_data_improved(text, text_upper, extracted_data, anchors=None, text_norm=None):
     """Extracción genérica mejorada para documentos no identificados específicamente"""
     
-    # 1. PATRONES GENÉRICOS PARA NÚMEROS DE IDENTIFICACIÓN
-    generic_id_patterns = [
-        r'(?i)(?:ID|IDENTIFICATION)[:\s]*([A-Z0-9]{5,15})',
-        r'(?i)(?:NÚMERO|NUMBER)[:\s]*([A-Z0-9]{5,15})',
-        r'(?i)(?:DOC|DOCUMENTO)[:\s]*([A-Z0-9]{5,15})',
-        r'(?i)(?:IDENTITY|IDENTIDAD)[:\s]*([A-Z0-9]{5,15})',
-        # Patrones para formatos comunes
-        r'\b([A-Z]{2,3}\d{6,8})\b',  # Formato pasaporte genérico
-        r'\b(\d{7,10})\b',  # Número genérico largo
-    ]
+    if text_norm is None:
+        text_norm = normalize_upper_text(text_upper)
+    if anchors is None:
+        anchors = find_anchors(text_norm)
     
-    for pattern in generic_id_patterns:
-        match = re.search(pattern, text)
+    # 1. PATRONES GENÉRICOS PARA NÚMEROS DE IDENTIFICACIÓN
+    for pattern in _GENERIC_ID_RES:
+        match = search_head(pattern, text)
         if match:
             potential_id = match.group(1)
             # Validar que no sea una fecha u otro dato
-            if not re.match(r'^\d{1,2}[/-]\d{1,2}[/-]\d{2,4}$', potential_id):
+            if not _NUMERIC_DATE_RE.match(potential_id):
                 extracted_data['numero_identificacion'] = potential_id
-                logger.info(f"📝 Número genérico encontrado: {potential_id}")
+                logger.info("📝 Número genérico encontrado: %s", potential_id)
                 break
     
     # 2. PATRONES GENÉRICOS PARA NOMBRES
-    generic_name_patterns = [
-        r'(?i)(?:NOMBRE|NAME)[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+(?:APELLIDO|SURNAME)|\s+\d|\s*$)',
-        r'(?i)(?:TITULAR|HOLDER)[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+\d|\s*$)',
-        r'(?i)(?:FULL NAME|NOMBRE COMPLETO)[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+\d|\s*$)',
-    ]
-    
-    for pattern in generic_name_patterns:
-        match = re.search(pattern, text)
+    if 'generic_name' in anchors:
+        match = search_in_order(_GENERIC_NAME_RES, text)
         if match:
             extracted_data['nombre_completo'] = match.group(1).strip()
-            logger.info(f"👤 Nombre genérico encontrado: {extracted_data['nombre_completo']}")
-            break
+            logger.info("👤 Nombre genérico encontrado: %s", extracted_data['nombre_completo'])
     
     # 3. PATRONES GENÉRICOS PARA FECHAS
-    generic_date_patterns = [
-        r'(?i)(?:ISSUED|EMITIDO|EXPEDIDO)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        r'(?i)(?:EXPIRES|EXPIRA|VENCE)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        r'(?i)(?:VALID UNTIL|VÁLIDO HASTA)[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-    ]
-    
-    for pattern in generic_date_patterns:
-        matches = re.findall(pattern, text)
-        if matches:
-            if 'ISSUED' in pattern or 'EMITIDO' in pattern or 'EXPEDIDO' in pattern:
-                extracted_data['fecha_emision'] = normalize_date_improved(matches[0])
-            elif any(word in pattern for word in ['EXPIRES', 'EXPIRA', 'VENCE', 'VALID']):
-                extracted_data['fecha_expiracion'] = normalize_date_improved(matches[0])
+    for field, pattern in _GENERIC_DATE_RES:
+        if f'generic_{field}' not in anchors:
+            continue
+        match = pattern.search(text)
+        if match:
+            extracted_data[field] = normalize_date_improved(match.group(1))
     
     # 4. INTENTAR DETECTAR EL TIPO DE DOCUMENTO POR CONTEXTO
     if extracted_data.get('numero_identificacion'):
         numero = extracted_data['numero_identificacion']
         
         # Si tiene formato de pasaporte
-        if re.match(r'^[A-Z]{2}\d{7}$', numero):
+        if _PASSPORT_NUMBER_FULL_RE.match(numero):
             extracted_data['tipo_identificacion'] = 'pasaporte'
-            logger.info(f"📔 Tipo inferido por formato de número: pasaporte")
+            logger.info("📔 Tipo inferido por formato de número: pasaporte")
         
         # Si tiene formato de cédula panameña
-        elif re.match(r'^\d{1,2}-\d{3,4}-\d{1,4}$', numero):
+        elif _CEDULA_PANAMA_NUMBER_FULL_RE.match(numero):
             extracted_data['tipo_identificacion'] = 'cedula_panama'
             extracted_data['pais_emision'] = 'Panamá'
-            logger.info(f"🆔 Tipo inferido por formato de número: cédula panameña")
+            logger.info("🆔 Tipo inferido por formato de número: cédula panameña")
         
         # Si tiene formato de DNI español
-        elif re.match(r'^\d{8}[A-Z]$', numero):
+        elif _DNI_NUMBER_FULL_RE.match(numero):
             extracted_data['tipo_identificacion'] = 'dni'
             extracted_data['pais_emision'] = 'España'
             extracted_data['nacionalidad'] = 'Española'
-            logger.info(f"🪪 Tipo inferido por formato de número: DNI español")
+            logger.info("🪪 Tipo inferido por formato de número: DNI español")
     
     return extracted_data
 
+# Extractor específico por tipo detectado (los demás tipos usan el genérico).
+# Todos comparten firma: (text, text_upper, extracted_data, anchors, text_norm)
+ID_EXTRACTORS = {
+    'pasaporte': extract_passport_data_improved,
+    'cedula_panama': extract_cedula_panama_data_improved,
+    'dni': extract_dni_spain_data_improved
+}
+
 def clean_and_validate_data_improved(extracted_data):
     """Limpia y valida los datos extraídos - VERSIÓN MEJORADA"""
     
@@ -1489,31 +2231,31 @@ def clean_and_validate_data_improved(extracted_data):
     if extracted_data.get('nombre_completo'):
         name = extracted_data['nombre_completo']
         # Eliminar texto no relevante
-        name = re.sub(r'(SPECIMEN|MUESTRA|NOMBRE USUAL)', '', name, flags=re.IGNORECASE)
-        name = re.sub(r'\s+', ' ', name).strip()
+        name = _NAME_NOISE_RE.sub('', name)
+        name = _WHITESPACE_RE.sub(' ', name).strip()
         # Remover caracteres especiales innecesarios
-        name = re.sub(r'[^\w\s\-\']', '', name)
+        name = _NAME_DISALLOWED_CHARS_RE.sub('', name)
         
         # Validar que tiene contenido significativo
         if len(name) >= 3 and not name.isdigit():
             extracted_data['nombre_completo'] = name
         else:
-            logger.warning(f"Nombre limpiado resulta inválido: '{name}'")
+            logger.warning("Nombre limpiado resulta inválido: '%s'", name)
             extracted_data['nombre_completo'] = None
     
     # 2. LIMPIAR NÚMERO DE IDENTIFICACIÓN
     if extracted_data.get('numero_identificacion'):
         num_id = extracted_data['numero_identificacion']
         # Conservar solo letras, números y guiones
-        num_id = re.sub(r'[^\w-]', '', num_id)
+        num_id = _NON_ID_CHARS_RE.sub('', num_id)
         # Remover espacios extras
-        num_id = re.sub(r'\s+', '', num_id)
+        num_id = _WHITESPACE_RE.sub('', num_id)
         
         # Validar que tiene contenido significativo
         if len(num_id) >= 5:
             extracted_data['numero_identificacion'] = num_id
         else:
-            logger.warning(f"Número de identificación muy corto: '{num_id}'")
+            logger.warning("Número de identificación muy corto: '%s'", num_id)
             extracted_data['numero_identificacion'] = None
     
     # 3. LIMPIAR CAMPOS DE TEXTO LIBRE
@@ -1522,8 +2264,8 @@ def clean_and_validate_data_improved(extracted_data):
         if extracted_data.get(field):
             value = extracted_data[field]
             # Limpiar texto innecesario
-            value = re.sub(r'(SPECIMEN|MUESTRA)', '', value, flags=re.IGNORECASE)
-            value = re.sub(r'\s+', ' ', value).strip()
+            value = _SPECIMEN_IGNORECASE_RE.sub('', value)
+            value = _WHITESPACE_RE.sub(' ', value).strip()
             
             # Solo mantener si tiene contenido significativo
             if len(value) >= 3:
@@ -1543,40 +2285,39 @@ def clean_and_validate_data_improved(extracted_data):
             else:
                 extracted_data['genero'] = genero[0]  # Tomar primera letra
         else:
-            logger.warning(f"Género no reconocido: {genero}")
+            logger.warning("Género no reconocido: %s", genero)
             extracted_data['genero'] = None
     
     return extracted_data
 
+# Función pura y las mismas fechas (p. ej. de expiración) se repiten entre documentos:
+# resultado cacheado, los logs solo se emiten la primera vez
+@lru_cache(maxsize=1024)
 def convert_spanish_date_improved(date_str):
     """Convierte fechas en español a formato ISO - VERSIÓN MEJORADA"""
     if not date_str:
         return None
     
-    # Mapeo de meses en español/inglés a números
-    month_map = {
-        'ENE': '01', 'FEB': '02', 'MAR': '03', 'ABR': '04', 'MAY': '05', 'JUN': '06',
-        'JUL': '07', 'AGO': '08', 'SEP': '09', 'OCT': '10', 'NOV': '11', 'DIC': '12',
-        'JAN': '01', 'APR': '04', 'AUG': '08', 'DEC': '12',
-        'ENERO': '01', 'FEBRERO': '02', 'MARZO': '03', 'ABRIL': '04', 'MAYO': '05', 'JUNIO': '06',
-        'JULIO': '07', 'AGOSTO': '08', 'SEPTIEMBRE': '09', 'OCTUBRE': '10', 'NOVIEMBRE': '11', 'DICIEMBRE': '12'
-    }
-    
     try:
-        # Limpiar y dividir la fecha
-        clean_date = re.sub(r'[^\w\s-]', '', date_str.strip())
-        parts = re.split(r'[-\s]+', clean_date)
+        # Caso habitual: tres partes sin signos que limpiar, una sola pasada
+        match = _SPANISH_DATE_PARTS_RE.fullmatch(date_str.strip())
+        if match:
+            parts = match.groups()
+        else:
+            # Limpiar y dividir la fecha
+            clean_date = _DATE_DISALLOWED_CHARS_RE.sub('', date_str.strip())
+            parts = _DATE_SEPARATORS_RE.split(clean_date)
         
         if len(parts) == 3:
             day = parts[0].strip()
-            month_text = parts[1].upper().strip()
+            month_text = parts[1].upper().strip().translate(_DIACRITICS_TABLE)
             year = parts[2].strip()
             
             # ✅ VALIDAR DÍA
             try:
                 day_int = int(day)
                 if day_int == 0 or day_int > 31:
-                    logger.warning(f"Día inválido {day_int}, usando 01")
+                    logger.warning("Día inválido %s, usando 01", day_int)
                     day = "01"
                 else:
                     day = str(day_int).zfill(2)
@@ -1584,53 +2325,52 @@ def convert_spanish_date_improved(date_str):
                 day = "01"
             
             # ✅ VALIDAR MES
-            if month_text in month_map:
-                month = month_map[month_text]
+            if month_text in _MONTH_MAP:
+                month = _MONTH_MAP[month_text]
             else:
                 # Buscar coincidencia parcial
-                for month_name, month_num in month_map.items():
+                for month_name, month_num in _MONTH_MAP.items():
                     if month_text in month_name or month_name in month_text:
                         month = month_num
                         break
                 else:
-                    logger.warning(f"Mes no reconocido: {month_text}, usando 01")
+                    logger.warning("Mes no reconocido: %s, usando 01", month_text)
                     month = "01"
             
             # ✅ VALIDAR AÑO
             try:
                 year_int = int(year)
                 if year_int < 1900 or year_int > 2100:
-                    logger.warning(f"Año inválido: {year_int}")
+                    logger.warning("Año inválido: %s", year_int)
                     return None
                 year = str(year_int)
             except ValueError:
-                logger.warning(f"Año inválido: {year}")
+                logger.warning("Año inválido: %s", year)
                 return None
             
             # ✅ VALIDAR FECHA FINAL
-            from datetime import datetime
             try:
-                test_date = datetime.strptime(f"{year}-{month}-{day}", '%Y-%m-%d')
+                test_date = date.fromisoformat(f"{year}-{month}-{day}")
                 final_date = f"{year}-{month}-{day}"
-                logger.info(f"✅ Fecha convertida: '{date_str}' → '{final_date}'")
+                logger.info("✅ Fecha convertida: '%s' → '%s'", date_str, final_date)
                 return final_date
             except ValueError:
                 # Usar primer día del mes como fallback
                 try:
-                    test_date = datetime.strptime(f"{year}-{month}-01", '%Y-%m-%d')
+                    test_date = date.fromisoformat(f"{year}-{month}-01")
                     final_date = f"{year}-{month}-01"
-                    logger.warning(f"Fecha corregida a: {final_date}")
+                    logger.warning("Fecha corregida a: %s", final_date)
                     return final_date
                 except ValueError:
-                    logger.error(f"No se pudo crear fecha válida para: {date_str}")
+                    logger.error("No se pudo crear fecha válida para: %s", date_str)
                     return None
     
     except Exception as e:
-        logger.warning(f"Error convirtiendo fecha '{date_str}': {str(e)}")
+        logger.warning("Error convirtiendo fecha '%s': %s", date_str, e)
     
     return None
 
-def extract_name_universal(text, document_type=None):
+def extract_name_universal(text, document_type=None, text_upper=None):
     """
     Función UNIVERSAL para extraer nombres de documentos de identidad.
     Maneja TODOS los formatos posibles de documentos panameños, españoles y pasaportes.
@@ -1638,6 +2378,7 @@ def extract_name_universal(text, document_type=None):
     Args:
         text (str): Texto extraído del documento
         document_type (str): Tipo de documento ('cedula_panama', 'dni', 'pasaporte', etc.)
+        text_upper (str): El mismo texto en mayúsculas y con espacios normalizados (opcional)
     
     Returns:
         dict: {
@@ -1653,7 +2394,7 @@ def extract_name_universal(text, document_type=None):
         return None
     
     # Limpiar y normalizar texto
-    clean_text = normalize_text_for_extraction(text)
+    clean_text = normalize_text_for_extraction(text, text_upper)
     
     # Intentar extracción específica por tipo de documento primero
     if document_type:
@@ -1664,16 +2405,23 @@ def extract_name_universal(text, document_type=None):
     # Si no se especifica tipo o falla, intentar todos los patrones
     return extract_name_with_all_patterns(clean_text)
 
-def normalize_text_for_extraction(text):
-    """Normaliza el texto para mejor extracción"""
-    # Convertir a mayúsculas
-    text = text.upper()
-    
-    # Normalizar espacios múltiples
-    text = re.sub(r'\s+', ' ', text)
+def normalize_text_for_extraction(text, text_upper=None):
+    """
+    Normaliza el texto para mejor extracción. Si se indica text_upper (texto ya en
+    mayúsculas y con espacios normalizados, como lo prepara el extractor principal)
+    no se vuelve a recorrer el texto para esos dos pasos.
+    """
+    if text_upper is not None:
+        text = text_upper
+    else:
+        # Convertir a mayúsculas
+        text = text.upper()
+        
+        # Normalizar espacios múltiples
+        text = _WHITESPACE_RE.sub(' ', text)
     
     # Limpiar caracteres problemáticos pero mantener estructura
-    text = re.sub(r'[^\w\s\-/]', ' ', text)
+    text = _EXTRACTION_DISALLOWED_CHARS_RE.sub(' ', text)
     
     return text.strip()
 
@@ -1689,75 +2437,22 @@ def extract_name_by_document_type(text, document_type):
     
     return None
 
+def has_name_pattern_keyword(text, pattern_info):
+    """Indica si el texto contiene alguna palabra clave del patrón (o si el patrón no tiene)"""
+    keywords = pattern_info.get('keywords')
+    return not keywords or any(keyword in text for keyword in keywords)
+
 def extract_name_cedula_panama(text):
     """
     Extracción ROBUSTA para cédulas panameñas.
     Maneja TODOS los formatos observados en los ejemplos.
     """
     
-    # PATRONES ORDENADOS POR PRIORIDAD Y ESPECIFICIDAD
-    patterns = [
-        # Patrón 1: Formato estándar con TRIBUNAL ELECTORAL
-        {
-            'pattern': r'TRIBUNAL\s+ELECTORAL\s+([A-Z][A-Z\s]+?)\s+(?:NOMBRE\s+USUAL|FECHA\s+DE\s+NACIMIENTO)',
-            'name': 'tribunal_electoral_standard',
-            'confidence': 0.95
-        },
-        
-        # Patrón 2: ELECTORAL seguido de nombre
-        {
-            'pattern': r'ELECTORAL\s+([A-Z][A-Z\s]+?)\s+(?:NOMBRE\s+USUAL|FECHA)',
-            'name': 'electoral_simple',
-            'confidence': 0.90
-        },
-        
-        # Patrón 3: Formato con DOCUMENTO DE IDENTIDAD + número
-        {
-            'pattern': r'DOCUMENTO\s+DE\s+IDENTIDAD\s+\d+\s+([A-Z][A-Z\s]+?)\s+NOMBRE\s+USUAL',
-            'name': 'documento_identidad_numbered',
-            'confidence': 0.92
-        },
-        
-        # Patrón 4: Formato P A ... N A ... M (visto en ejemplos)
-        {
-            'pattern': r'P\s+A\s+([A-Z][A-Z\s]+?)\s+N\s+A\s+([A-Z][A-Z\s]+?)\s+M',
-            'name': 'format_p_a_n_a_m',
-            'confidence': 0.85,
-            'special_handler': 'handle_p_a_n_a_format'
-        },
-        
-        # Patrón 5: Nombre antes de NOMBRE USUAL (más flexible)
-        {
-            'pattern': r'([A-Z]{2,}(?:\s+[A-Z]{2,}){1,4})\s+NOMBRE\s+USUAL',
-            'name': 'before_nombre_usual',
-            'confidence': 0.80
-        },
-        
-        # Patrón 6: Entre PANAMA y NOMBRE USUAL
-        {
-            'pattern': r'PANAMA\s+([A-Z][A-Z\s]+?)\s+NOMBRE\s+USUAL',
-            'name': 'panama_to_nombre',
-            'confidence': 0.85
-        },
-        
-        # Patrón 7: Nombre seguido de cédula (formato alternativo)
-        {
-            'pattern': r'([A-Z]{2,}(?:\s+[A-Z]{2,}){1,4})\s+\d{1,2}-\d{3,4}-\d{1,4}',
-            'name': 'name_before_cedula',
-            'confidence': 0.75
-        },
-        
-        # Patrón 8: Captura entre palabras clave comunes
-        {
-            'pattern': r'(?:REPUBLICA\s+DE\s+PANAMA|TRIBUNAL|ELECTORAL)\s+.*?([A-Z]{2,}(?:\s+[A-Z]{2,}){1,4})\s+(?:NOMBRE|FECHA|LUGAR)',
-            'name': 'between_keywords',
-            'confidence': 0.70
-        }
-    ]
-    
-    for pattern_info in patterns:
+    for pattern_info in _CEDULA_PANAMA_NAME_PATTERNS:
+        if not has_name_pattern_keyword(text, pattern_info):
+            continue
         try:
-            matches = re.finditer(pattern_info['pattern'], text)
+            matches = pattern_info['pattern'].finditer(text)
             
             for match in matches:
                 if pattern_info.get('special_handler'):
@@ -1774,11 +2469,11 @@ def extract_name_cedula_panama(text):
                 if result:
                     result['pattern_used'] = pattern_info['name']
                     result['confidence'] = pattern_info['confidence']
-                    logger.info(f"✅ Nombre extraído con patrón '{pattern_info['name']}': {result['nombre_completo']}")
+                    logger.info("✅ Nombre extraído con patrón '%s': %s", pattern_info['name'], result['nombre_completo'])
                     return result
                     
         except Exception as e:
-            logger.warning(f"Error en patrón {pattern_info['name']}: {str(e)}")
+            logger.warning("Error en patrón %s: %s", pattern_info['name'], e)
             continue
     
     logger.warning("❌ No se pudo extraer nombre con ningún patrón de cédula panameña")
@@ -1787,43 +2482,11 @@ def extract_name_cedula_panama(text):
 def extract_name_pasaporte(text):
     """Extracción ROBUSTA para pasaportes"""
     
-    patterns = [
-        # Patrón 1: APELLIDOS/SURNAME ... NOMBRES/GIVEN NAMES
-        {
-            'pattern': r'(?:APELLIDOS|SURNAME)\s*[/]*\s*([A-Z\s]+?)\s+(?:NOMBRES|GIVEN\s+NAMES)\s*[/]*\s*([A-Z\s]+?)(?:\s+(?:SPECIMEN|FECHA|DATE|\d))',
-            'name': 'apellidos_nombres_format',
-            'confidence': 0.95,
-            'type': 'apellidos_nombres'
-        },
-        
-        # Patrón 2: SURNAME ... GIVEN NAMES (formato internacional)
-        {
-            'pattern': r'SURNAME\s+([A-Z\s]+?)\s+GIVEN\s+NAMES\s+([A-Z\s]+?)(?:\s+(?:SPECIMEN|DATE|\d))',
-            'name': 'surname_given_names',
-            'confidence': 0.90,
-            'type': 'apellidos_nombres'
-        },
-        
-        # Patrón 3: Línea MRZ (Machine Readable Zone)
-        {
-            'pattern': r'P<[A-Z]{3}([A-Z]+)<([A-Z<]+?)<<',
-            'name': 'mrz_format',
-            'confidence': 0.85,
-            'type': 'mrz',
-            'special_handler': 'handle_mrz_format'
-        },
-        
-        # Patrón 4: Nombre en línea específica de pasaporte
-        {
-            'pattern': r'(?:PASSPORT|PASAPORTE)\s+(?:NO|N[Oº])\s*[A-Z0-9]+\s*([A-Z\s]+?)(?:\s+(?:NATIONALITY|FECHA))',
-            'name': 'after_passport_number',
-            'confidence': 0.75
-        }
-    ]
-    
-    for pattern_info in patterns:
+    for pattern_info in _PASAPORTE_NAME_PATTERNS:
+        if not has_name_pattern_keyword(text, pattern_info):
+            continue
         try:
-            match = re.search(pattern_info['pattern'], text)
+            match = pattern_info['pattern'].search(text)
             if match:
                 if pattern_info.get('special_handler') == 'handle_mrz_format':
                     result = handle_mrz_format(match)
@@ -1840,7 +2503,7 @@ def extract_name_pasaporte(text):
                             'confidence': pattern_info['confidence'],
                             'pattern_used': pattern_info['name']
                         }
-                        logger.info(f"✅ Nombre de pasaporte extraído: {result['nombre_completo']}")
+                        logger.info("✅ Nombre de pasaporte extraído: %s", result['nombre_completo'])
                         return result
                 else:
                     # Formato simple
@@ -1852,7 +2515,7 @@ def extract_name_pasaporte(text):
                         return result
                         
         except Exception as e:
-            logger.warning(f"Error en patrón de pasaporte {pattern_info['name']}: {str(e)}")
+            logger.warning("Error en patrón de pasaporte %s: %s", pattern_info['name'], e)
             continue
     
     return None
@@ -1860,27 +2523,11 @@ def extract_name_pasaporte(text):
 def extract_name_dni_spain(text):
     """Extracción para DNI español"""
     
-    patterns = [
-        {
-            'pattern': r'(?:NOMBRE|NAME)\s*[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+(?:APELLIDOS|SURNAME|FECHA|DNI|\d))',
-            'name': 'nombre_field',
-            'confidence': 0.90
-        },
-        {
-            'pattern': r'(?:APELLIDOS|SURNAME)\s*[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+(?:NOMBRE|NAME|FECHA|\d))',
-            'name': 'apellidos_field',
-            'confidence': 0.90
-        },
-        {
-            'pattern': r'(?:TITULAR|HOLDER)\s*[:\s]+([A-ZÁÉÍÓÚÑ\s]+?)(?:\s+(?:FECHA|DNI|\d))',
-            'name': 'titular_field',
-            'confidence': 0.85
-        }
-    ]
-    
-    for pattern_info in patterns:
+    for pattern_info in _DNI_SPAIN_NAME_PATTERNS:
+        if not has_name_pattern_keyword(text, pattern_info):
+            continue
         try:
-            match = re.search(pattern_info['pattern'], text)
+            match = pattern_info['pattern'].search(text)
             if match:
                 extracted_name = match.group(1).strip()
                 result = validate_and_clean_name(extracted_name)
@@ -1890,7 +2537,7 @@ def extract_name_dni_spain(text):
                     return result
                     
         except Exception as e:
-            logger.warning(f"Error en patrón DNI {pattern_info['name']}: {str(e)}")
+            logger.warning("Error en patrón DNI %s: %s", pattern_info['name'], e)
             continue
     
     return None
@@ -1913,7 +2560,7 @@ def handle_p_a_n_a_format(match):
     try:
         # En este formato, los grupos suelen ser apellidos y nombres
         apellidos = clean_name_component(match.group(1))
-        nombres = clean_name_component(match.group(2)) if len(match.groups()) > 1 else None
+        nombres = clean_name_component(match.group(2)) if match.re.groups > 1 else None
         
         if apellidos:
             if nombres:
@@ -2021,11 +2668,11 @@ def is_valid_name(name):
         return False
     
     # Debe contener solo letras, espacios y algunos caracteres especiales
-    if not re.match(r'^[A-ZÁÉÍÓÚÑa-záéíóúñ\s\-\'\.]+$', name):
+    if not _VALID_NAME_RE.match(name):
         return False
     
     # Debe tener al menos una letra
-    if not re.search(r'[A-Za-z]', name):
+    if not _ASCII_LETTER_RE.search(name):
         return False
     
     # No debe ser todo mayúsculas de menos de 3 caracteres
@@ -2038,7 +2685,7 @@ def is_valid_name(name):
         return False
     
     # No debe contener números
-    if re.search(r'\d', name):
+    if _DIGIT_RE.search(name):
         return False
     
     return True
@@ -2069,7 +2716,7 @@ def elegir_nombre(nombre_q, apellido_q, nombre_extraido):
         combinado = nombre_q or ""
 
     if nombre_extraido and len(nombre_extraido.split()) > len(combinado.split()):
-        logger.info(f"Nombre más completo encontrado en texto: {nombre_extraido}")
+        logger.info("Nombre más completo encontrado en texto: %s", nombre_extraido)
         return nombre_extraido.strip()
     
     return combinado or nombre_extraido
@@ -2079,13 +2726,13 @@ def elegir_valor(valor_q, valor_texto, campo, validacion=None):
         if validacion(valor_q):
             return valor_q
         elif validacion(valor_texto):
-            logger.info(f"{campo} del texto validado mejor que query.")
+            logger.info("%s del texto validado mejor que query.", campo)
             return valor_texto
     else:
         if valor_q:
             return valor_q
         elif valor_texto:
-            logger.info(f"{campo} tomado del texto porque no se encontró en query.")
+            logger.info("%s tomado del texto porque no se encontró en query.", campo)
             return valor_texto
     return None
 
@@ -2221,7 +2868,7 @@ def reconcile_identity_data(extracted_data, metadatos_extraccion):
         numero_inferido = extract_id_from_text_or_entities(extracted_data.get('texto_completo', ''))
         if numero_inferido:
             reconciled_data['numero_identificacion'] = numero_inferido
-            logger.info(f"📝 Número de identificación inferido: {numero_inferido}")
+            logger.info("📝 Número de identificación inferido: %s", numero_inferido)
     
     # Log de cambios realizados
     log_reconciliation_changes(extracted_data, reconciled_data)
@@ -2239,17 +2886,17 @@ def reconcile_full_name(texto_name, query_nombre, query_apellido, conf_nombre=0,
     query_nombre = clean_name_value(query_nombre)
     query_apellido = clean_name_value(query_apellido)
     
-    logger.info(f"🔍 Reconciliando nombres:")
-    logger.info(f"   Texto OCR: '{texto_name}'")
-    logger.info(f"   Query nombre: '{query_nombre}' (conf: {conf_nombre})")
-    logger.info(f"   Query apellido: '{query_apellido}' (conf: {conf_apellido})")
+    logger.info("🔍 Reconciliando nombres:")
+    logger.info("   Texto OCR: '%s'", texto_name)
+    logger.info("   Query nombre: '%s' (conf: %s)", query_nombre, conf_nombre)
+    logger.info("   Query apellido: '%s' (conf: %s)", query_apellido, conf_apellido)
     
     # Caso 1: Si tenemos nombre Y apellido separados en queries con buena confianza
     if query_nombre and query_apellido and conf_nombre >= 50 and conf_apellido >= 50:
         # Verificar que no sean duplicados
         if not names_are_duplicated(query_nombre, query_apellido):
             combined = f"{query_nombre} {query_apellido}".strip()
-            logger.info(f"✅ Usando combinación de queries: '{combined}'")
+            logger.info("✅ Usando combinación de queries: '%s'", combined)
             return combined
         else:
             logger.warning("⚠️ Nombres duplicados en queries, usando solo nombre")
@@ -2262,7 +2909,7 @@ def reconcile_full_name(texto_name, query_nombre, query_apellido, conf_nombre=0,
     if query_nombre and conf_nombre >= 70:
         # Comparar longitud con texto extraído
         if not texto_name or len(query_nombre.split()) >= len(texto_name.split()):
-            logger.info(f"✅ Usando nombre de query (más completo): '{query_nombre}'")
+            logger.info("✅ Usando nombre de query (más completo): '%s'", query_nombre)
             return query_nombre
     
     # Caso 3: El texto extraído es más completo que las queries
@@ -2271,16 +2918,16 @@ def reconcile_full_name(texto_name, query_nombre, query_apellido, conf_nombre=0,
         query_words = len(query_nombre.split()) if query_nombre else 0
         
         if texto_words > query_words and texto_words >= 3:
-            logger.info(f"✅ Usando nombre del texto (más completo): '{texto_name}'")
+            logger.info("✅ Usando nombre del texto (más completo): '%s'", texto_name)
             return texto_name
     
     # Caso 4: Fallback - usar el que tengamos disponible
     if query_nombre and conf_nombre >= 50:
-        logger.info(f"✅ Fallback a query nombre: '{query_nombre}'")
+        logger.info("✅ Fallback a query nombre: '%s'", query_nombre)
         return query_nombre
     
     if texto_name:
-        logger.info(f"✅ Fallback a texto: '{texto_name}'")
+        logger.info("✅ Fallback a texto: '%s'", texto_name)
         return texto_name
     
     logger.warning("❌ No se pudo determinar nombre completo")
@@ -2302,15 +2949,15 @@ def reconcile_simple_field(texto_value, query_value, field_name, validator=None)
         query_valid = validator(query_clean) if query_clean else False
         
         if query_valid and not texto_valid:
-            logger.info(f"🔄 {field_name}: Query válido '{query_clean}' vs texto inválido '{texto_clean}'")
+            logger.info("🔄 %s: Query válido '%s' vs texto inválido '%s'", field_name, query_clean, texto_clean)
             return query_clean
         elif texto_valid and not query_valid:
-            logger.info(f"🔄 {field_name}: Texto válido '{texto_clean}' vs query inválido '{query_clean}'")
+            logger.info("🔄 %s: Texto válido '%s' vs query inválido '%s'", field_name, texto_clean, query_clean)
             return texto_clean
         elif query_valid and texto_valid:
             # Ambos válidos, preferir query si no son iguales
             if query_clean != texto_clean:
-                logger.info(f"🔄 {field_name}: Ambos válidos, prefiriendo query '{query_clean}'")
+                logger.info("🔄 %s: Ambos válidos, prefiriendo query '%s'", field_name, query_clean)
                 return query_clean
     
     # Sin validador o ambos válidos iguales
@@ -2329,16 +2976,16 @@ def reconcile_date_field(texto_date, query_date, field_name):
     texto_normalized = normalize_date_improved(texto_date) if texto_date else None
     query_normalized = normalize_date_improved(query_date) if query_date else None
     
-    logger.info(f"📅 Reconciliando {field_name}:")
-    logger.info(f"   Texto: '{texto_date}' → '{texto_normalized}'")
-    logger.info(f"   Query: '{query_date}' → '{query_normalized}'")
+    logger.info("📅 Reconciliando %s:", field_name)
+    logger.info("   Texto: '%s' → '%s'", texto_date, texto_normalized)
+    logger.info("   Query: '%s' → '%s'", query_date, query_normalized)
     
     # Priorizar la fecha que se pudo normalizar correctamente
     if query_normalized and not texto_normalized:
-        logger.info(f"✅ Usando fecha de query (normalizada correctamente)")
+        logger.info("✅ Usando fecha de query (normalizada correctamente)")
         return query_normalized
     elif texto_normalized and not query_normalized:
-        logger.info(f"✅ Usando fecha de texto (normalizada correctamente)")
+        logger.info("✅ Usando fecha de texto (normalizada correctamente)")
         return texto_normalized
     elif query_normalized and texto_normalized:
         # Ambas válidas, comparar si son la misma fecha
@@ -2346,7 +2993,7 @@ def reconcile_date_field(texto_date, query_date, field_name):
             return query_normalized
         else:
             # Diferentes fechas válidas, preferir query
-            logger.info(f"⚠️ Fechas diferentes pero válidas, prefiriendo query")
+            logger.info("⚠️ Fechas diferentes pero válidas, prefiriendo query")
             return query_normalized
     
     # Ninguna se pudo normalizar, retornar la original que tengamos
@@ -2362,10 +3009,10 @@ def clean_name_value(name):
     clean = str(name).strip()
     
     # Remover caracteres no deseados pero mantener acentos
-    clean = re.sub(r'[^\w\s\-\']', '', clean)
+    clean = _NAME_DISALLOWED_CHARS_RE.sub('', clean)
     
     # Normalizar espacios
-    clean = re.sub(r'\s+', ' ', clean)
+    clean = _WHITESPACE_RE.sub(' ', clean)
     
     # Verificar que tiene contenido válido
     if len(clean) < 2 or clean.isdigit():
@@ -2423,15 +3070,8 @@ def extract_id_from_text_or_entities(text):
     if not text:
         return None
     
-    # Patrones para diferentes tipos de ID
-    patterns = [
-        r'\b(\d{1,2}-\d{3,4}-\d{1,4})\b',  # Cédula panameña
-        r'\b(\d{8}[A-Z])\b',               # DNI español
-        r'\b([A-Z]{2}\d{7})\b',            # Pasaporte
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text)
+    for pattern in _FALLBACK_ID_RES:
+        match = pattern.search(text)
         if match:
             return match.group(1)
     
@@ -2460,7 +3100,7 @@ def log_reconciliation_changes(original_data, reconciled_data):
     if changes:
         logger.info("🔄 Cambios realizados durante reconciliación:")
         for change in changes:
-            logger.info(f"   {change['field']}: '{change['original']}' → '{change['reconciled']}'")
+            logger.info("   %s: '%s' → '%s'", change['field'], change['original'], change['reconciled'])
     else:
         logger.info("✅ No se requirieron cambios durante la reconciliación")
 
@@ -2512,12 +3152,11 @@ def validate_cedula_with_queries(id_data, metadatos):
             
             if nac_norm and exp_norm:
                 try:
-                    from datetime import datetime
-                    nac_dt = datetime.strptime(nac_norm, '%Y-%m-%d')
-                    exp_dt = datetime.strptime(exp_norm, '%Y-%m-%d')
+                    nac_dt = date.fromisoformat(nac_norm)
+                    exp_dt = date.fromisoformat(exp_norm)
                     
                     if exp_dt <= nac_dt:
-                        logger.warning(f"⚠️ Fecha de expedición incoherente: {exp_norm} <= {nac_norm}")
+                        logger.warning("⚠️ Fecha de expedición incoherente: %s <= %s", exp_norm, nac_norm)
                         # Mantener solo la fecha de nacimiento que suele ser más confiable
                         id_data['fecha_emision'] = None
                 except ValueError:
@@ -2532,7 +3171,7 @@ def validate_cedula_with_queries(id_data, metadatos):
             )
             if numero_inferido:
                 id_data['numero_identificacion'] = numero_inferido
-                logger.info(f"📝 Número de cédula inferido: {numero_inferido}")
+                logger.info("📝 Número de cédula inferido: %s", numero_inferido)
         
         # Asegurar país de emisión para cédulas panameñas
         if not id_data.get('pais_emision'):
@@ -2542,7 +3181,7 @@ def validate_cedula_with_queries(id_data, metadatos):
         return id_data
         
     except Exception as e:
-        logger.error(f"Error en validación de cédula: {str(e)}")
+        logger.error("Error en validación de cédula: %s", e)
         return id_data
 
 
@@ -2555,403 +3194,453 @@ def extract_cedula_number_from_entities_or_text(entidades, texto):
     if isinstance(entidades, dict):
         phone_numbers = entidades.get('phone', [])
         for phone in phone_numbers:
-            if re.match(r'^\d{1,2}-\d{3,4}-\d{1,4}$', phone):
-                logger.info(f"📱 Número de cédula encontrado en entidades: {phone}")
+            if _CEDULA_PANAMA_NUMBER_FULL_RE.match(phone):
+                logger.info("📱 Número de cédula encontrado en entidades: %s", phone)
                 return phone
     
     # Si no se encuentra en entidades, buscar en texto
     if texto:
-        cedula_match = re.search(r'\b(\d{1,2}-\d{3,4}-\d{1,4})\b', texto)
+        cedula_match = _PANAMA_ID_RE.search(texto)
         if cedula_match:
-            logger.info(f"📄 Número de cédula encontrado en texto: {cedula_match.group(1)}")
+            logger.info("📄 Número de cédula encontrado en texto: %s", cedula_match.group(1))
             return cedula_match.group(1)
     
     return None
 
-def lambda_handler(event, context):
+def process_record(record, today=None, log_buffer=None):
     """
-    Función principal CORREGIDA para procesar documentos de identidad CON RECONCILIACIÓN
+    Procesa un mensaje SQS (un documento de identidad) de forma independiente.
+    Devuelve el detalle del documento y los contadores a sumar en la respuesta.
+    today: fecha de referencia del lote para las fechas por defecto
+    log_buffer: buffer de registros de procesamiento compartido por el lote; quien lo
+        pasa se encarga de escribirlo. Sin él, el documento escribe los suyos al terminar
     """
-    start_time = time.time()
-    logger.info("=" * 80)
-    logger.info("🚀 INICIANDO PROCESAMIENTO DE DOCUMENTO DE IDENTIDAD CON RECONCILIACIÓN")
-    logger.info("=" * 80)
-    logger.info("Evento recibido: " + json.dumps(event))
-    
-    response = {
+    contadores = {
         'procesados': 0,
         'errores': 0,
-        'requieren_revision': 0,
-        'detalles': []
+        'requieren_revision': 0
     }
-
-    for record in event['Records']:
-        documento_detalle = {
-            'documento_id': None,
-            'estado': 'sin_procesar',
-            'tiempo': 0,
-            'tipo_detectado': None,
-            'datos_extraidos': False,
-            'reconciliacion_aplicada': False
-        }
+    
+    documento_detalle = DOCUMENTO_DETALLE_INICIAL.copy()
+    
+    record_start = time.monotonic()
+    document_id = None
+    registro_id = None
+    # Registros de procesamiento del documento: se escriben juntos al final
+    flush_log_buffer = log_buffer is None
+    if flush_log_buffer:
+        log_buffer = {}
+    
+    try:
+        # ==================== PARSEAR MENSAJE ====================
+        
+        message_body = json.loads(record['body'])
+        document_id = message_body['document_id']
+        documento_detalle['documento_id'] = document_id
+        
+        logger.info("📄 Procesando documento: %s", document_id)
+        
+        # Iniciar registro de procesamiento
+        registro_id = log_document_processing_start(
+            document_id, 
+            'procesamiento_identidad_con_reconciliacion',
+            # El cuerpo del mensaje ya es JSON: registrarlo sin volver a serializar
+            datos_entrada=record['body'],
+            buffer=log_buffer
+        )
+        
+        # ==================== OBTENER DATOS DE LA BD ====================
+        
+        logger.info("📥 Recuperando datos extraídos de la base de datos...")
+        document_data_result = get_extracted_data_from_db(document_id)
+        
+        if not document_data_result:
+            raise Exception(f"No se pudieron recuperar datos del documento {document_id}")
+        
+        extracted_text = document_data_result['extracted_data'].get('texto_completo')
+        if not extracted_text:
+            raise Exception(f"No hay texto extraído disponible para documento {document_id}")
+        
+        logger.info("📖 Texto recuperado: %s caracteres", len(extracted_text))
+        
+        # ==================== EXTRACCIÓN CON RECONCILIACIÓN ====================
+        
+        logger.info("🔍 Iniciando extracción con reconciliación de datos...")
+        
+        entidades = document_data_result['extracted_data'].get('entidades')
+        metadatos = document_data_result['extracted_data'].get('metadatos_extraccion')
+        
+        # Registrar sub-proceso de extracción
+        sub_registro_id = log_document_processing_start(
+            document_id, 
+            'extraccion_datos_identidad_con_reconciliacion',
+            datos_entrada=dumps_json({
+                "texto_longitud": len(extracted_text),
+                "tiene_metadatos": bool(metadatos),
+                "tiene_entidades": bool(entidades)
+            }),
+            analisis_id=registro_id,
+            buffer=log_buffer
+        )
+        
+        # ✅ UNA SOLA LLAMADA - CON RECONCILIACIÓN INTEGRADA
+        id_data = extract_id_document_data_improved_with_reconciliation(
+            extracted_text, 
+            entidades, 
+            metadatos
+        )
+        
+        tipo_detectado = id_data.get('tipo_identificacion', 'desconocido')
+        documento_detalle['tipo_detectado'] = tipo_detectado
+        
+        # Verificar si se aplicó reconciliación
+        if metadatos:
+            documento_detalle['reconciliacion_aplicada'] = True
+            logger.info("✅ Reconciliación con query_answers aplicada")
+        
+        # Validación adicional para cédulas
+        if tipo_detectado in ['cedula_panama', 'cedula'] and metadatos:
+            logger.info("🔍 Aplicando validación adicional para cédula...")
+            id_data = validate_cedula_with_queries(id_data, metadatos)
+        
+        # Campos con valor: id_data no cambia a partir de aquí
+        campos_extraidos = [k for k, v in id_data.items() if v is not None]
+        
+        # Finalizar registro de extracción
+        log_document_processing_end(
+            sub_registro_id, 
+            estado='completado',
+            datos_procesados=dumps_json({
+                "tipo_detectado": tipo_detectado,
+                "numero_extraido": bool(id_data.get('numero_identificacion')),
+                "nombre_extraido": bool(id_data.get('nombre_completo')),
+                "campos_totales": len(campos_extraidos),
+                "reconciliacion_aplicada": documento_detalle['reconciliacion_aplicada']
+            }),
+            buffer=log_buffer
+        )
+        
+        # ==================== VALIDACIÓN MEJORADA ====================
+        
+        logger.info("✅ Validando datos extraídos...")
+        validation = validate_id_document_improved(id_data, today)
+        confidence = validation['confidence']
+        
+        logger.info("📊 Validación completada - Confianza: %.2f", confidence)
+        if validation['errors']:
+            logger.error("❌ Errores encontrados: %s", '; '.join(validation['errors']))
+        if validation['warnings']:
+            logger.warning("⚠️ Advertencias: %s", '; '.join(validation['warnings']))
+        
+        # Evaluación de confianza (los errores de validación siempre requieren revisión)
+        requires_review = bool(validation['errors']) or evaluate_confidence(
+            confidence,
+            document_type=tipo_detectado,
+            validation_results=validation
+        )
+        
+        if requires_review:
+            documento_detalle['estado'] = 'requiere_revision'
+            contadores['requieren_revision'] += 1
+            logger.warning("⚠️ Documento %s requiere revisión manual", document_id)
+            
+            try:
+                mark_for_manual_review(
+                    document_id=document_id,
+                    analysis_id=registro_id,
+                    confidence=confidence,
+                    document_type=tipo_detectado,
+                    validation_info=validation,
+                    extracted_data=id_data
+                )
+            except Exception as review_error:
+                logger.error("Error al marcar para revisión: %s", review_error)
         
-        record_start = time.time()
-        registro_id = None
+        # ==================== GUARDAR EN BASE DE DATOS ====================
         
-        try:
-            # ==================== PARSEAR MENSAJE ====================
-            
-            message_body = json.loads(record['body'])
-            document_id = message_body['document_id']
-            documento_detalle['documento_id'] = document_id
-            
-            logger.info(f"📄 Procesando documento: {document_id}")
+        # Criterios mejorados para guardar (más flexibles después de reconciliación)
+        should_save = (
+            id_data.get('numero_identificacion') and 
+            not id_data['numero_identificacion'].startswith('AUTO-')
+        )
+        
+        # Si tenemos nombre completo después de reconciliación, es un plus
+        if id_data.get('nombre_completo') and id_data['nombre_completo'] != 'Titular no identificado':
+            logger.info("✅ Nombre completo disponible después de reconciliación")
+
+        if should_save:
+            logger.info("💾 Guardando datos extraídos en base de datos...")
             
-            # Iniciar registro de procesamiento
-            registro_id = log_document_processing_start(
+            db_registro_id = log_document_processing_start(
                 document_id, 
-                'procesamiento_identidad_con_reconciliacion',
-                datos_entrada=message_body
+                'guardar_datos_identidad',
+                datos_entrada=dumps_json({
+                    "tipo_documento": tipo_detectado,
+                    "confidence": confidence,
+                    "valid": validation['is_valid'],
+                    "reconciliacion_aplicada": documento_detalle['reconciliacion_aplicada']
+                }),
+                analisis_id=registro_id,
+                buffer=log_buffer
             )
             
-            # ==================== OBTENER DATOS DE LA BD ====================
-            
-            logger.info(f"📥 Recuperando datos extraídos de la base de datos...")
-            document_data_result = get_extracted_data_from_db(document_id)
-            
-            if not document_data_result:
-                raise Exception(f"No se pudieron recuperar datos del documento {document_id}")
+            success = register_document_identification_improved(document_id, id_data, today)
             
-            extracted_text = document_data_result['extracted_data'].get('texto_completo')
-            if not extracted_text:
-                raise Exception(f"No hay texto extraído disponible para documento {document_id}")
-            
-            logger.info(f"📖 Texto recuperado: {len(extracted_text)} caracteres")
-            
-            # ==================== EXTRACCIÓN CON RECONCILIACIÓN ====================
-            
-            logger.info(f"🔍 Iniciando extracción con reconciliación de datos...")
-            
-            entidades = document_data_result['extracted_data'].get('entidades')
-            metadatos = document_data_result['extracted_data'].get('metadatos_extraccion')
+            if success:
+                logger.info("✅ Datos guardados exitosamente")
+                documento_detalle['datos_extraidos'] = True
+                log_document_processing_end(db_registro_id, estado='completado', buffer=log_buffer)
+                log_identification_changes(document_id)
+            else:
+                logger.error("❌ Error al guardar datos")
+                documento_detalle['error_guardado'] = "Falló el guardado en BD"
+                log_document_processing_end(
+                    db_registro_id, 
+                    estado='error',
+                    mensaje_error="Error al guardar en base de datos",
+                    buffer=log_buffer
+                )
+        else:
+            logger.warning("⚠️ Datos insuficientes para guardar")
+            documento_detalle['estado'] = 'datos_insuficientes'
+            contadores['requieren_revision'] += 1
             
-            # Registrar sub-proceso de extracción
-            sub_registro_id = log_document_processing_start(
+            update_document_processing_status(
                 document_id, 
-                'extraccion_datos_identidad_con_reconciliacion',
-                datos_entrada={
-                    "texto_longitud": len(extracted_text),
-                    "tiene_metadatos": bool(metadatos),
-                    "tiene_entidades": bool(entidades)
-                },
-                analisis_id=registro_id
-            )
-            
-            # ✅ UNA SOLA LLAMADA - CON RECONCILIACIÓN INTEGRADA
-            id_data = extract_id_document_data_improved_with_reconciliation(
-                extracted_text, 
-                entidades, 
-                metadatos
+                'requiere_revision_manual',
+                f"Datos extraídos insuficientes tras reconciliación. "
+                f"Número: {id_data.get('numero_identificacion')}, "
+                f"Nombre: {id_data.get('nombre_completo')}"
             )
-            
-            tipo_detectado = id_data.get('tipo_identificacion', 'desconocido')
-            documento_detalle['tipo_detectado'] = tipo_detectado
-            
-            # Verificar si se aplicó reconciliación
-            if metadatos:
-                documento_detalle['reconciliacion_aplicada'] = True
-                logger.info("✅ Reconciliación con query_answers aplicada")
-            
-            # Validación adicional para cédulas
-            if tipo_detectado in ['cedula_panama', 'cedula'] and metadatos:
-                logger.info("🔍 Aplicando validación adicional para cédula...")
-                id_data = validate_cedula_with_queries(id_data, metadatos)
-            
-            # Finalizar registro de extracción
-            log_document_processing_end(
-                sub_registro_id, 
-                estado='completado',
-                datos_procesados={
-                    "tipo_detectado": tipo_detectado,
-                    "numero_extraido": bool(id_data.get('numero_identificacion')),
-                    "nombre_extraido": bool(id_data.get('nombre_completo')),
-                    "campos_totales": len([k for k, v in id_data.items() if v is not None]),
-                    "reconciliacion_aplicada": documento_detalle['reconciliacion_aplicada']
-                }
+        
+        # ==================== ESTADO FINAL ====================
+        
+        # Determinar estado final
+        status, message = ESTADO_FINAL_TABLE[(bool(requires_review or not should_save), bool(validation['is_valid']))]
+        
+        # Obtener tipo de documento para la actualización de estado
+        tipo_normalizado = TIPO_DOCUMENTO_ESTADO_MAP.get(tipo_detectado, TIPO_DOCUMENTO_ESTADO_DEFAULT)
+        
+        final_details = {
+            'validación': validation,
+            'tipo_detectado': tipo_detectado,
+            'campos_extraídos': campos_extraidos,
+            'requires_review': requires_review,
+            'datos_guardados': should_save,
+            'reconciliacion_aplicada': documento_detalle['reconciliacion_aplicada']
+        }
+        # Serializar una sola vez: se usa en el estado del análisis y en el registro final
+        final_details_json = dumps_json(final_details)
+        
+        # ==================== ACTUALIZAR DOCUMENTO PRINCIPAL Y ESTADO ====================
+        
+        update_id = log_document_processing_start(
+            document_id, 
+            'actualizar_documento_principal',
+            datos_entrada=dumps_json({
+                "confidence": confidence, 
+                "is_valid": validation['is_valid'],
+                "reconciliacion_aplicada": documento_detalle['reconciliacion_aplicada']
+            }),
+            analisis_id=registro_id,
+            buffer=log_buffer
+        )
+        
+        # Datos extraídos + estado del análisis en una sola transacción
+        try:
+            id_data_json = dumps_json(id_data)
+            update_document = not extraction_data_unchanged(
+                document_data_result['document_data'],
+                id_data,
+                confidence,
+                validation['is_valid']
             )
+            if not update_document:
+                logger.info("📄 Datos extraídos sin cambios, solo se actualiza el estado")
             
-            # ==================== VALIDACIÓN MEJORADA ====================
-            
-            logger.info(f"✅ Validando datos extraídos...")
-            validation = validate_id_document_improved(id_data)
-            confidence = validation['confidence']
-            
-            logger.info(f"📊 Validación completada - Confianza: {confidence:.2f}")
-            if validation['errors']:
-                logger.error(f"❌ Errores encontrados: {'; '.join(validation['errors'])}")
-            if validation['warnings']:
-                logger.warning(f"⚠️ Advertencias: {'; '.join(validation['warnings'])}")
-            
-            # Evaluación de confianza
-            requires_review = evaluate_confidence(
+            persist_id_document_results(
+                document_id,
+                id_data_json,
                 confidence,
-                document_type=tipo_detectado,
-                validation_results=validation
+                validation['is_valid'],
+                status,
+                final_details_json,
+                tipo_normalizado,
+                update_document=update_document
             )
             
-            if requires_review:
-                documento_detalle['estado'] = 'requiere_revision'
-                response['requieren_revision'] += 1
-                logger.warning(f"⚠️ Documento {document_id} requiere revisión manual")
-                
-                try:
-                    mark_for_manual_review(
-                        document_id=document_id,
-                        analysis_id=registro_id,
-                        confidence=confidence,
-                        document_type=tipo_detectado,
-                        validation_info=validation,
-                        extracted_data=id_data
-                    )
-                except Exception as review_error:
-                    logger.error(f"Error al marcar para revisión: {str(review_error)}")
-            
-            # ==================== GUARDAR EN BASE DE DATOS ====================
+            log_document_processing_end(update_id, estado='completado', buffer=log_buffer)
+            logger.info("📄 Documento principal y estado actualizados")
             
-            # Criterios mejorados para guardar (más flexibles después de reconciliación)
-            should_save = (
-                id_data.get('numero_identificacion') and 
-                not id_data['numero_identificacion'].startswith('AUTO-')
+        except Exception as update_error:
+            log_document_processing_end(
+                update_id, 
+                estado='error',
+                mensaje_error=str(update_error),
+                buffer=log_buffer
             )
-            
-            # Si tenemos nombre completo después de reconciliación, es un plus
-            if id_data.get('nombre_completo') and id_data['nombre_completo'] != 'Titular no identificado':
-                logger.info("✅ Nombre completo disponible después de reconciliación")
-
-            if should_save:
-                logger.info(f"💾 Guardando datos extraídos en base de datos...")
-                
-                db_registro_id = log_document_processing_start(
-                    document_id, 
-                    'guardar_datos_identidad',
-                    datos_entrada={
-                        "tipo_documento": tipo_detectado,
-                        "confidence": confidence,
-                        "valid": validation['is_valid'],
-                        "reconciliacion_aplicada": documento_detalle['reconciliacion_aplicada']
-                    },
-                    analisis_id=registro_id
-                )
-                
-                success = register_document_identification_improved(document_id, id_data)
-                
-                if success:
-                    logger.info(f"✅ Datos guardados exitosamente")
-                    documento_detalle['datos_extraidos'] = True
-                    log_document_processing_end(db_registro_id, estado='completado')
-                    log_identification_changes(document_id)
-                else:
-                    logger.error(f"❌ Error al guardar datos")
-                    documento_detalle['error_guardado'] = "Falló el guardado en BD"
-                    log_document_processing_end(
-                        db_registro_id, 
-                        estado='error',
-                        mensaje_error="Error al guardar en base de datos"
-                    )
-            else:
-                logger.warning(f"⚠️ Datos insuficientes para guardar")
-                documento_detalle['estado'] = 'datos_insuficientes'
-                response['requieren_revision'] += 1
-                
+            raise
+        
+        documento_detalle['confianza'] = confidence
+        documento_detalle['estado_final'] = status
+        
+        # ==================== ASIGNAR CARPETA Y PUBLICAR EVENTO ====================
+        
+        # Un fallo aquí marca el mensaje como fallido para que SQS lo reintente
+        # El cliente vinculado llega con la lectura inicial del documento
+        document_data = document_data_result['document_data']
+        if 'id_cliente' in document_data:
+            cliente_id = document_data['id_cliente']
+        else:
+            cliente_id = get_client_id_by_document(document_id)
+        if cliente_id:
+            logger.info("👤 Asignando carpeta para documento %s", document_id)
+            assign_folder_and_link(cliente_id, document_id)
+        
+        logger.info("📝 Estado antes de crear instancia: %s", status)
+        crear_instancia_flujo_documento(document_id)
+        logger.info("📝 Estado despues de crear instancia: %s", status)
+        
+        # Solo cuenta como procesado una vez persistidos los resultados y creado el flujo
+        if documento_detalle['estado'] == 'sin_procesar':
+            documento_detalle['estado'] = 'procesado'
+            contadores['procesados'] += 1
+        
+        # Finalizar registro principal exitosamente
+        log_document_processing_end(
+            registro_id, 
+            estado='completado',
+            confianza=confidence,
+            datos_salida=final_details_json,
+            mensaje_error=None if validation['is_valid'] else "Procesado con advertencias",
+            buffer=log_buffer
+        )
+
+        logger.info("✅ Documento %s procesado completamente", document_id)
+        logger.info("   📋 Tipo: %s", tipo_detectado)
+        logger.info("   📊 Confianza: %.2f", confidence)
+        logger.info("   📝 Estado: %s", status)
+        reconciliacion_msg = "✅ Aplicada" if documento_detalle['reconciliacion_aplicada'] else "❌ No disponible"
+        logger.info("   🔄 Reconciliación: %s", reconciliacion_msg)
+        
+    except Exception as e:
+        error_msg = str(e)
+        doc_id = document_id if document_id is not None else 'DESCONOCIDO'
+        logger.exception("❌ Error procesando documento %s: %s", doc_id, error_msg)
+        
+        documento_detalle['estado'] = 'error'
+        documento_detalle['error'] = error_msg
+        contadores['errores'] += 1
+        
+        # Actualizar estado de error
+        if document_id is not None:
+            try:
                 update_document_processing_status(
                     document_id, 
-                    'requiere_revision_manual',
-                    f"Datos extraídos insuficientes tras reconciliación. "
-                    f"Número: {id_data.get('numero_identificacion')}, "
-                    f"Nombre: {id_data.get('nombre_completo')}"
+                    'error',
+                    f"Error en procesamiento de identidad con reconciliación: {error_msg}"
                 )
-            
-            # ==================== ACTUALIZAR DOCUMENTO PRINCIPAL ====================
-            
-            update_id = log_document_processing_start(
-                document_id, 
-                'actualizar_documento_principal',
-                datos_entrada={
-                    "confidence": confidence, 
-                    "is_valid": validation['is_valid'],
-                    "reconciliacion_aplicada": documento_detalle['reconciliacion_aplicada']
-                },
-                analisis_id=registro_id
-            )
-            
-            try:
-                update_document_extraction_data_with_type_preservation(
-                    document_id,
-                    json.dumps(id_data, ensure_ascii=False),
-                    confidence,
-                    validation['is_valid']
-                )
-                
-                log_document_processing_end(update_id, estado='completado')
-                logger.info(f"📄 Documento principal actualizado")
-                
-            except Exception as update_error:
-                log_document_processing_end(
-                    update_id, 
-                    estado='error',
-                    mensaje_error=str(update_error)
-                )
-                logger.error(f"Error al actualizar documento principal: {str(update_error)}")
-            
-            # ==================== ACTUALIZAR ESTADO FINAL ====================
-            
-            if documento_detalle['estado'] == 'sin_procesar':
-                documento_detalle['estado'] = 'procesado'
-                response['procesados'] += 1
-            
-            # Determinar estado final
-            if requires_review or not should_save:
-                status = 'requiere_revision_manual'
-                message = "Documento procesado con reconciliación - Requiere revisión manual"
-            elif validation['is_valid']:
-                status = 'procesamiento_completado'
-                message = "Documento de identidad procesado correctamente con reconciliación"
-            else:
-                status = 'requiere_revision_manual'
-                message = "Documento procesado con reconciliación y advertencias"
-            
-            # Obtener tipo de documento para la actualización de estado
-            tipo_doc_map = {
-                'dni': 'DNI',
-                'cedula_panama': 'Cédula',
-                'cedula': 'Cédula',
-                'pasaporte': 'Pasaporte'
-            }
-            tipo_normalizado = tipo_doc_map.get(tipo_detectado, 'Documento de Identidad')
-            
-            final_details = {
-                'validación': validation,
-                'tipo_detectado': tipo_detectado,
-                'campos_extraídos': [k for k, v in id_data.items() if v is not None],
-                'requires_review': requires_review,
-                'datos_guardados': should_save,
-                'reconciliacion_aplicada': documento_detalle['reconciliacion_aplicada']
-            }
-            
-            update_document_processing_status(
-                document_id, 
-                status, 
-                json.dumps(final_details, ensure_ascii=False),
-                tipo_documento=tipo_normalizado
-            )
-            
-            documento_detalle['confianza'] = confidence
-            documento_detalle['estado_final'] = status
-            
-            # Finalizar registro principal exitosamente
+            except:
+                pass
+        
+        # Finalizar registro con error
+        if registro_id:
             log_document_processing_end(
                 registro_id, 
-                estado='completado',
-                confianza=confidence,
-                datos_salida=final_details,
-                mensaje_error=None if validation['is_valid'] else "Procesado con advertencias"
+                estado='error',
+                mensaje_error=error_msg,
+                buffer=log_buffer
             )
-
-            logger.info(f"✅ Documento {document_id} procesado completamente")
-            logger.info(f"   📋 Tipo: {tipo_detectado}")
-            logger.info(f"   📊 Confianza: {confidence:.2f}")
-            logger.info(f"   📝 Estado: {status}")
-            reconciliacion_msg = "✅ Aplicada" if documento_detalle['reconciliacion_aplicada'] else "❌ No disponible"
-            logger.info(f"   🔄 Reconciliación: {reconciliacion_msg}")
-            
-        except Exception as e:
-            error_msg = str(e)
-            doc_id = document_id if 'document_id' in locals() else 'DESCONOCIDO'
-            logger.error(f"❌ Error procesando documento {doc_id}: {error_msg}")
-            logger.error(traceback.format_exc())
-            
-            documento_detalle['estado'] = 'error'
-            documento_detalle['error'] = error_msg
-            response['errores'] += 1
             
-            # Actualizar estado de error
-            if 'document_id' in locals():
-                try:
-                    update_document_processing_status(
-                        document_id, 
-                        'error',
-                        f"Error en procesamiento de identidad con reconciliación: {error_msg}"
-                    )
-                except:
-                    pass
-            
-            # Finalizar registro con error
-            if registro_id:
-                log_document_processing_end(
-                    registro_id, 
-                    estado='error',
-                    mensaje_error=error_msg
-                )
-                
-        finally:
-            # Calcular tiempo de procesamiento
-            tiempo_procesamiento = time.time() - record_start
-            documento_detalle['tiempo'] = tiempo_procesamiento
-            response['detalles'].append(documento_detalle)
+    finally:
+        # Calcular tiempo de procesamiento
+        tiempo_procesamiento = time.monotonic() - record_start
+        documento_detalle['tiempo'] = tiempo_procesamiento
+        if flush_log_buffer and not flush_processing_log_buffer(log_buffer):
+            logger.warning("⚠️ Algunos registros de procesamiento de %s no se guardaron", document_id)
+    
+    return documento_detalle, contadores
 
-    # ==================== ASIGNAR CARPETA (SOLO SI HAY ÉXITOS) ====================
+def lambda_handler(event, context):
+    """
+    Función principal CORREGIDA para procesar documentos de identidad CON RECONCILIACIÓN
+    """
+    start_time = time.monotonic()
+    logger.info(
+        "%s\n🚀 INICIANDO PROCESAMIENTO DE DOCUMENTO DE IDENTIDAD CON RECONCILIACIÓN\n%s",
+        LOG_BANNER, LOG_BANNER
+    )
+    logger.info("Evento recibido: %s registros", len(event.get('Records', ())))
+    # El evento completo solo en DEBUG: serializar el lote cuesta CPU en cada invocación
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Evento recibido: %s", dumps_json(event)[:MAX_EVENT_LOG_CHARS])
+    
+    response = {
+        'procesados': 0,
+        'errores': 0,
+        'requieren_revision': 0,
+        'detalles': []
+    }
 
-    logger.info(f"📝 Estado base de datos 1: {response['procesados']}")
+    # Los registros son independientes y dominados por E/S (BD), se procesan en paralelo
+    records = event['Records']
+    # La fecha no cambia dentro del lote: calcularla una sola vez
+    today = date.today()
+    # Registros de procesamiento de todo el lote (claves uuid distintas por hilo): un único INSERT
+    log_buffer = {}
+    max_workers = min(len(records), MAX_RECORD_WORKERS) or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(
+            process_record, records, [today] * len(records), [log_buffer] * len(records)
+        ))
+    if not flush_processing_log_buffer(log_buffer):
+        logger.warning("⚠️ Algunos registros de procesamiento del lote no se guardaron (ver errores anteriores)")
+    
+    # Mensajes fallidos: SQS solo reintenta estos (ReportBatchItemFailures)
+    batch_item_failures = []
+    # Primer documento procesado (exitoso o con revisión) para el resumen
+    last_processed_doc = None
+    status = None
+    for record, (documento_detalle, contadores) in zip(records, results):
+        response['detalles'].append(documento_detalle)
+        for key, value in contadores.items():
+            response[key] += value
+        if documento_detalle['estado'] == 'error':
+            batch_item_failures.append({'itemIdentifier': record['messageId']})
+        elif last_processed_doc is None and documento_detalle['estado'] in PROCESSED_DOC_STATES:
+            last_processed_doc = documento_detalle['documento_id']
+            status = documento_detalle.get('estado_final')
+
+    # ==================== RESUMEN FINAL ====================
+    # (la asignación de carpeta y el flujo se hacen por documento en process_record)
+
+    logger.info("📝 Estado base de datos 1: %s", response['procesados'])
 
     if response['procesados'] > 0 or response['requieren_revision'] > 0:
-        # Buscar CUALQUIER documento que haya sido procesado (exitoso o con revisión)
-        last_processed_doc = None
-        for detalle in response['detalles']:
-            if detalle['estado'] in ['procesado', 'requiere_revision', 'datos_insuficientes']:
-                last_processed_doc = detalle['documento_id']
-                break
-        
         if last_processed_doc:
-            cliente_id = get_client_id_by_document(last_processed_doc)
-            if cliente_id:
-                logger.info(f"👤 Asignando carpeta para documento {document_id}")
-                assign_folder_and_link(cliente_id, last_processed_doc)
-    
-            logger.info(f"📝 Estado antes de crear instancia: {status}")
-
-            # ==================== PUBLICAR EVENTO ====================
-            crear_instancia_flujo_documento(last_processed_doc)
-            
-            # ==================== RESUMEN FINAL ====================
-            logger.info(f"📝 Estado despues de crear instancia: {status}")
-
-            total_time = time.time() - start_time
+            total_time = time.monotonic() - start_time
             response['tiempo_total'] = total_time
             response['total_registros'] = len(event['Records'])
             
-            logger.info("=" * 80)
-            logger.info("📊 RESUMEN DEL PROCESAMIENTO CON RECONCILIACIÓN")
-            logger.info("=" * 80)
-            logger.info(f"✅ Documentos procesados exitosamente: {response['procesados']}")
-            logger.info(f"⚠️ Documentos que requieren revisión: {response['requieren_revision']}")
-            logger.info(f"❌ Documentos con errores: {response['errores']}")
-            logger.info(f"⏱️ Tiempo total: {total_time:.2f} segundos")
-            logger.info(f"📝 Estado: {status}")
-            
-            # Mostrar estadísticas de reconciliación
-            documentos_con_reconciliacion = sum(
-                1 for d in response['detalles'] if d.get('reconciliacion_aplicada', False)
-            )
-            logger.info(f"🔄 Documentos con reconciliación aplicada: {documentos_con_reconciliacion}")
-            
-            if response['procesados'] > 0 or response['requieren_revision'] > 0:
-                logger.info("🎉 Procesamiento con reconciliación completado con resultados")
-            else:
-                logger.warning("⚠️ Procesamiento completado SIN documentos exitosos")
-            
+            # El resumen solo se construye si INFO está habilitado
+            if logger.isEnabledFor(logging.INFO):
+                documentos_con_reconciliacion = sum(
+                    1 for d in response['detalles'] if d.get('reconciliacion_aplicada', False)
+                )
+                logger.info(
+                    SUMMARY_LOG_TEMPLATE,
+                    LOG_BANNER, LOG_BANNER,
+                    response['procesados'],
+                    response['requieren_revision'],
+                    response['errores'],
+                    total_time,
+                    status,
+                    documentos_con_reconciliacion
+                )
 
     return {
         'statusCode': 200,
-        'body': json.dumps(response, ensure_ascii=False)
+        'body': dumps_json(response),
+        'batchItemFailures': batch_item_failures
     }
  
\ No newline at end of file
@@ -0,0 +1,101 @@
+# tests/unit/test_db_connector.py
+import pytest
+import os
+import sys
+
+# Configurar path para importar módulos de la aplicación
+sys.path.append('src/common_layer/python')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from unittest.mock import patch
+
+from common import db_connector
+
+
+def test_preserve_identification_data_batch_una_sola_sentencia():
+    """Todo el lote se preserva con un INSERT ... SELECT y un marcador por documento, en orden"""
+    document_ids = ['doc-1', 'doc-2', 'doc-3']
+
+    with patch.object(db_connector, 'execute_query', return_value=2) as mock_execute:
+        preserved = db_connector.preserve_identification_data_batch(document_ids, reason='Prueba')
+
+    assert preserved == 2
+    mock_execute.assert_called_once()
+    query, params = mock_execute.call_args.args
+    assert mock_execute.call_args.kwargs == {'fetch': False, 'return_rowcount': True}
+    assert 'INSERT INTO historico_documentos_identificacion' in query
+    assert 'WHERE di.id_documento IN (%s, %s, %s)' in query
+    assert query.count('%s') == len(params)
+    assert params[1] == 'Prueba'
+    assert params[2:] == ('doc-1', 'doc-2', 'doc-3')
+
+
+def test_preserve_identification_data_batch_divide_en_bloques():
+    """Los lotes grandes se preservan en sentencias de PRESERVE_BATCH_CHUNK_SIZE y se suman los registros"""
+    document_ids = [f'doc-{index}' for index in range(db_connector.PRESERVE_BATCH_CHUNK_SIZE * 2 + 1)]
+
+    with patch.object(db_connector, 'execute_query', side_effect=[500, 499, 1]) as mock_execute:
+        preserved = db_connector.preserve_identification_data_batch(document_ids)
+
+    assert preserved == 1000
+    assert mock_execute.call_count == 3
+    chunks = [call.args[1][2:] for call in mock_execute.call_args_list]
+    assert [len(chunk) for chunk in chunks] == [500, 500, 1]
+    assert [document_id for chunk in chunks for document_id in chunk] == document_ids
+
+
+def test_preserve_identification_data_batch_propaga_errores():
+    """Un error de BD llega a quien llama, a diferencia de preserve_identification_data"""
+    with patch.object(db_connector, 'execute_query', side_effect=Exception('Lock wait timeout')):
+        with pytest.raises(Exception, match='Lock wait timeout'):
+            db_connector.preserve_identification_data_batch(['doc-1'])
+
+
+def test_preserve_identification_data_batch_lista_vacia():
+    """Sin documentos no se ejecuta ninguna consulta"""
+    with patch.object(db_connector, 'execute_query') as mock_execute:
+        assert db_connector.preserve_identification_data_batch([]) == 0
+
+    mock_execute.assert_not_called()
+
+
+def buffered_log_entries(document_ids):
+    """Buffer con un registro de procesamiento completado por documento"""
+    buffer = {}
+    for document_id in document_ids:
+        registro_id = db_connector.log_document_processing_start(document_id, 'extraccion', buffer=buffer)
+        db_connector.log_document_processing_end(registro_id, buffer=buffer)
+    return buffer
+
+
+def test_flush_processing_log_buffer_un_solo_insert():
+    """Todos los registros del buffer se escriben con un INSERT multi-fila y el buffer se vacía"""
+    buffer = buffered_log_entries(['doc-1', 'doc-2'])
+
+    with patch.object(db_connector, 'execute_query') as mock_execute:
+        assert db_connector.flush_processing_log_buffer(buffer) is True
+
+    mock_execute.assert_called_once()
+    query, params = mock_execute.call_args.args
+    assert query.count('%s') == len(params)
+    assert params[1] == 'doc-1'
+    assert buffer == {}
+
+
+def test_flush_processing_log_buffer_reintenta_fila_a_fila():
+    """Si falla el INSERT conjunto se escriben las filas válidas y se registran las perdidas"""
+    buffer = buffered_log_entries(['doc-1', 'doc-inexistente', 'doc-3'])
+    lost_registro_id = list(buffer)[1]
+
+    def execute_side_effect(query, params, fetch=True):
+        if len(params) > 15 or params[1] == 'doc-inexistente':
+            raise Exception('Cannot add or update a child row')
+
+    with patch.object(db_connector, 'execute_query', side_effect=execute_side_effect) as mock_execute, \
+         patch.object(db_connector.logger, 'error') as mock_error:
+        assert db_connector.flush_processing_log_buffer(buffer) is False
+
+    assert mock_execute.call_count == 4
+    assert [call.args[1][1] for call in mock_execute.call_args_list[1:]] == ['doc-1', 'doc-inexistente', 'doc-3']
+    assert lost_registro_id in mock_error.call_args_list[-1].args[0]
+    assert buffer == {}
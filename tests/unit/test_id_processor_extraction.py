@@ -0,0 +1,199 @@
+# tests/unit/test_id_processor_extraction.py
+import pytest
+import os
+import re
+import sys
+import importlib.util
+
+# Configurar path para importar módulos de la aplicación
+sys.path.append('src/common_layer/python')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+# Cargar el procesador con un nombre propio para no chocar con otros módulos 'app'
+spec = importlib.util.spec_from_file_location('id_processor_app', 'src/processors/id_processor/app.py')
+id_app = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(id_app)
+
+
+def extract(text):
+    """Ejecuta la extracción completa sobre un texto de muestra"""
+    return id_app.extract_id_document_data_improved_core(text)
+
+
+# Valores esperados obtenidos con los extractores originales (patrones evaluados
+# uno a uno, en orden): gana el primer patrón de la lista, no el primero en el texto
+def test_dni_nombre_tiene_prioridad_sobre_apellidos():
+    """NOMBRE gana aunque APELLIDOS aparezca antes en el texto"""
+    data = extract(
+        'DOCUMENTO NACIONAL DE IDENTIDAD ESPAÑA DNI 12345678Z '
+        'APELLIDOS GARCIA LOPEZ NOMBRE PEDRO FECHA DE NACIMIENTO 01/02/1980'
+    )
+
+    assert data['tipo_identificacion'] == 'dni'
+    assert data['numero_identificacion'] == '12345678Z'
+    assert data['nombre_completo'] == 'PEDRO'
+    assert data['fecha_nacimiento'] == '1980-02-01'
+
+
+def test_dni_numero_con_etiqueta_dni_tiene_prioridad():
+    """La etiqueta DNI gana aunque otro número de DNI aparezca antes"""
+    data = extract(
+        'REINO DE ESPAÑA DOCUMENTO NACIONAL DE IDENTIDAD 55667788M DNI: 87654321X '
+        'TITULAR: LUIS PEREZ FECHA DE CADUCIDAD 03/04/2030'
+    )
+
+    assert data['numero_identificacion'] == '87654321X'
+    assert data['nombre_completo'] == 'LUIS PEREZ'
+    assert data['fecha_expiracion'] == '2030-04-03'
+
+
+def test_generico_etiqueta_id_tiene_prioridad_sobre_documento():
+    """ID gana aunque DOCUMENTO aparezca antes en el texto"""
+    data = extract('CARNET DOCUMENTO: ABC ID: X9876543 NAME: JOHN SMITH 12')
+
+    assert data['tipo_identificacion'] == 'desconocido'
+    assert data['numero_identificacion'] == 'X9876543'
+    assert data['nombre_completo'] == 'JOHN SMITH'
+
+
+def test_generico_name_tiene_prioridad_sobre_holder():
+    """NAME gana aunque HOLDER aparezca antes en el texto"""
+    data = extract('TARJETA HOLDER: ANA RUIZ 1 NAME: PEPE 2 EXPIRES: 01/01/2030')
+
+    assert data['nombre_completo'] == 'PEPE'
+    assert data['fecha_expiracion'] == '2030-01-01'
+
+
+def test_generico_valid_until_sobrescribe_expires():
+    """Si coinciden EXPIRES y VALID UNTIL, se queda la fecha de VALID UNTIL"""
+    data = extract('TARJETA NAME: PEPE 2 EXPIRES: 01/01/2030 VALID UNTIL 02/02/2031')
+
+    assert data['fecha_expiracion'] == '2031-02-02'
+
+
+def test_pasaporte_campos_con_varias_etiquetas_respetan_el_orden():
+    """Número, género, nacionalidad y nacimiento toman la primera etiqueta de la lista"""
+    data = extract(
+        'PASAPORTE NO: XY1234567 PASSPORT NO: PA0106480 GENDER F SEX M '
+        'NATIONALITY SPANISH NACIONALIDAD PANAMENA DOB 04 ABR 1960 DATE OF BIRTH 21 MAR 1991'
+    )
+
+    assert data['tipo_identificacion'] == 'pasaporte'
+    assert data['numero_identificacion'] == 'PA0106480'
+    assert data['genero'] == 'M'
+    assert data['nacionalidad'] == 'Panameña'
+    assert data['fecha_nacimiento'] == '1991-03-21'
+
+
+def test_pasaporte_fechas_de_validez_respetan_la_prioridad_de_etiquetas():
+    """ISSUED: gana a DATE OF ISSUE y FECHA DE VENCIMIENTO a DATE OF EXPIRY, sin importar la posición"""
+    data = extract(
+        'PASAPORTE PASSPORT NO: PA0106480 ISSUED: 04-MAR-2016 DATE OF ISSUE 02 ENE 2014 '
+        'FECHA DE VENCIMIENTO 03 FEB 2020 DATE OF EXPIRY 02 ENE 2019'
+    )
+
+    assert data['fecha_emision'] == '2016-03-04'
+    assert data['fecha_expiracion'] == '2020-02-03'
+
+
+def test_pasaporte_encabezado_con_tildes_es_de_panama():
+    """REPÚBLICA DE PANAMÁ con tildes fija el país de emisión aunque el texto mencione otro país"""
+    data = extract(
+        'REPÚBLICA DE PANAMÁ PASAPORTE PASSPORT NO: PA0106480 SURNAME PEREZ GIVEN NAMES JUAN '
+        'DATE OF BIRTH 21 MAR 1991 LUGAR DE NACIMIENTO COLOMBIA'
+    )
+
+    assert data['tipo_identificacion'] == 'pasaporte'
+    assert data['pais_emision'] == 'Panamá'
+    assert data['autoridad_emision'] == 'Pasaportes/Panamá'
+    assert data['lugar_nacimiento'] == 'COLOMBIA'
+
+
+def test_dni_espacio_no_separable_separa_campos():
+    """Un NBSP del OCR separa las etiquetas igual que un espacio, con RE2 o con re"""
+    data = extract(
+        'REINO DE ESPAÑA DNI: 77997185X NOMBRE ANA\xa0APELLIDOS RODRIGUEZ '
+        'FECHA DE NACIMIENTO 01/02/1980'
+    )
+
+    assert data['numero_identificacion'] == '77997185X'
+    assert data['nombre_completo'] == 'ANA'
+
+
+@pytest.mark.parametrize('pattern, text', [
+    (r'NOMBRE\s+(\d+)', 'NOMBRE\xa0\u2003123'),
+    (r'[:\s]+(\d+)', ':\v١٢٣'),
+    (r'\b(\d{8}[A-Z])\b', 'Ñ12345678Z 87654321X'),
+])
+def test_compile_pattern_coincide_con_re_en_texto_unicode(pattern, text):
+    """Los patrones compilados encuentran lo mismo que re con espacios y dígitos Unicode"""
+    expected = re.compile(pattern).search(text)
+    match = id_app.compile_pattern(pattern).search(text)
+
+    assert match.span() == expected.span()
+    assert match.group(1) == expected.group(1)
+
+
+def test_search_head_no_trunca_coincidencias_en_el_limite():
+    """Un número que cruza HEAD_SCAN_CHARS se devuelve completo (con el motor re estándar)"""
+    pattern = re.compile(r'\b(\d{7,10})\b')
+    text = ' ' * (id_app.HEAD_SCAN_CHARS - 8) + '1234567890 FIN'
+
+    assert id_app.search_head(pattern, text).group(1) == '1234567890'
+
+
+def test_generico_numero_en_el_limite_de_la_cabecera():
+    """La extracción completa no corta el número en el límite de la cabecera"""
+    data = extract('TARJETA' + ' ' * (id_app.HEAD_SCAN_CHARS - 15) + '1234567890 FIN')
+
+    assert data['numero_identificacion'] == '1234567890'
+
+
+CEDULA_TEXTS = [
+    'REPUBLICA DE PANAMA TRIBUNAL ELECTORAL JUAN CARLOS PEREZ GOMEZ FECHA DE NACIMIENTO: 15-MAR-1985 '
+    'LUGAR DE NACIMIENTO: PANAMA SEXO: M EXPEDIDA: 10-ENE-2020 EXPIRA: 10-ENE-2030 8-123-4567',
+    'REPÚBLICA DE PANAMÁ\nTRIBUNAL ELECTORAL\nMARIA   ELENA RODRIGUEZ\nNOMBRE USUAL: MARIA\n'
+    'FECHA DE NACIMIENTO: 02-FEB-1990\nSEXO: F\nEXPEDIDA: 01-JUN-2019 EXPIRA: 01-JUN-2029\n4-567-890',
+    'TRIBUNAL ELECTORAL CEDULA 8-765-4321 SIN MAS DATOS',
+]
+
+
+def test_cedula_batch_coincide_con_la_extraccion_individual():
+    """Cada resultado del lote es el mismo que da la extracción completa, en el orden de entrada"""
+    results = id_app.extract_cedula_panama_batch(CEDULA_TEXTS)
+
+    assert [data['numero_identificacion'] for data in results] == ['8-123-4567', '4-567-890', '8-765-4321']
+    assert results == [extract(text) for text in CEDULA_TEXTS]
+
+
+def test_cedula_batch_aplica_la_limpieza_final():
+    """Con campos ruidosos el lote limpia y valida igual que la extracción completa"""
+    texts = [
+        'REPUBLICA DE PANAMA TRIBUNAL ELECTORAL ANA MARIA SPECIMEN TORRES NOMBRE USUAL: ANA '
+        'FECHA DE NACIMIENTO: 15-MAR-1985 LUGAR DE NACIMIENTO: PA 8-123-4567',
+        'REPUBLICA DE PANAMA TRIBUNAL ELECTORAL LUIS ROJAS NOMBRE USUAL: LUIS '
+        'LUGAR DE NACIMIENTO: PA, SEXO: M 8-123-4567',
+    ]
+
+    results = id_app.extract_cedula_panama_batch(texts)
+
+    assert results[0]['lugar_nacimiento'] is None
+    assert results == [extract(text) for text in texts]
+
+
+def test_cedula_batch_conserva_textos_sin_numero():
+    """Un texto sin número de cédula no se descarta: su resultado queda en su posición"""
+    texts = [CEDULA_TEXTS[0], 'REPUBLICA DE PANAMA TRIBUNAL ELECTORAL SIN NUMERO', CEDULA_TEXTS[2]]
+
+    results = id_app.extract_cedula_panama_batch(texts)
+
+    assert len(results) == 3
+    assert results[1]['tipo_identificacion'] == 'cedula_panama'
+    assert results[1]['numero_identificacion'] is None
+    assert results[1]['texto_completo'] == texts[1]
+    assert results[2]['numero_identificacion'] == '8-765-4321'
+
+
+def test_cedula_batch_vacio():
+    """Un lote vacío no produce resultados"""
+    assert id_app.extract_cedula_panama_batch([]) == []
@@ -0,0 +1,147 @@
+# tests/unit/test_id_processor_record.py
+import pytest
+import json
+import os
+import sys
+import importlib.util
+
+# Configurar path para importar módulos de la aplicación
+sys.path.append('src/common_layer/python')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from unittest.mock import patch, MagicMock
+
+from common import db_connector
+
+# Cargar el procesador con un nombre propio para no chocar con otros módulos 'app'
+spec = importlib.util.spec_from_file_location('id_processor_app', 'src/processors/id_processor/app.py')
+id_app = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(id_app)
+
+DOCUMENT_ID = '11111111-1111-1111-1111-111111111111'
+
+
+@pytest.fixture
+def sample_record():
+    """Mensaje SQS de un documento de identidad"""
+    return {'body': json.dumps({'document_id': DOCUMENT_ID})}
+
+
+@pytest.fixture
+def document_data_result():
+    """Datos del documento tal como los devuelve get_extracted_data_from_db"""
+    return {
+        'document_data': {'id_documento': DOCUMENT_ID, 'id_cliente': None},
+        'extracted_data': {
+            'texto_completo': 'REINO DE ESPAÑA DNI: 87654321X TITULAR: LUIS PEREZ FECHA DE CADUCIDAD 03/04/2030'
+        }
+    }
+
+
+def patch_database(document_data_result, persist_side_effect=None, processing_log=None):
+    """Sustituye las llamadas a base de datos que hace process_record"""
+    if processing_log is None:
+        processing_log = {
+            'log_document_processing_start': MagicMock(return_value='registro-1'),
+            'log_document_processing_end': MagicMock(),
+        }
+    return patch.multiple(
+        id_app,
+        get_extracted_data_from_db=MagicMock(return_value=document_data_result),
+        **processing_log,
+        register_document_identification_improved=MagicMock(return_value=True),
+        log_identification_changes=MagicMock(),
+        mark_for_manual_review=MagicMock(),
+        update_document_processing_status=MagicMock(),
+        persist_id_document_results=MagicMock(side_effect=persist_side_effect),
+        assign_folder_and_link=MagicMock(),
+        crear_instancia_flujo_documento=MagicMock(),
+    )
+
+
+def test_process_record_cuenta_procesado_tras_persistir(sample_record, document_data_result):
+    """Un documento persistido sin errores se cuenta como procesado"""
+    with patch_database(document_data_result):
+        detalle, contadores = id_app.process_record(sample_record)
+
+    assert detalle['estado'] == 'procesado'
+    assert contadores == {'procesados': 1, 'errores': 0, 'requieren_revision': 0}
+
+
+def test_process_record_fallo_al_persistir_solo_cuenta_error(sample_record, document_data_result):
+    """Si falla la persistencia el documento no se cuenta como procesado"""
+    with patch_database(document_data_result, persist_side_effect=Exception('Deadlock')):
+        detalle, contadores = id_app.process_record(sample_record)
+
+    assert detalle['estado'] == 'error'
+    assert detalle['error'] == 'Deadlock'
+    assert contadores == {'procesados': 0, 'errores': 1, 'requieren_revision': 0}
+
+
+def test_process_record_sin_buffer_reintenta_los_registros_fila_a_fila(sample_record, document_data_result):
+    """Si falla el INSERT conjunto de los registros del documento se guardan fila a fila"""
+    bulk_rows = []
+    inserted = []
+
+    def execute_side_effect(query, params, fetch=True):
+        if len(params) > 15:
+            bulk_rows.extend(params[::15])
+            raise Exception('Data too long for column')
+        inserted.append(params[0])
+
+    with patch_database(document_data_result, processing_log={}), \
+         patch.object(db_connector, 'execute_query', side_effect=execute_side_effect), \
+         patch.object(db_connector.logger, 'error'):
+        detalle, contadores = id_app.process_record(sample_record)
+
+    assert detalle['estado'] == 'procesado'
+    assert len(bulk_rows) > 1
+    assert inserted == bulk_rows
+
+
+@pytest.mark.parametrize('failing_call', ['assign_folder_and_link', 'crear_instancia_flujo_documento'])
+def test_process_record_fallo_en_carpeta_o_flujo_cuenta_error(sample_record, document_data_result, failing_call):
+    """Si falla la carpeta o la instancia de flujo el documento no se da por procesado"""
+    document_data_result['document_data']['id_cliente'] = 'cliente-1'
+
+    with patch_database(document_data_result), \
+         patch.object(id_app, failing_call, side_effect=Exception('Timeout')):
+        detalle, contadores = id_app.process_record(sample_record)
+
+    assert detalle['estado'] == 'error'
+    assert detalle['error'] == 'Timeout'
+    assert contadores == {'procesados': 0, 'errores': 1, 'requieren_revision': 0}
+
+
+def test_lambda_handler_reintenta_mensajes_sin_flujo(sample_record, document_data_result):
+    """El mensaje cuyo flujo no se pudo crear vuelve a SQS en batchItemFailures"""
+    sample_record['messageId'] = 'mensaje-1'
+
+    with patch_database(document_data_result), \
+         patch.object(id_app, 'crear_instancia_flujo_documento', side_effect=Exception('Timeout')), \
+         patch.object(id_app, 'flush_processing_log_buffer', return_value=True):
+        response = id_app.lambda_handler({'Records': [sample_record]}, None)
+
+    assert response['batchItemFailures'] == [{'itemIdentifier': 'mensaje-1'}]
+
+
+@pytest.mark.parametrize('stored', [
+    '{"numero_identificacion": "87654321X", "nombre_completo": "LUIS PÉREZ"}',
+    b'{"numero_identificacion": "87654321X", "nombre_completo": "LUIS P\xc3\x89REZ"}',
+    {'numero_identificacion': '87654321X', 'nombre_completo': 'LUIS PÉREZ'},
+])
+def test_extraction_data_unchanged_acepta_la_columna_en_cualquier_formato(stored):
+    """La columna JSON se compara igual llegue como texto, bytes o ya decodificada"""
+    document_data = {'datos_extraidos_ia': stored, 'confianza_extraccion': 0.85, 'validado_manualmente': 1}
+    id_data = {'numero_identificacion': '87654321X', 'nombre_completo': 'LUIS PÉREZ'}
+
+    assert id_app.extraction_data_unchanged(document_data, id_data, 0.85, True) is True
+    assert id_app.extraction_data_unchanged(document_data, dict(id_data, nombre_completo='LUIS'), 0.85, True) is False
+    assert id_app.extraction_data_unchanged(document_data, id_data, 0.9, True) is False
+
+
+def test_extraction_data_unchanged_columna_corrupta():
+    """Un JSON almacenado ilegible obliga a reescribir los datos"""
+    document_data = {'datos_extraidos_ia': '{"numero', 'confianza_extraccion': 0.85, 'validado_manualmente': 1}
+
+    assert id_app.extraction_data_unchanged(document_data, {'numero_identificacion': '1'}, 0.85, True) is False
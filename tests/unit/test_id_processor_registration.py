@@ -0,0 +1,124 @@
+# tests/unit/test_id_processor_registration.py
+import pytest
+import os
+import sys
+import importlib.util
+from datetime import date
+
+# Configurar path para importar módulos de la aplicación
+sys.path.append('src/common_layer/python')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from pymysql.err import IntegrityError
+from unittest.mock import patch
+
+# Cargar el procesador con un nombre propio para no chocar con otros módulos 'app'
+spec = importlib.util.spec_from_file_location('id_processor_app', 'src/processors/id_processor/app.py')
+id_app = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(id_app)
+
+DOCUMENT_ID = '11111111-1111-1111-1111-111111111111'
+
+
+@pytest.fixture
+def sample_id_data():
+    """Datos extraídos completos de un DNI"""
+    return {
+        'tipo_identificacion': 'dni',
+        'numero_identificacion': '87654321X',
+        'nombre_completo': 'LUIS PEREZ',
+        'pais_emision': 'España',
+        'fecha_emision': '2020-04-03',
+        'fecha_expiracion': '2030-04-03'
+    }
+
+
+def test_register_documento_inexistente_retorna_false(sample_id_data):
+    """La FK sin documento padre (1452) se informa como documento inexistente"""
+    fk_error = IntegrityError(1452, 'Cannot add or update a child row: a foreign key constraint fails')
+
+    with patch.object(id_app, 'preserve_identification_data', return_value=False), \
+         patch.object(id_app, 'execute_query', side_effect=fk_error), \
+         patch.object(id_app, 'update_document_processing_status') as mock_status, \
+         patch.object(id_app.logger, 'error') as mock_error:
+        assert id_app.register_document_identification_improved(DOCUMENT_ID, sample_id_data) is False
+
+    mock_status.assert_not_called()
+    messages = [call.args[0] for call in mock_error.call_args_list]
+    assert "❌ El documento %s no existe en la tabla 'documentos'" in messages
+
+
+@pytest.mark.parametrize('error_code', [1062, 1048])
+def test_register_otros_errores_de_integridad_van_al_manejo_general(sample_id_data, error_code):
+    """Clave duplicada o NOT NULL no se confunden con un documento inexistente"""
+    integrity_error = IntegrityError(error_code, 'Integrity constraint violation')
+
+    with patch.object(id_app, 'preserve_identification_data', return_value=False), \
+         patch.object(id_app, 'execute_query', side_effect=integrity_error), \
+         patch.object(id_app, 'update_document_processing_status') as mock_status, \
+         patch.object(id_app.logger, 'error') as mock_error:
+        assert id_app.register_document_identification_improved(DOCUMENT_ID, sample_id_data) is False
+
+    mock_status.assert_not_called()
+    messages = [call.args[0] for call in mock_error.call_args_list]
+    assert "❌ El documento %s no existe en la tabla 'documentos'" not in messages
+    assert "❌ Error en %s: %s" in messages
+
+
+def test_register_batch_respeta_el_orden_y_omite_documentos_incompletos(sample_id_data):
+    """Las filas del executemany siguen el orden de entrada; los documentos sin datos críticos se omiten"""
+    today = date(2026, 1, 15)
+    second_id_data = dict(sample_id_data, numero_identificacion='12345678Z', nombre_completo='ANA RUIZ')
+    records = [
+        ('doc-1', sample_id_data),
+        ('doc-2', dict(sample_id_data, nombre_completo='Titular no identificado')),
+        ('doc-3', second_id_data),
+        ('doc-4', dict(sample_id_data, numero_identificacion='AUTO-123')),
+    ]
+
+    with patch.object(id_app, 'preserve_identification_data_batch', return_value=1) as mock_preserve, \
+         patch.object(id_app, 'execute_query', return_value=3) as mock_execute:
+        affected_rows, skipped = id_app.register_document_identifications_batch(records, today)
+
+    assert affected_rows == 3
+    assert skipped == ['doc-2', 'doc-4']
+    mock_preserve.assert_called_once_with(['doc-1', 'doc-3'], reason="Actualización con nuevos datos extraídos")
+    mock_execute.assert_called_once_with(
+        id_app.IDENTIFICATION_UPSERT_QUERY,
+        [
+            id_app.build_identification_params('doc-1', sample_id_data, today),
+            id_app.build_identification_params('doc-3', second_id_data, today),
+        ],
+        fetch=False,
+        return_rowcount=True,
+        many=True
+    )
+
+
+def test_register_batch_sin_documentos_validos_no_escribe(sample_id_data):
+    """Si todos los documentos se omiten no se preserva ni se escribe nada"""
+    records = [('doc-1', dict(sample_id_data, numero_identificacion=None))]
+
+    with patch.object(id_app, 'preserve_identification_data_batch') as mock_preserve, \
+         patch.object(id_app, 'execute_query') as mock_execute:
+        assert id_app.register_document_identifications_batch(records) == (0, ['doc-1'])
+
+    mock_preserve.assert_not_called()
+    mock_execute.assert_not_called()
+
+
+def test_register_batch_error_al_preservar_no_detiene_el_upsert(sample_id_data):
+    """Un fallo al preservar el histórico se registra pero el lote se guarda igual"""
+    with patch.object(id_app, 'preserve_identification_data_batch', side_effect=Exception('Lock wait timeout')), \
+         patch.object(id_app, 'execute_query', return_value=1) as mock_execute:
+        assert id_app.register_document_identifications_batch([('doc-1', sample_id_data)]) == (1, [])
+
+    mock_execute.assert_called_once()
+
+
+def test_register_batch_propaga_errores_del_upsert(sample_id_data):
+    """Si falla la escritura la excepción llega a quien llama (no se guarda ninguna fila)"""
+    with patch.object(id_app, 'preserve_identification_data_batch', return_value=0), \
+         patch.object(id_app, 'execute_query', side_effect=IntegrityError(1452, 'foreign key constraint fails')):
+        with pytest.raises(IntegrityError):
+            id_app.register_document_identifications_batch([('doc-1', sample_id_data)])